@@ -1 +1,5 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 __version__ = '1.0.1'
@@ -7,6 +7,9 @@ if __package__ == '':
 
 
 def _main():
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        from aior.bench import main as run_bench
+        return run_bench(sys.argv[2:])
     if len(sys.argv) > 2:
         cmd, opt = sys.argv[1:]
         if cmd == "run":
@@ -1,29 +1,45 @@
 import asyncio
 import json
 import logging
+import os
+import socket
 import ssl
 import sys
-from argparse import ArgumentParser
-from configparser import ConfigParser
+import time
 from logging.handlers import TimedRotatingFileHandler
 from pathlib import Path
-from typing import Any, List, Tuple, Type, Dict, get_type_hints, Optional, Union
+from typing import Any, Callable, List, Sequence, Tuple, Type, Dict, Optional, Union, TYPE_CHECKING
 
 from aiohttp import web
 from aiohttp.typedefs import PathLike, JSONEncoder
 from aiohttp.web_runner import GracefulExit
 from pydantic import BaseModel
 
+import aior
+from aior.codec import JSONCodec, resolve_json_codec
 from aior.components.http_handler import BaseHTTPHandler
-from aior.components.stdin_handler import BaseStandardInputHandler
-from aior.constants import METHODS_ALL, Environment, DEFAULT_LOGGING_FORMAT, DEFAULT_LOGGING_FILE_INTERVAL, \
-    DEFAULT_LOGGING_FILE_ENCODING, DEFAULT_LOGGING_FILE_DELAY, DEFAULT_LOGGING_FILE_WHEN, DEFAULT_LOGGING_LEVEL
-from aior.docs import DocsHandler, OpenapiSchemaHandler, get_openapi, RedocHandler
+from aior.constants import Environment, DEFAULT_LOGGING_FORMAT, DEFAULT_LOGGING_FILE_INTERVAL, \
+    DEFAULT_LOGGING_FILE_ENCODING, DEFAULT_LOGGING_FILE_DELAY, DEFAULT_LOGGING_FILE_WHEN, DEFAULT_LOGGING_LEVEL, \
+    DEFAULT_COMPRESSION_MIN_SIZE, DEFAULT_COMPRESSION_LEVEL, DEFAULT_COMPRESSION_EXECUTOR_THRESHOLD, LoopImpl, \
+    DEFAULT_LATENCY_BUCKETS
 from aior.log import server_logger, web_logger, access_logger, client_logger, ws_logger
-from aior.utils import gen_deserializers
+from aior.metrics import HTTPMetrics, MetricsHandler, PoolMetrics, metrics_middleware
+from aior.middlewares import compression_middleware, etag_middleware, json_codec_middleware
+from aior.routing import RouteRegistry
+from aior.utils import get_loop_policy, get_loop_impl
+from aior.listeners import TCP, UNIX, parse_listener, open_listener_sockets
+from aior.workers import WorkerSupervisor
+
+if TYPE_CHECKING:
+    from argparse import Namespace
+
+    from aior.docs import EncodedDocument
 
 __all__ = ('AiorApplication', 'LoggingConfig')
 
+# time spent importing aior and the dependencies it pulled in first
+_IMPORT_DURATION = time.perf_counter() - aior._IMPORT_STARTED
+
 _LOGGERS = {
     'access': access_logger,
     'client': client_logger,
@@ -36,7 +52,7 @@ _LOGGERS = {
 
 class LoggingConfig(BaseModel):
     class LoggingFileConfig(BaseModel):
-        path: PathLike
+        path: Union[str, Path]
         when: str = DEFAULT_LOGGING_FILE_WHEN
         interval: int = DEFAULT_LOGGING_FILE_INTERVAL
         delay: bool = DEFAULT_LOGGING_FILE_DELAY
@@ -48,6 +64,51 @@ class LoggingConfig(BaseModel):
     file: Optional[LoggingFileConfig] = None
 
 
+def _parse_server_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    defaults = {}
+    for key, value in config.items():
+        key = key.replace('-', '_')
+        if key in ('reuse_port', 'docs') and isinstance(value, str):
+            value = value.strip().lower() in ('1', 'true', 'yes', 'on')
+        defaults[key] = value
+    return defaults
+
+
+_DATABASE_INT_OPTIONS = ('port', 'pool_size', 'max_overflow', 'pool_recycle', 'warm_up')
+
+
+def _parse_database_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    # ini values are strings, yaml ones are typed already
+    options = {}
+    for key, value in config.items():
+        key = key.replace('-', '_')
+        if isinstance(value, str):
+            if key in _DATABASE_INT_OPTIONS:
+                value = int(value)
+            elif key == 'pool_timeout':
+                value = float(value)
+            elif key == 'pool_pre_ping':
+                value = value.strip().lower() in ('1', 'true', 'yes', 'on')
+            elif key == 'replicas':
+                value = [replica.strip() for replica in value.split(',') if replica.strip()]
+        options[key] = value
+    return options
+
+
+def _stdin_handler_cls() -> type:
+    from aior.components.stdin_handler import BaseStandardInputHandler
+    return BaseStandardInputHandler
+
+
+def _unlink_unix_socket(sock: socket.socket) -> None:
+    path = sock.getsockname()
+    if isinstance(path, str) and path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
 class AiorApplication(web.Application):
     def __init__(self, *,
                  routes: List[Union[Tuple[str, Type[web.View]],
@@ -56,19 +117,36 @@ class AiorApplication(web.Application):
                  env: str = Environment.LOCAL,
                  host: str = '0.0.0.0',
                  port: int = 8400,
+                 workers: int = 1,
+                 reuse_port: bool = False,
+                 listen: Optional[List[str]] = None,
+                 loop_impl: str = LoopImpl.ASYNCIO,
+                 profile_startup: bool = False,
                  config_file: Optional[PathLike] = None,
                  logging_config: Union[LoggingConfig, Dict[str, LoggingConfig]] = None,
                  default_json_encoder: JSONEncoder = json.JSONEncoder,
+                 json_codec: Union[JSONCodec, str, None] = None,
                  ssl_crt: PathLike = None,
                  ssl_key: PathLike = None,
                  ssl_context: ssl.SSLContext = None,
                  enable_cors: bool = False,
+                 enable_compression: bool = False,
+                 compression_min_size: int = DEFAULT_COMPRESSION_MIN_SIZE,
+                 compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+                 compression_executor_threshold: int = DEFAULT_COMPRESSION_EXECUTOR_THRESHOLD,
+                 enable_etag: bool = False,
+                 etag_weak: bool = False,
+                 enable_metrics: bool = False,
+                 metrics_url: str = '/metrics',
+                 metrics_buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+                 db_warm_up: Optional[int] = None,
                  enable_docs: bool = False,
                  docs_title: str = '{app_name} API',
                  docs_version: str = '0.1.0',
                  openapi_url: str = '/openapi.json',
                  openapi_version: str = '3.0.2',
                  docs_url_prefix: str = '',
+                 docs_precompress: bool = True,
                  swagger_docs_url: str = '/docs',
                  swagger_ui_favicon_url: str = 'https://docs.aiohttp.org/en/stable/_static/favicon.ico',
                  swagger_ui_js_url: str = 'https://cdn.jsdelivr.net/npm/swagger-ui-dist@3/swagger-ui-bundle.js',
@@ -84,9 +162,28 @@ class AiorApplication(web.Application):
         self._env = env
         self._host = host
         self._port = port
+        self._workers = workers
+        self._worker_id = None  # type: Optional[int]
+        self._reuse_port = reuse_port
+        self._listen = list(listen or ())
+        self._listeners = []  # type: List[Tuple[str, Tuple]]
+        self._socks = None  # type: Optional[List[socket.socket]]
+        self._loop_impl = loop_impl
+        self._profile_startup = profile_startup
+        self._startup_profile = {'imports': _IMPORT_DURATION}  # type: Dict[str, float]
         self._routes = routes
         self._enable_cors = enable_cors
+        self._enable_compression = enable_compression
+        self._compression_min_size = compression_min_size
+        self._compression_level = compression_level
+        self._compression_executor_threshold = compression_executor_threshold
+        self._enable_etag = enable_etag
+        self._etag_weak = etag_weak
         self._enable_docs = enable_docs
+        self._metrics_url = metrics_url
+        self._metrics = HTTPMetrics(metrics_buckets) if enable_metrics else None  # type: Optional[HTTPMetrics]
+        self._metrics_buckets = metrics_buckets
+        self._db_warm_up = db_warm_up
         self._config = {}  # type: Dict[str, Any]
         self._logging_config = logging_config
         self._ssl_context = ssl_context
@@ -103,16 +200,29 @@ class AiorApplication(web.Application):
         self._redoc_docs_url = f'{docs_url_prefix}{redoc_docs_url}'
         self._redoc_ui_favicon_url = redoc_ui_favicon_url
         self._redoc_ui_js_url = redoc_ui_js_url
-        self._openapi_schema = None  # type: Dict[str, Any]
+        self._openapi_schema = None  # type: Optional[Dict[str, Any]]
+        self._route_registry = RouteRegistry()
+        self._docs_precompress = docs_precompress
+        self._docs_documents = {}  # type: Dict[str, EncodedDocument]
         self._default_json_encoder = default_json_encoder
+        self._json_codec = resolve_json_codec(json_codec, default_json_encoder)
         self._runner = web.AppRunner(self, handle_signals=True)
 
-        self._loop = asyncio.get_event_loop() if loop is None else loop
-
-        self._init_sys_argv()
-
+        # the loop implementation may come from argv or the config file
+        # and must be chosen before creating the loop
+        self._profile('init_sys_argv', self._init_sys_argv)
         if config_file is not None:
-            self._init_config(config_file)
+            self._profile('init_config', self._init_config, config_file)
+
+        self._loop_policy = get_loop_policy(self._loop_impl)
+        if loop is None:
+            if self._loop_policy is not None:
+                loop = self._loop_policy.new_event_loop()
+                asyncio.set_event_loop(loop)
+            else:
+                loop = asyncio.get_event_loop()
+        self._loop = loop
+        self._loop_impl = get_loop_impl(loop)
 
         self.setup()
 
@@ -169,6 +279,7 @@ class AiorApplication(web.Application):
 
         suf = config_file.suffix
         if suf == '.ini':
+            from configparser import ConfigParser
             config_parser = ConfigParser()
             config_parser.read(str(config_file.resolve()))
             for section in config_parser.sections():
@@ -182,7 +293,23 @@ class AiorApplication(web.Application):
         else:
             raise RuntimeError('not supported config file type')
 
+        self._init_server_config()
+
+    def _init_server_config(self) -> None:
+        # the `server` section overrides the constructor while explicit arguments still win
+        server_config = dict(self._config.get('server') or {})
+        if not server_config:
+            return
+        listen = server_config.pop('listen', None)
+        if listen:
+            self._listen = listen.split(',') if isinstance(listen, str) else list(listen)
+        self._arg_parser.set_defaults(**_parse_server_config(server_config))
+        args, _ = self._arg_parser.parse_known_args(self._argv)
+        self._apply_sys_argv(args)
+
     def _init_sys_argv(self) -> None:
+        from argparse import ArgumentParser
+
         argv = sys.argv[1:]
         arg_parser = ArgumentParser(
             description=f'{self._app_name.capitalize()} application server',
@@ -203,6 +330,38 @@ class AiorApplication(web.Application):
             type=int,
             default=self._port
         )
+        arg_parser.add_argument(
+            '-w', '--workers',
+            help='Number of pre-forked worker processes (default: %(default)r)',
+            type=int,
+            default=self._workers
+        )
+        arg_parser.add_argument(
+            '--reuse-port',
+            help='Let every worker bind the port with SO_REUSEPORT '
+                 'instead of sharing one listening socket',
+            action='store_true',
+            default=self._reuse_port
+        )
+        arg_parser.add_argument(
+            '-l', '--listen',
+            help='Listen on HOST:PORT, unix:PATH, fd:N or systemd instead of --host/--port, '
+                 'repeat to serve on several sites',
+            action='append',
+            metavar='LISTENER',
+        )
+        arg_parser.add_argument(
+            '--profile-startup',
+            help='Log the time spent in imports and in each setup step',
+            action='store_true',
+            default=self._profile_startup
+        )
+        arg_parser.add_argument(
+            '--loop',
+            help='Event loop implementation, auto prefers uvloop when installed (default: %(default)r)',
+            choices=(LoopImpl.AUTO, LoopImpl.ASYNCIO, LoopImpl.UVLOOP),
+            default=self._loop_impl
+        )
         arg_parser.add_argument(
             '-D', '--docs',
             help='Enable api doc page',
@@ -210,11 +369,25 @@ class AiorApplication(web.Application):
             default=self._enable_docs
         )
         args, extra_argv = arg_parser.parse_known_args(argv)
+        # kept to apply the config file's `server` section under the arguments
+        self._arg_parser = arg_parser
+        self._argv = argv
+        self._apply_sys_argv(args)
+        self.init_extra_sys_argv(extra_argv)
+
+    def _apply_sys_argv(self, args: 'Namespace') -> None:
         self._host = args.host
         self._port = args.port
+        self._workers = args.workers
+        self._reuse_port = args.reuse_port
+        if args.listen:
+            self._listen = args.listen
+        self._listeners = ([parse_listener(spec) for spec in self._listen]
+                           or [(TCP, (self._host, self._port))])
+        self._loop_impl = args.loop
+        self._profile_startup = args.profile_startup
         self._env = args.env
         self._enable_docs = args.docs
-        self.init_extra_sys_argv(extra_argv)
 
     def init_extra_sys_argv(self, extra_args: List[str]) -> None:
         """
@@ -230,33 +403,26 @@ class AiorApplication(web.Application):
         self._ssl_context.load_cert_chain(ssl_crt, ssl_key)
 
     def _init_routes(self) -> None:
-        cooked_routes = []
         for route in self._routes:
             path = route[0]
             handler_cls = route[1]
             kwargs = route[2] if len(route) > 2 else {}
             handler_cls.default_json_encoder = self._default_json_encoder
-            if issubclass(handler_cls, BaseHTTPHandler):
-                for m in METHODS_ALL:
-                    method = getattr(handler_cls, m.lower(), None)
-                    if method is not None:
-                        hints = get_type_hints(method)
-                        hints.pop('return', None)
-                        if hints:
-                            method.__deserializer__ = gen_deserializers(hints)
-            elif issubclass(handler_cls, BaseStandardInputHandler):
+            if issubclass(handler_cls, _stdin_handler_cls()):
                 handler_cls().connect()
                 continue
 
-            cooked_routes.append((path, handler_cls, kwargs))
+            spec = self._route_registry.add(path, handler_cls, kwargs)
+            if issubclass(handler_cls, BaseHTTPHandler):
+                handler_cls.__binders__ = spec.binders
 
         if self._enable_cors:
-            self._handle_cors_routes(cooked_routes)
+            self._handle_cors_routes()
         else:
-            for path, handler_cls, kwargs in cooked_routes:
-                self.router.add_route('*', path, handler_cls, **kwargs)
+            for spec in self._route_registry:
+                self.router.add_route('*', spec.path, spec.handler, **spec.kwargs)
 
-    def _handle_cors_routes(self, raw_routes: List[Tuple[str, Type[web.View], Dict]]) -> None:
+    def _handle_cors_routes(self) -> None:
         import aiohttp_cors
         cors = aiohttp_cors.setup(self, defaults={
             '*': aiohttp_cors.ResourceOptions(
@@ -268,48 +434,65 @@ class AiorApplication(web.Application):
 
         from aiohttp_cors import CorsViewMixin
 
+        cors_handlers = {}  # type: Dict[Type[web.View], Type[web.View]]
+
         def gen_cors_handler(base):
             class CorsHandler(base, CorsViewMixin):
                 ...
 
             return CorsHandler
 
-        for path, handler_cls, kwargs in raw_routes:
-            if getattr(handler_cls, '__cors__', False):
-                route = self.router.add_route(
-                    '*', path, gen_cors_handler(handler_cls), **kwargs)
+        for spec in self._route_registry:
+            if spec.cors:
+                # one wrapper per handler class, however many paths it is mounted on
+                handler_cls = cors_handlers.get(spec.handler)
+                if handler_cls is None:
+                    handler_cls = cors_handlers[spec.handler] = gen_cors_handler(spec.handler)
+                route = self.router.add_route('*', spec.path, handler_cls, **spec.kwargs)
                 cors.add(route)
             else:
-                self.router.add_route('*', path, handler_cls, **kwargs)
+                self.router.add_route('*', spec.path, spec.handler, **spec.kwargs)
+
+    def _init_middlewares(self) -> None:
+        # outermost, so latency and bytes include the other middlewares
+        if self._metrics is not None:
+            self.middlewares.append(metrics_middleware(self._metrics))
+        # per application, so several applications of one process keep their own codec
+        self.middlewares.append(json_codec_middleware(self._json_codec))
+        if self._enable_compression:
+            self.middlewares.append(compression_middleware(
+                min_size=self._compression_min_size,
+                level=self._compression_level,
+                executor_threshold=self._compression_executor_threshold,
+            ))
+        # runs inside compression, so tags are computed from identity bodies
+        if self._enable_etag:
+            self.middlewares.append(etag_middleware(weak=self._etag_weak))
 
     def _init_docs(self) -> None:
+        from aior.docs import DocsHandler, OpenapiSchemaHandler, RedocHandler
+
         self._docs_title = self._docs_title.format(
             app_name=self._app_name)
-        self._openapi_schema = self.openapi()
         self._routes.insert(0, (self._swagger_docs_url, DocsHandler))
         self._routes.insert(0, (self._redoc_docs_url, RedocHandler))
         self._routes.insert(0, (self._openapi_url, OpenapiSchemaHandler))
 
     def openapi(self) -> Dict:
         routes = []
-        for path, handler_cls in self._routes:
-            if not issubclass(handler_cls, BaseHTTPHandler):
-                continue
-
+        for spec in self._route_registry:
             handler_hints = {}
-            for m in METHODS_ALL:
-                method_name = m.lower()
-                method_func = getattr(handler_cls, method_name, None)
-                if method_func is not None:
-                    hints = get_type_hints(method_func)
-                    if 'return' in hints:
-                        handler_hints.update({method_name: hints})
-                    else:
-                        self.logger.warning(f'handler:{handler_cls.__name__}:function:{method_name}: '
-                                            f'does not define return type')
+            for method in spec.methods.values():
+                if method.has_response_type:
+                    handler_hints[method.name] = method.type_hints()
+                else:
+                    self.logger.warning(f'handler:{spec.handler.__name__}:function:{method.name}: '
+                                        f'does not define return type')
 
             if handler_hints:
-                routes.append((path, handler_cls, handler_hints))
+                routes.append((spec.path, spec.handler, handler_hints))
+
+        from aior.docs import get_openapi
 
         info = {'title': f'{self._app_name.capitalize()} API', 'version': self._docs_version}
         return get_openapi(routes=routes, info=info, openapi_version=self._openapi_version)
@@ -320,7 +503,8 @@ class AiorApplication(web.Application):
         """
 
     def setup(self):
-        self._init_logging()
+        self._profile('init_logging', self._init_logging)
+        server_logger.info(f'Using {self._loop_impl} event loop.')
 
         if (self._ssl_context is not None
                 and self._ssl_key is not None
@@ -328,11 +512,88 @@ class AiorApplication(web.Application):
             self._init_ssl()
 
         if self._enable_docs:
-            self._init_docs()
-
-        self._init_routes()
+            self._profile('init_docs', self._init_docs)
+
+        if self._metrics is not None:
+            self._routes.insert(0, (self._metrics_url, MetricsHandler))
+            self._metrics.set_info(aior.__version__, self._loop_impl)
+
+        if self._config.get('database'):
+            self._profile('init_database', self._init_database)
+
+        self._profile('init_middlewares', self._init_middlewares)
+        self._profile('init_routes', self._init_routes)
+
+        if self._profile_startup:
+            total = sum(self._startup_profile.values())
+            steps = ', '.join(f'{name}={duration * 1000:.1f}ms'
+                              for name, duration in self._startup_profile.items())
+            server_logger.info(f'Startup profile: {steps}, total={total * 1000:.1f}ms.')
+
+    def _init_database(self) -> None:
+        from aior.components.dao import init_engine
+
+        options = _parse_database_config(self._config['database'])
+        warm_up = options.pop('warm_up', None)
+        if warm_up is not None:
+            self._db_warm_up = warm_up
+        init_engine(**options)
+
+    async def _start_database(self) -> None:
+        # engines may also be created by `on_start`, only look at the DAO module once it is imported
+        dao = sys.modules.get('aior.components.dao')
+        if dao is None or dao.BaseDAO.__engine__ is None:
+            return
+        if self._metrics is not None:
+            dao.watch_pools(PoolMetrics(self._metrics, self._metrics_buckets))
+        if self._db_warm_up:
+            started = time.perf_counter()
+            await dao.warm_up_pools(self._db_warm_up)
+            server_logger.info(f'Warmed up the database pools '
+                               f'in {(time.perf_counter() - started) * 1000:.1f}ms.')
+
+    def _profile(self, name: str, func: Callable[..., None], *args: Any) -> None:
+        started = time.perf_counter()
+        func(*args)
+        self._startup_profile[name] = time.perf_counter() - started
 
     def run(self):
+        if self._workers > 1:
+            self._run_workers()
+        else:
+            self._serve()
+
+    def _run_workers(self) -> None:
+        # open the listening sockets once, forked workers accept on them,
+        # except TCP ones bound by every worker itself with SO_REUSEPORT
+        self._socks = []
+        try:
+            for kind, address in self._listeners:
+                if not (kind == TCP and self._reuse_port):
+                    self._socks.extend(open_listener_sockets(kind, address))
+            # workers run their own loops, the one of the master is never used
+            self._loop.close()
+            server_logger.info(f'Server start with {self._workers} workers.')
+            WorkerSupervisor(self._run_worker, self._workers, server_logger).run()
+        finally:
+            for sock in self._socks:
+                if sock.family == socket.AF_UNIX:
+                    _unlink_unix_socket(sock)
+                sock.close()
+        server_logger.info('Server stop.')
+
+    def _run_worker(self, worker_id: int) -> None:
+        self._worker_id = worker_id
+        if self._metrics is not None:
+            # every worker exposes its own metrics, tell them apart
+            self._metrics.info.clear()
+            self._metrics.set_info(aior.__version__, self._loop_impl, worker_id)
+        self._loop = (self._loop_policy.new_event_loop() if self._loop_policy is not None
+                      else asyncio.new_event_loop())
+        asyncio.set_event_loop(self._loop)
+        self._serve()
+
+    def _serve(self) -> None:
         self._loop.run_until_complete(self.start_runner())
 
         self.logger.info('Server start.')
@@ -343,7 +604,7 @@ class AiorApplication(web.Application):
         finally:
             self._loop.run_until_complete(self._runner.cleanup())
             self.logger.info('Runner cleaned up.')
-            for task in asyncio.Task.all_tasks(self._loop):
+            for task in asyncio.all_tasks(self._loop):
                 task.cancel()
             if sys.version_info >= (3, 6):  # don't use PY_36 to pass mypy
                 self._loop.run_until_complete(self._loop.shutdown_asyncgens())
@@ -352,21 +613,86 @@ class AiorApplication(web.Application):
 
     async def start_runner(self) -> None:
         await self.on_start()
+        await self._start_database()
         await self._runner.setup()
-        site = web.TCPSite(self._runner,
-                           self._host,
-                           self._port,
-                           ssl_context=self._ssl_context)
-        await site.start()
+        for site in self._make_sites():
+            await site.start()
+            server_logger.info(f'Listening on {site.name}.')
+
+    def _make_sites(self) -> List[web.BaseSite]:
+        sites = []  # type: List[web.BaseSite]
+        listeners = self._listeners
+        if self._socks is not None:
+            # opened by the master before forking the workers
+            sites.extend(web.SockSite(self._runner, sock, ssl_context=self._ssl_context)
+                         for sock in self._socks)
+            listeners = [(kind, address) for kind, address in listeners
+                         if kind == TCP and self._reuse_port]
+
+        for kind, address in listeners:
+            if kind == TCP:
+                host, port = address
+                sites.append(web.TCPSite(self._runner,
+                                         host,
+                                         port,
+                                         ssl_context=self._ssl_context,
+                                         reuse_port=self._reuse_port or None))
+            elif kind == UNIX:
+                sites.append(web.UnixSite(self._runner,
+                                          address[0],
+                                          ssl_context=self._ssl_context))
+            else:
+                sites.extend(web.SockSite(self._runner, sock, ssl_context=self._ssl_context)
+                             for sock in open_listener_sockets(kind, address))
+        return sites
+
+    @property
+    def metrics(self) -> Optional[HTTPMetrics]:
+        return self._metrics
+
+    @property
+    def route_registry(self) -> RouteRegistry:
+        return self._route_registry
+
+    @property
+    def startup_profile(self) -> Dict[str, float]:
+        return self._startup_profile
+
+    @property
+    def loop_impl(self) -> str:
+        return self._loop_impl
+
+    @property
+    def worker_id(self) -> Optional[int]:
+        return self._worker_id
+
+    @property
+    def json_codec(self) -> JSONCodec:
+        return self._json_codec
 
     @property
     def openapi_url(self):
         return self._openapi_url
 
     @property
-    def openapi_schema(self):
+    def openapi_schema(self) -> Dict[str, Any]:
+        # generated on the first request, so large services don't pay for it at boot
+        if self._openapi_schema is None:
+            self._openapi_schema = self.openapi()
         return self._openapi_schema
 
+    def get_docs_document(self,
+                          name: str,
+                          render: Callable[[], bytes],
+                          content_type: str,
+                          ) -> 'EncodedDocument':
+        document = self._docs_documents.get(name)
+        if document is None:
+            from aior.docs import EncodedDocument
+            document = EncodedDocument(render(), content_type, precompress=self._docs_precompress)
+            self._docs_documents[name] = document
+        return document
+
     @property
     def docs_title(self):
         return self._docs_title
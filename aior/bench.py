@@ -0,0 +1,321 @@
+"""
+Load benchmark of representative aior handlers against a bare aiohttp baseline.
+
+    python -m aior bench [-c 64] [-d 5] [-s json -s model ...] [--json]
+
+Each server runs in its own process and is driven by an asyncio load
+generator, the report shows requests per second and p50/p99/p999 latency
+of both servers, so the framework overhead can be tracked across versions.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import platform
+import sys
+import time
+from argparse import ArgumentParser
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import aiohttp
+from aiohttp import web
+from pydantic import BaseModel
+
+import aior
+from aior.compat import model_dump, model_validate
+
+__all__ = ('SCENARIOS', 'BenchResult', 'make_aior_app', 'make_baseline_app', 'run_bench', 'main')
+
+SERVERS = ('aiohttp', 'aior')
+
+PAYLOAD = {'id': 1, 'name': 'aior', 'tags': ['fast', 'async'], 'price': 9.99, 'active': True}
+
+
+class Item(BaseModel):
+    name: str
+    price: float
+    tags: List[str] = []
+
+
+class ItemPath(BaseModel):
+    item_id: int
+
+
+class SearchQuery(BaseModel):
+    q: str
+    limit: int = 10
+
+
+# name: (method, path, request kwargs), `ws` is the websocket echo
+SCENARIOS = {
+    'json': ('GET', '/json', {}),
+    'model': ('POST', '/items', {'json': {'name': 'aior', 'price': 9.99, 'tags': ['a', 'b']}}),
+    'path': ('GET', '/items/42', {}),
+    'queries': ('GET', '/search', {'params': {'q': 'aior', 'limit': '20'}}),
+    'ws': ('GET', '/ws', {}),
+}
+
+
+def make_aior_app() -> web.Application:
+    from aior.application import AiorApplication, LoggingConfig
+    from aior.components import BaseHTTPHandler, BaseWebSocketHandler, JSONBody, JSONResponse, PathArgs, Queries
+
+    class PlainJSONHandler(BaseHTTPHandler):
+        @staticmethod
+        async def get() -> JSONResponse[dict]:
+            return JSONResponse(PAYLOAD)
+
+    class ItemsHandler(BaseHTTPHandler):
+        @staticmethod
+        async def post(item: JSONBody[Item]) -> JSONResponse[Item]:
+            return JSONResponse(item)
+
+    class ItemHandler(BaseHTTPHandler):
+        @staticmethod
+        async def get(path_args: PathArgs[ItemPath]) -> JSONResponse[dict]:
+            return JSONResponse({'item_id': path_args.item_id})
+
+    class SearchHandler(BaseHTTPHandler):
+        @staticmethod
+        async def get(queries: Queries[SearchQuery]) -> JSONResponse[dict]:
+            return JSONResponse({'q': queries.q, 'limit': queries.limit})
+
+    class EchoHandler(BaseWebSocketHandler):
+        async def on_message(self, msg: Union[str, bytes]) -> None:
+            await self.send_str(msg)
+
+    return AiorApplication(routes=[
+        ('/json', PlainJSONHandler),
+        ('/items', ItemsHandler),
+        ('/items/{item_id}', ItemHandler),
+        ('/search', SearchHandler),
+        ('/ws', EchoHandler),
+    ], logging_config=LoggingConfig(level=logging.WARNING))
+
+
+def make_baseline_app() -> web.Application:
+    async def plain_json(request: web.Request) -> web.Response:
+        return web.json_response(PAYLOAD)
+
+    async def create_item(request: web.Request) -> web.Response:
+        item = model_validate(Item, await request.json())
+        return web.json_response(model_dump(item))
+
+    async def get_item(request: web.Request) -> web.Response:
+        path_args = model_validate(ItemPath, dict(request.match_info))
+        return web.json_response({'item_id': path_args.item_id})
+
+    async def search(request: web.Request) -> web.Response:
+        queries = model_validate(SearchQuery, dict(request.query))
+        return web.json_response({'q': queries.q, 'limit': queries.limit})
+
+    async def echo(request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                await ws.send_str(msg.data)
+        return ws
+
+    app = web.Application()
+    app.router.add_get('/json', plain_json)
+    app.router.add_post('/items', create_item)
+    app.router.add_get('/items/{item_id}', get_item)
+    app.router.add_get('/search', search)
+    app.router.add_get('/ws', echo)
+    return app
+
+
+_APP_FACTORIES = {
+    'aiohttp': make_baseline_app,
+    'aior': make_aior_app,
+}
+
+
+def _serve(server: str, host: str, port: int, ready) -> None:
+    # AiorApplication parses the command line, keep the bench options away from it
+    sys.argv = sys.argv[:1]
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    runner = web.AppRunner(_APP_FACTORIES[server](), access_log=None, handle_signals=True)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, host, port).start())
+    ready.set()
+    try:
+        loop.run_forever()
+    except (web.GracefulExit, KeyboardInterrupt):
+        pass
+    finally:
+        loop.run_until_complete(runner.cleanup())
+        loop.close()
+
+
+class BenchResult:
+    __slots__ = ('server', 'scenario', 'requests', 'errors', 'duration', 'latencies')
+
+    def __init__(self, server: str, scenario: str) -> None:
+        self.server = server
+        self.scenario = scenario
+        self.requests = 0
+        self.errors = 0
+        self.duration = 0.0
+        self.latencies = []  # type: List[float]
+
+    @property
+    def rps(self) -> float:
+        return self.requests / self.duration if self.duration else 0.0
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'server': self.server,
+            'scenario': self.scenario,
+            'requests': self.requests,
+            'errors': self.errors,
+            'rps': round(self.rps, 1),
+            'p50_ms': round(self.percentile(0.5) * 1000, 3),
+            'p99_ms': round(self.percentile(0.99) * 1000, 3),
+            'p999_ms': round(self.percentile(0.999) * 1000, 3),
+        }
+
+
+async def _http_worker(session: aiohttp.ClientSession, url: str, method: str, kwargs: Dict[str, Any],
+                       result: BenchResult, measure_from: float, deadline: float) -> None:
+    while True:
+        started = time.perf_counter()
+        if started >= deadline:
+            return
+        try:
+            async with session.request(method, url, **kwargs) as resp:
+                await resp.read()
+                failed = resp.status >= 400
+        except aiohttp.ClientError:
+            failed = True
+        if started >= measure_from:
+            result.latencies.append(time.perf_counter() - started)
+            result.requests += 1
+            result.errors += failed
+
+
+async def _ws_worker(session: aiohttp.ClientSession, url: str,
+                     result: BenchResult, measure_from: float, deadline: float) -> None:
+    async with session.ws_connect(url) as ws:
+        while True:
+            started = time.perf_counter()
+            if started >= deadline:
+                return
+            await ws.send_str('ping')
+            msg = await ws.receive()
+            if started >= measure_from:
+                result.latencies.append(time.perf_counter() - started)
+                result.requests += 1
+                result.errors += msg.type != aiohttp.WSMsgType.TEXT
+
+
+async def drive(server: str, scenario: str, base_url: str,
+                concurrency: int, duration: float, warmup: float) -> BenchResult:
+    """
+    Keep `concurrency` requests in flight for `warmup + duration` seconds,
+    only the ones started after the warmup are measured.
+    """
+    method, path, kwargs = SCENARIOS[scenario]
+    result = BenchResult(server, scenario)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        measure_from = time.perf_counter() + warmup
+        deadline = measure_from + duration
+        if scenario == 'ws':
+            workers = [_ws_worker(session, base_url + path, result, measure_from, deadline)
+                       for _ in range(concurrency)]
+        else:
+            workers = [_http_worker(session, base_url + path, method, kwargs, result, measure_from, deadline)
+                       for _ in range(concurrency)]
+        await asyncio.gather(*workers)
+    result.duration = duration
+    return result
+
+
+def run_bench(*,
+              scenarios: Sequence[str] = tuple(SCENARIOS),
+              servers: Sequence[str] = SERVERS,
+              host: str = '127.0.0.1',
+              port: int = 8411,
+              concurrency: int = 64,
+              duration: float = 5.0,
+              warmup: float = 1.0,
+              ) -> List[BenchResult]:
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for server in servers:
+        ready = ctx.Event()
+        process = ctx.Process(target=_serve, args=(server, host, port, ready), daemon=True)
+        process.start()
+        try:
+            if not ready.wait(30):
+                raise RuntimeError(f'{server} server did not start')
+            for scenario in scenarios:
+                results.append(asyncio.run(drive(server, scenario, f'http://{host}:{port}',
+                                                 concurrency, duration, warmup)))
+        finally:
+            process.terminate()
+            process.join()
+    return results
+
+
+def format_report(results: Sequence[BenchResult]) -> str:
+    baselines = {r.scenario: r for r in results if r.server == 'aiohttp'}
+    lines = [f'aior {aior.__version__}, aiohttp {aiohttp.__version__}, '
+             f'{platform.python_implementation()} {platform.python_version()}',
+             f'{"scenario":<10}{"server":<10}{"rps":>10}{"p50 ms":>10}{"p99 ms":>10}{"p999 ms":>10}'
+             f'{"errors":>8}{"vs aiohttp":>12}']
+    for r in sorted(results, key=lambda r: (list(SCENARIOS).index(r.scenario), SERVERS.index(r.server))):
+        baseline = baselines.get(r.scenario)
+        relative = ''
+        if baseline is not None and baseline is not r and baseline.rps:
+            relative = f'{(r.rps / baseline.rps - 1) * 100:+.1f}%'
+        lines.append(f'{r.scenario:<10}{r.server:<10}{r.rps:>10.0f}{r.percentile(0.5) * 1000:>10.2f}'
+                     f'{r.percentile(0.99) * 1000:>10.2f}{r.percentile(0.999) * 1000:>10.2f}'
+                     f'{r.errors:>8}{relative:>12}')
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    arg_parser = ArgumentParser(prog='python -m aior bench',
+                                description='Benchmark aior handlers against a bare aiohttp baseline')
+    arg_parser.add_argument('-s', '--scenario', action='append', choices=tuple(SCENARIOS),
+                            help='Scenario to run, repeat for several (default: all)')
+    arg_parser.add_argument('--server', action='append', choices=SERVERS,
+                            help='Server to benchmark, repeat for several (default: all)')
+    arg_parser.add_argument('-c', '--concurrency', type=int, default=64,
+                            help='Requests in flight (default: %(default)r)')
+    arg_parser.add_argument('-d', '--duration', type=float, default=5.0,
+                            help='Measured seconds per scenario (default: %(default)r)')
+    arg_parser.add_argument('-w', '--warmup', type=float, default=1.0,
+                            help='Unmeasured seconds before each scenario (default: %(default)r)')
+    arg_parser.add_argument('--host', default='127.0.0.1', help='Host to serve on (default: %(default)r)')
+    arg_parser.add_argument('-p', '--port', type=int, default=8411, help='Port to serve on (default: %(default)r)')
+    arg_parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = arg_parser.parse_args(argv)
+
+    results = run_bench(scenarios=args.scenario or tuple(SCENARIOS),
+                        servers=args.server or SERVERS,
+                        host=args.host,
+                        port=args.port,
+                        concurrency=args.concurrency,
+                        duration=args.duration,
+                        warmup=args.warmup)
+    if args.json:
+        print(json.dumps({
+            'aior': aior.__version__,
+            'aiohttp': aiohttp.__version__,
+            'python': platform.python_version(),
+            'results': [r.to_dict() for r in results],
+        }, indent=2))
+    else:
+        print(format_report(results))
+    return 1 if any(r.errors for r in results) else 0
@@ -0,0 +1,293 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from aiohttp import hdrs, web
+from multidict import CIMultiDict
+
+from aior.constants import DEFAULT_CACHE_MAXSIZE, DEFAULT_CACHE_TTL
+
+__all__ = (
+    'TTLCache',
+    'CachedResponse',
+    'ResponseCache',
+    'RequestCoalescer',
+    'make_request_key',
+    'cache_response',
+    'coalesce_requests',
+)
+
+
+class TTLCache:
+    """
+    Size bounded LRU mapping whose entries expire `ttl` seconds after being set.
+    """
+
+    def __init__(self,
+                 maxsize: int = DEFAULT_CACHE_MAXSIZE,
+                 ttl: Optional[float] = DEFAULT_CACHE_TTL,
+                 timer: Callable[[], float] = time.monotonic,
+                 ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data = OrderedDict()  # type: OrderedDict[Hashable, Tuple[float, Any]]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at is not None and expires_at <= self._timer():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = None if ttl is None else self._timer() + ttl
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def invalidate(self, predicate: Callable[[Hashable], bool] = None) -> int:
+        """
+        Drop the entries whose key matches `predicate`, or every entry.
+        """
+        if predicate is None:
+            count = len(self._data)
+            self._data.clear()
+            return count
+        keys = [key for key in self._data if predicate(key)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+# responses meant for one client only, never replayed to others
+_PRIVATE_CACHE_DIRECTIVES = frozenset(('private', 'no-store'))
+
+
+def _is_private(response: web.StreamResponse) -> bool:
+    if response.cookies or hdrs.SET_COOKIE in response.headers:
+        return True
+    directives = response.headers.get(hdrs.CACHE_CONTROL, '').split(',')
+    return any(d.split('=', 1)[0].strip().lower() in _PRIVATE_CACHE_DIRECTIVES for d in directives)
+
+
+class CachedResponse:
+    """
+    Immutable snapshot of an encoded response that can be replayed many times,
+    responses setting cookies or marked `Cache-Control: private`/`no-store` have none.
+    """
+    __slots__ = ('status', 'reason', 'headers', 'body')
+
+    def __init__(self, status: int, reason: str, headers: Tuple[Tuple[str, str], ...], body: bytes) -> None:
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    @classmethod
+    def from_response(cls, response: web.StreamResponse) -> Optional['CachedResponse']:
+        if (not isinstance(response, web.Response)
+                or not isinstance(response.body, (bytes, bytearray))
+                or response.compression
+                or _is_private(response)):
+            return None
+        headers = tuple((k, v) for k, v in response.headers.items()
+                        if k != hdrs.CONTENT_LENGTH)
+        return cls(response.status, response.reason, headers, bytes(response.body))
+
+    def to_response(self) -> web.Response:
+        return web.Response(body=self.body,
+                            status=self.status,
+                            reason=self.reason,
+                            headers=CIMultiDict(self.headers))
+
+
+def make_request_key(request: web.Request, vary_headers: Tuple[str, ...] = ()) -> Tuple:
+    match_info = request.match_info
+    resource = match_info.route.resource
+    return (resource.canonical if resource is not None else request.path,
+            tuple(sorted(match_info.items())),
+            tuple(sorted(request.query.items())),
+            tuple(request.headers.get(h) for h in vary_headers))
+
+
+class ResponseCache:
+    """
+    Server side cache of encoded responses of one handler method.
+
+    Entries are keyed by route, path arguments, query arguments and the
+    values of `vary_headers`; only `200` responses with a body and without
+    cookies or a private `Cache-Control` are stored.
+    """
+
+    def __init__(self,
+                 ttl: Optional[float] = DEFAULT_CACHE_TTL,
+                 maxsize: int = DEFAULT_CACHE_MAXSIZE,
+                 vary_headers: Iterable[str] = (),
+                 ) -> None:
+        self.vary_headers = tuple(vary_headers)
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def make_key(self, request: web.Request) -> Tuple:
+        return make_request_key(request, self.vary_headers)
+
+    def get(self, key: Tuple) -> Optional[web.Response]:
+        cached = self._cache.get(key)
+        return None if cached is None else cached.to_response()
+
+    def store(self, key: Tuple, response: web.StreamResponse) -> None:
+        if response.status != 200:
+            return
+        cached = CachedResponse.from_response(response)
+        if cached is not None:
+            self._cache.set(key, cached)
+
+    def invalidate(self, **path_args: Any) -> int:
+        """
+        Drop the entries matching all `path_args`, or every entry.
+        """
+        if not path_args:
+            return self._cache.invalidate()
+        expected = {(k, str(v)) for k, v in path_args.items()}
+        return self._cache.invalidate(lambda key: expected.issubset(key[1]))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats
+
+
+class RequestCoalescer:
+    """
+    Single-flight execution of one handler method: concurrent requests with
+    the same route, path arguments, query arguments and `vary_headers` values
+    share one in-flight call and each receive a copy of its encoded response.
+    """
+
+    def __init__(self, vary_headers: Iterable[str] = ()) -> None:
+        self.vary_headers = tuple(vary_headers)
+        self._inflight = {}  # type: Dict[Tuple, asyncio.Future]
+        self.calls = 0
+        self.coalesced = 0
+
+    async def call(self,
+                   request: web.Request,
+                   fn: Callable[[], Awaitable[web.StreamResponse]],
+                   ) -> web.StreamResponse:
+        key = make_request_key(request, self.vary_headers)
+        task = self._inflight.get(key)
+        leader = task is None
+        if leader:
+            self.calls += 1
+            # run apart from the leader's task, so its cancellation
+            # (e.g. a client disconnect) does not fail the followers
+            task = asyncio.ensure_future(self._run(fn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+
+        snapshot, response = await asyncio.shield(task)
+        if snapshot is not None:
+            return snapshot.to_response()
+        if leader:
+            return response
+        # the response can not be replayed, e.g. a streamed one
+        return await fn()
+
+    @staticmethod
+    async def _run(fn: Callable[[], Awaitable[web.StreamResponse]]
+                   ) -> Tuple[Optional[CachedResponse], web.StreamResponse]:
+        try:
+            response = await fn()
+        except web.HTTPException as e:
+            response = e
+        return CachedResponse.from_response(response), response
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            'inflight': len(self._inflight),
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+        }
+
+
+def _set_handler_attr(func, name: str, value: Any) -> None:
+    target = func.__func__ if isinstance(func, (staticmethod, classmethod)) else func
+    setattr(target, name, value)
+
+
+def cache_response(ttl: Optional[float] = DEFAULT_CACHE_TTL,
+                   maxsize: int = DEFAULT_CACHE_MAXSIZE,
+                   vary_headers: Iterable[str] = (),
+                   ):
+    """
+    Cache the encoded responses of a `BaseHTTPHandler` method,
+    the cache is reachable as `Handler.get.__cache__` for invalidation and stats.
+    """
+
+    def decorator(func):
+        _set_handler_attr(func, '__cache__',
+                          ResponseCache(ttl=ttl, maxsize=maxsize, vary_headers=vary_headers))
+        return func
+
+    return decorator
+
+
+def coalesce_requests(vary_headers: Iterable[str] = ()):
+    """
+    Share one execution of a read-only `BaseHTTPHandler` method among identical
+    concurrent requests, reachable as `Handler.get.__coalesce__` for stats.
+    With `__db_session__` the shared execution gets a session scope of its own.
+    """
+
+    def decorator(func):
+        _set_handler_attr(func, '__coalesce__', RequestCoalescer(vary_headers=vary_headers))
+        return func
+
+    return decorator
@@ -0,0 +1,194 @@
+import contextvars
+import json
+from functools import lru_cache
+from json import JSONEncoder
+from typing import Any, Type, Union, Optional
+
+from pydantic import BaseModel
+
+from aior.compat import model_dump
+
+__all__ = (
+    'JSONCodec',
+    'StdJSONCodec',
+    'OrjsonCodec',
+    'UjsonCodec',
+    'make_json_codec',
+    'get_json_codec',
+    'set_json_codec',
+    'resolve_json_codec',
+    'use_json_codec',
+    'reset_json_codec',
+)
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return model_dump(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class JSONCodec:
+    """
+    Encoder/decoder shared by every JSON path of aior: responses, errors,
+    websocket messages, docs and request bodies.
+
+    Subclasses implement `dumpb` (to bytes) and `loads` (from str or bytes);
+    nested pydantic models are encoded as their dicts.
+    """
+    name = None  # type: str
+
+    def dumps(self, obj: Any) -> str:
+        return self.dumpb(obj).decode('utf-8')
+
+    def dumpb(self, obj: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f'<{self.__class__.__name__} {self.name}>'
+
+
+class StdJSONCodec(JSONCodec):
+    name = 'json'
+
+    def __init__(self, encoder: Type[JSONEncoder] = JSONEncoder) -> None:
+        class ModelJSONEncoder(encoder):
+            def default(self, o: Any) -> Any:
+                if isinstance(o, BaseModel):
+                    return model_dump(o)
+                return super().default(o)
+
+        self._encoder = ModelJSONEncoder()
+        self._decoder = json.JSONDecoder()
+
+    def dumps(self, obj: Any) -> str:
+        return self._encoder.encode(obj)
+
+    def dumpb(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj).encode('utf-8')
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        if not isinstance(data, str):
+            return json.loads(data)
+        return self._decoder.decode(data)
+
+
+class OrjsonCodec(JSONCodec):
+    name = 'orjson'
+
+    def __init__(self, option: int = None) -> None:
+        import orjson
+        self._orjson = orjson
+        self._option = orjson.OPT_NON_STR_KEYS if option is None else option
+
+    def dumpb(self, obj: Any) -> bytes:
+        return self._orjson.dumps(obj, default=_default, option=self._option)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return self._orjson.loads(data)
+
+
+class UjsonCodec(JSONCodec):
+    name = 'ujson'
+
+    def __init__(self) -> None:
+        import ujson
+        self._ujson = ujson
+
+    def dumps(self, obj: Any) -> str:
+        return self._ujson.dumps(obj, default=_default)
+
+    def dumpb(self, obj: Any) -> bytes:
+        return self.dumps(obj).encode('utf-8')
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return self._ujson.loads(data)
+
+
+_CODECS = {
+    OrjsonCodec.name: OrjsonCodec,
+    UjsonCodec.name: UjsonCodec,
+    StdJSONCodec.name: StdJSONCodec,
+}
+
+
+def make_json_codec(name: str = 'auto') -> JSONCodec:
+    """
+    Build a codec by name, `auto` picks the fastest installed one
+    and falls back to the standard library.
+    """
+    if name == 'auto':
+        for codec_cls in _CODECS.values():
+            try:
+                return codec_cls()
+            except ImportError:
+                continue
+    try:
+        codec_cls = _CODECS[name]
+    except KeyError:
+        raise ValueError(f'not supported json codec({name})') from None
+    return codec_cls()
+
+
+@lru_cache(maxsize=None)
+def _std_codec(encoder: Type[JSONEncoder]) -> StdJSONCodec:
+    return StdJSONCodec(encoder)
+
+
+_json_codec = _std_codec(JSONEncoder)  # type: JSONCodec
+
+# codec of the application handling the current request, see `use_json_codec`
+_current_codec = contextvars.ContextVar('aior_json_codec', default=None)  # type: contextvars.ContextVar
+
+
+def get_json_codec(encoder: Optional[Type[JSONEncoder]] = None) -> JSONCodec:
+    """
+    Return the codec of the application handling the current request, else the
+    process default, or a standard library codec bound to `encoder` when it is given.
+    """
+    if encoder is not None:
+        return _std_codec(encoder)
+    codec = _current_codec.get()
+    return _json_codec if codec is None else codec
+
+
+def resolve_json_codec(codec: Union[JSONCodec, str, None],
+                       encoder: Type[JSONEncoder] = JSONEncoder,
+                       ) -> JSONCodec:
+    """
+    Build the codec named by `codec`, `encoder` only applies to the standard
+    library codec and is rejected with any other one.
+    """
+    if codec is None or codec == StdJSONCodec.name:
+        return _std_codec(encoder)
+    if isinstance(codec, str):
+        codec = make_json_codec(codec)
+    if encoder is not JSONEncoder and not isinstance(codec, StdJSONCodec):
+        raise ValueError(f'a custom json encoder({encoder.__name__}) '
+                         f'is not supported by the {codec.name} codec')
+    return codec
+
+
+def set_json_codec(codec: Union[JSONCodec, str, None],
+                   encoder: Type[JSONEncoder] = JSONEncoder,
+                   ) -> JSONCodec:
+    """
+    Set the process default codec, used outside of application requests.
+    """
+    global _json_codec
+    _json_codec = resolve_json_codec(codec, encoder)
+    return _json_codec
+
+
+def use_json_codec(codec: Optional[JSONCodec]) -> contextvars.Token:
+    """
+    Make `codec` the codec of the current context, e.g. one request.
+    """
+    return _current_codec.set(codec)
+
+
+def reset_json_codec(token: contextvars.Token) -> None:
+    _current_codec.reset(token)
@@ -0,0 +1,159 @@
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, Union
+
+import pydantic
+from pydantic import BaseModel, ValidationError
+
+__all__ = (
+    'PYDANTIC_V2',
+    'model_validate',
+    'model_validate_json',
+    'model_from_orm',
+    'validate_list',
+    'validate_list_json',
+    'model_dump',
+    'model_to_dict',
+    'dump_models_json',
+    'model_json_schema',
+    'validation_errors',
+    'get_model_definitions',
+)
+
+PYDANTIC_V2 = int(pydantic.VERSION.split('.')[0]) >= 2
+
+if PYDANTIC_V2:
+    from pydantic import TypeAdapter
+    from pydantic.json_schema import models_json_schema
+
+    @lru_cache(maxsize=None)
+    def get_type_adapter(typ: Any) -> 'TypeAdapter':
+        return TypeAdapter(typ)
+
+    def model_validate(model: Type[BaseModel], data: Any) -> BaseModel:
+        return model.model_validate(data)
+
+    def model_validate_json(model: Type[BaseModel], raw: Union[str, bytes]) -> BaseModel:
+        return model.model_validate_json(raw)
+
+    def model_from_orm(model: Type[BaseModel], obj: Any) -> BaseModel:
+        return model.model_validate(obj, from_attributes=True)
+
+    def validate_list(typ: Type[List[BaseModel]], data: Any) -> List[BaseModel]:
+        return get_type_adapter(typ).validate_python(data)
+
+    def validate_list_json(typ: Type[List[BaseModel]], raw: Union[str, bytes]) -> List[BaseModel]:
+        return get_type_adapter(typ).validate_json(raw)
+
+    def model_dump(obj: BaseModel) -> Dict[str, Any]:
+        return obj.model_dump(mode='json')
+
+    def model_to_dict(obj: BaseModel, exclude_unset: bool = False) -> Dict[str, Any]:
+        # python objects kept as is, e.g. datetimes for database rows
+        return obj.model_dump(exclude_unset=exclude_unset)
+
+    def dump_models_json(data: Any) -> Optional[bytes]:
+        """
+        Serialize a model, or a list of models of one class,
+        straight to bytes with the pydantic-core serializer.
+        """
+        if isinstance(data, BaseModel):
+            return get_type_adapter(type(data)).dump_json(data)
+        if isinstance(data, list) and data:
+            model = type(data[0])
+            if issubclass(model, BaseModel) and all(type(i) is model for i in data):
+                return get_type_adapter(List[model]).dump_json(data)
+        return None
+
+    def model_json_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+        return model.model_json_schema()
+
+    # v1 type and message of the common errors, the others keep their v2 ones
+    _V1_ERRORS = {
+        'missing': ('value_error.missing', 'field required'),
+        'extra_forbidden': ('value_error.extra', 'extra fields not permitted'),
+        'json_invalid': ('value_error.jsondecode', None),
+        'string_type': ('type_error.str', 'str type expected'),
+        'int_type': ('type_error.integer', 'value is not a valid integer'),
+        'int_parsing': ('type_error.integer', 'value is not a valid integer'),
+        'float_type': ('type_error.float', 'value is not a valid float'),
+        'float_parsing': ('type_error.float', 'value is not a valid float'),
+        'bool_type': ('type_error.bool', 'value could not be parsed to a boolean'),
+        'bool_parsing': ('type_error.bool', 'value could not be parsed to a boolean'),
+        'list_type': ('type_error.list', 'value is not a valid list'),
+        'dict_type': ('type_error.dict', 'value is not a valid dict'),
+        'model_type': ('type_error.dict', 'value is not a valid dict'),
+    }
+
+    def validation_errors(e: ValidationError) -> List[Dict[str, Any]]:
+        # without the input, which may be the raw request body
+        errors = []
+        for error in e.errors(include_url=False, include_context=False, include_input=False):
+            typ, msg = _V1_ERRORS.get(error['type'], (error['type'], None))
+            errors.append({'loc': error['loc'] or ('__root__',), 'msg': msg or error['msg'], 'type': typ})
+        return errors
+
+    def get_model_definitions(models: Iterable[Type[BaseModel]],
+                              ref_prefix: str,
+                              ) -> Tuple[Dict[str, Dict], Dict[Type[BaseModel], str]]:
+        models = list(models)
+        if not models:
+            return {}, {}
+        key_map, schema = models_json_schema([(m, 'validation') for m in models],
+                                             ref_template=f'{ref_prefix}{{model}}')
+        model_name_map = {m: key_map[(m, 'validation')]['$ref'][len(ref_prefix):]
+                          for m in models}
+        return schema.get('$defs', {}), model_name_map
+else:
+    from pydantic import parse_obj_as, parse_raw_as
+    from pydantic.schema import model_process_schema, get_flat_models_from_model, get_model_name_map
+
+    def model_validate(model: Type[BaseModel], data: Any) -> BaseModel:
+        return model.parse_obj(data)
+
+    def model_validate_json(model: Type[BaseModel], raw: Union[str, bytes]) -> BaseModel:
+        return model.parse_raw(raw)
+
+    def model_from_orm(model: Type[BaseModel], obj: Any) -> BaseModel:
+        if model.__config__.orm_mode:
+            return model.from_orm(obj)
+        # `from_orm` needs `orm_mode`, read the fields by hand
+        return model.parse_obj({f.alias: getattr(obj, f.name)
+                                for f in model.__fields__.values() if hasattr(obj, f.name)})
+
+    def validate_list(typ: Type[List[BaseModel]], data: Any) -> List[BaseModel]:
+        return parse_obj_as(typ, data)
+
+    def validate_list_json(typ: Type[List[BaseModel]], raw: Union[str, bytes]) -> List[BaseModel]:
+        return parse_raw_as(typ, raw)
+
+    def model_dump(obj: BaseModel) -> Dict[str, Any]:
+        return obj.dict()
+
+    def model_to_dict(obj: BaseModel, exclude_unset: bool = False) -> Dict[str, Any]:
+        return obj.dict(exclude_unset=exclude_unset)
+
+    def dump_models_json(data: Any) -> Optional[bytes]:
+        return None
+
+    def model_json_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+        return model.schema()
+
+    def validation_errors(e: ValidationError) -> List[Dict[str, Any]]:
+        return e.errors()
+
+    def get_model_definitions(models: Iterable[Type[BaseModel]],
+                              ref_prefix: str,
+                              ) -> Tuple[Dict[str, Dict], Dict[Type[BaseModel], str]]:
+        flat_models = set()
+        for model in models:
+            flat_models |= get_flat_models_from_model(model, flat_models)
+        model_name_map = get_model_name_map(flat_models)
+
+        definitions = {}  # type: Dict[str, Dict]
+        for model in flat_models:
+            m_schema, m_definitions, m_nested_models = model_process_schema(
+                model, model_name_map=model_name_map, ref_prefix=ref_prefix
+            )
+            definitions.update(m_definitions)
+            definitions[model_name_map[model]] = m_schema
+        return definitions, model_name_map
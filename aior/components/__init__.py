@@ -1,7 +1,66 @@
+import importlib
+
 from aior.components.http_exceptions import *
 from aior.components.http_handler import *
 from aior.components.http_status import *
 from aior.components.ws_exceptions import *
-from aior.components.ws_handlers import *
-from aior.components.stdin_handler import *
-from aior.components.dao import *
+
+_EAGER_MODULES = (
+    "aior.components.http_exceptions",
+    "aior.components.http_handler",
+    "aior.components.http_status",
+    "aior.components.ws_exceptions",
+)
+
+# heavy components (aiohttp websocket client, SQLAlchemy) are imported on first access
+_LAZY_MODULES = {
+    "aior.components.ws_handlers": (
+        "BaseWebSocketHandler",
+        "BaseClientWebSocketHandler",
+        "WebSocketClient",
+    ),
+    "aior.components.stdin_handler": (
+        "BaseStandardInputHandler",
+    ),
+    "aior.components.dao": (
+        "T_table",
+        "Page",
+        "CursorPage",
+        "CursorPageResult",
+        "encode_cursor",
+        "decode_cursor",
+        "init_engine",
+        "init_mysql_engine",
+        "init_sqlite_engine",
+        "generate_tables",
+        "TimedQueuePool",
+        "warm_up_pools",
+        "watch_pools",
+        "ReplicaSet",
+        "RoutingSession",
+        "new_session",
+        "SessionScope",
+        "current_session_scope",
+        "session_scope",
+        "BaseDAO",
+    ),
+}
+_LAZY_ATTRS = {name: module for module, names in _LAZY_MODULES.items() for name in names}
+
+__all__ = tuple(
+    [name for module in _EAGER_MODULES for name in importlib.import_module(module).__all__]
+    + list(_LAZY_ATTRS)
+)
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
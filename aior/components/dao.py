@@ -1,35 +1,83 @@
+import asyncio
+import base64
+import binascii
+import contextvars
+import datetime
+import decimal
 import functools
+import json
 import sys
+import time
+import uuid
 from os import PathLike
 from pathlib import Path
-from typing import Any, Generic, Optional, Tuple, List, Dict, TypeVar, Iterable
+from typing import Any, Generic, Optional, Tuple, List, Dict, Type, TypeVar, Iterable, Iterator, Union, \
+    AsyncIterator, TYPE_CHECKING
 
 from pydantic import BaseModel
 
 try:
-    from sqlalchemy import select, insert, update, delete, asc, desc, MetaData
+    from sqlalchemy import select, insert, update, delete, asc, desc, and_, or_, inspect, text, MetaData
     from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+    from sqlalchemy import event
     from sqlalchemy.ext.asyncio.session import AsyncSession
+    from sqlalchemy.orm import Session, make_transient_to_detached
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+    from sqlalchemy.sql import Select
     from sqlalchemy.sql.functions import count
-    import pymysql
+    from sqlalchemy.dialects.mysql import insert as mysql_insert
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 except ImportError:
     MetaData = AsyncSession = None
+    Session = AsyncAdaptedQueuePool = object
+
+try:
+    import pymysql
+except ImportError:
+    pymysql = None
 
-from aior.constants import DBDialect
+from aior.cache import TTLCache
+from aior.compat import model_to_dict, model_from_orm
+from aior.constants import DBDialect, ReplicaPolicy, TotalMode, DEFAULT_CACHE_MAXSIZE, DEFAULT_CACHE_TTL, \
+    DEFAULT_TOTAL_CACHE_TTL, \
+    DEFAULT_BULK_CHUNK_SIZE, DEFAULT_STREAM_BATCH_SIZE
+
+if TYPE_CHECKING:
+    from aior.metrics import PoolMetrics
 
 __all__ = (
     "T_table",
     "Page",
+    "CursorPage",
+    "CursorPageResult",
+    "encode_cursor",
+    "decode_cursor",
     "init_engine",
     "init_mysql_engine",
     "init_sqlite_engine",
     "generate_tables",
+    "TimedQueuePool",
+    "warm_up_pools",
+    "watch_pools",
+    "ReplicaSet",
+    "RoutingSession",
+    "new_session",
+    "SessionScope",
+    "current_session_scope",
     "session_scope",
     "BaseDAO",
 )
 
 T_table = TypeVar("T_table")
 
+# result and total caches of every DAO class by mapped table, so a write through any DAO invalidates them all
+_RESULT_CACHES = {}  # type: Dict[Any, List[TTLCache]]
+_TOTAL_CACHES = {}  # type: Dict[Any, List[TTLCache]]
+
+_WRITTEN_TABLES = "aior_written_tables"
+
+_SESSION_SCOPE = contextvars.ContextVar("aior_session_scope", default=None)  # type: contextvars.ContextVar
+
 
 def init_engine(*,
                 dialect=DBDialect.MySQL,
@@ -42,17 +90,35 @@ def init_engine(*,
                 pool_recycle: int = 3600,
                 file: PathLike = None,
                 charset="utf8",
+                replicas: Iterable[Any] = None,
+                replica_policy: str = ReplicaPolicy.ROUND_ROBIN,
+                pool_size: int = None,
+                max_overflow: int = None,
+                pool_timeout: float = None,
+                pool_pre_ping: bool = False,
                 **kwargs: Any,
                 ):
+    """
+    Create the primary engine of `BaseDAO`, plus one engine per read replica:
+    `"host[:port]"` strings or dicts overriding the primary connection
+    arguments for MySQL, database files for SQLite.
+
+    Every engine gets its own pool of `pool_size` connections, plus up to
+    `max_overflow` under load, checkouts wait `pool_timeout` seconds at most;
+    unset values keep the SQLAlchemy defaults.
+    """
+    pool_kwargs = dict(pool_size=pool_size, max_overflow=max_overflow,
+                       pool_timeout=pool_timeout, pool_pre_ping=pool_pre_ping)
     if dialect == DBDialect.MySQL:
         init_mysql_engine(host=host, port=port, user=user,
                           password=password, database=database,
                           future=future, pool_recycle=pool_recycle,
-                          charset=charset, **kwargs)
+                          charset=charset, replicas=replicas,
+                          replica_policy=replica_policy, **pool_kwargs, **kwargs)
     elif dialect == DBDialect.SQLite:
         init_sqlite_engine(file=file, future=future,
-                           pool_recycle=pool_recycle,
-                           **kwargs)
+                           pool_recycle=pool_recycle, replicas=replicas,
+                           replica_policy=replica_policy, **pool_kwargs, **kwargs)
     else:
         raise ValueError(f"not supported dialect({dialect})")
 
@@ -66,34 +132,144 @@ def init_mysql_engine(*,
                       future: bool = True,
                       pool_recycle: int = 3600,
                       charset="utf8",
+                      replicas: Iterable[Any] = None,
+                      replica_policy: str = ReplicaPolicy.ROUND_ROBIN,
+                      pool_size: int = None,
+                      max_overflow: int = None,
+                      pool_timeout: float = None,
+                      pool_pre_ping: bool = False,
                       **kwargs: Any,
                       ):
     assert database is not None, "not defined database"
     pymysql.install_as_MySQLdb()
 
-    if not password:
-        db_url = f"mysql://{user}@{host}:{port}/{database}?charset={charset}"
-    else:
-        db_url = f"mysql://{user}:{password}@{host}:{port}/{database}?charset={charset}"
-
+    kwargs.update(_pool_kwargs(pool_size, max_overflow, pool_timeout))
+    kwargs.setdefault("poolclass", TimedQueuePool)
+    primary = dict(host=host, port=port, user=user, password=password, database=database, charset=charset)
     BaseDAO.__engine__ = create_async_engine(
-        db_url, future=future, pool_recycle=pool_recycle, **kwargs)
+        _mysql_url(**primary), future=future, pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping, **kwargs)
+
+    urls = []
+    for replica in replicas or ():
+        if isinstance(replica, str):
+            replica_host, _, replica_port = replica.partition(":")
+            replica = dict(host=replica_host, port=int(replica_port) if replica_port else port)
+        urls.append(_mysql_url(**{**primary, **replica}))
+    _init_replicas(urls, replica_policy, future=future, pool_recycle=pool_recycle,
+                   pool_pre_ping=pool_pre_ping, **kwargs)
+
+
+def _mysql_url(*, host: str, port: int, user: str, password: str, database: str, charset: str) -> str:
+    if not password:
+        return f"mysql://{user}@{host}:{port}/{database}?charset={charset}"
+    return f"mysql://{user}:{password}@{host}:{port}/{database}?charset={charset}"
 
 
 def init_sqlite_engine(*,
                        file: PathLike = None,
                        future: bool = True,
                        pool_recycle: int = 3600,
+                       replicas: Iterable[PathLike] = None,
+                       replica_policy: str = ReplicaPolicy.ROUND_ROBIN,
+                       pool_size: int = None,
+                       max_overflow: int = None,
+                       pool_timeout: float = None,
+                       pool_pre_ping: bool = False,
                        **kwargs: Any,
                        ):
+    if file is not None:
+        # in-memory databases use a single connection, without a queue pool
+        kwargs.update(_pool_kwargs(pool_size, max_overflow, pool_timeout))
+        kwargs.setdefault("poolclass", TimedQueuePool)
+    BaseDAO.__engine__ = create_async_engine(
+        _sqlite_url(file), future=future, pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping, **kwargs)
+    _init_replicas([_sqlite_url(f) for f in replicas or ()], replica_policy,
+                   future=future, pool_recycle=pool_recycle, pool_pre_ping=pool_pre_ping, **kwargs)
+
+
+def _pool_kwargs(pool_size: Optional[int], max_overflow: Optional[int], pool_timeout: Optional[float]) -> Dict[str, Any]:
+    kwargs = dict(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+    return {name: value for name, value in kwargs.items() if value is not None}
+
+
+def _sqlite_url(file: Optional[PathLike]) -> str:
+    # the async engine needs the aiosqlite driver
     if file is None:
-        db_url = "sqlite://"
+        return "sqlite+aiosqlite://"
     elif isinstance(file, Path):
-        db_url = f"sqlite://{file.resolve()}"
+        return f"sqlite+aiosqlite:///{file.resolve()}"
     else:
-        db_url = f"sqlite://{file}"
-    BaseDAO.__engine__ = create_async_engine(
-        db_url, future=future, pool_recycle=pool_recycle, **kwargs)
+        return f"sqlite+aiosqlite:///{file}"
+
+
+def _init_replicas(urls: List[str], policy: str, **kwargs: Any) -> None:
+    if not urls:
+        BaseDAO.__replicas__ = None
+        return
+    BaseDAO.__replicas__ = ReplicaSet([create_async_engine(url, **kwargs) for url in urls], policy)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool reporting how long each checkout waited for a connection
+    to `on_wait`, kept when the engine recreates its pool.
+    """
+    on_wait = None
+
+    def _do_get(self):
+        if self.on_wait is None:
+            return super()._do_get()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.on_wait(time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.on_wait = self.on_wait
+        return pool
+
+
+def _engines() -> List[Tuple[str, AsyncEngine]]:
+    engines = [("primary", BaseDAO.__engine__)] if BaseDAO.__engine__ is not None else []
+    if BaseDAO.__replicas__ is not None:
+        engines.extend((f"replica{i}", engine) for i, engine in enumerate(BaseDAO.__replicas__.engines))
+    return engines
+
+
+async def warm_up_pools(connections: int = None) -> None:
+    """
+    Open `connections` (default and at most: the pool size) connections of each
+    engine at once and give them back to their pool, so the first requests don't
+    pay for connecting. When one fails, the opened ones are given back before raising.
+    """
+    for _, engine in _engines():
+        size = getattr(engine.sync_engine.pool, "size", None)
+        # overflow connections would be discarded on checkin, or wait for a free one
+        count = size() if size is not None else 1
+        if connections is not None:
+            count = min(connections, count)
+        results = await asyncio.gather(*[engine.connect().start() for _ in range(count)],
+                                       return_exceptions=True)
+        for conn in results:
+            if not isinstance(conn, BaseException):
+                await conn.close()
+        for error in results:
+            if isinstance(error, BaseException):
+                raise error
+
+
+def watch_pools(metrics: "PoolMetrics") -> None:
+    """
+    Export the pools of the primary and replica engines to `metrics`, labelled
+    `primary`, `replica0`...
+    """
+    for name, engine in _engines():
+        metrics.watch(name, lambda engine=engine: engine.sync_engine.pool)
+        engine.sync_engine.pool.on_wait = functools.partial(metrics.observe_wait, name)
 
 
 async def generate_tables(meta: MetaData,
@@ -106,14 +282,166 @@ async def generate_tables(meta: MetaData,
         await conn.run_sync(meta.create_all)
 
 
-def session_scope(func):
+class ReplicaSet:
+    """
+    Engines of the read replicas and the policy choosing one for a session:
+    `round_robin`, or `least_connections` which picks the engine with the
+    fewest checked out pool connections.
+    """
+
+    def __init__(self, engines: List[AsyncEngine], policy: str = ReplicaPolicy.ROUND_ROBIN) -> None:
+        if policy not in (ReplicaPolicy.ROUND_ROBIN, ReplicaPolicy.LEAST_CONNECTIONS):
+            raise ValueError(f"not supported replica policy({policy})")
+        assert engines, "no replica engine"
+        self.engines = list(engines)
+        self.policy = policy
+        self._index = 0
+
+    def choose(self) -> AsyncEngine:
+        start = self._index % len(self.engines)
+        self._index += 1
+        if self.policy == ReplicaPolicy.ROUND_ROBIN:
+            return self.engines[start]
+        # ties go round robin too
+        engines = self.engines[start:] + self.engines[:start]
+        return min(engines, key=_checked_out)
+
+    async def dispose(self) -> None:
+        for engine in self.engines:
+            await engine.dispose()
+
+
+def _checked_out(engine: AsyncEngine) -> int:
+    checkedout = getattr(engine.sync_engine.pool, "checkedout", None)
+    return checkedout() if checkedout is not None else 0
+
+
+class RoutingSession(Session):
+    """
+    Session sending plain selects to one replica of `BaseDAO.__replicas__`, chosen
+    on its first read, and everything else (flushes, DML, locking selects, text)
+    to the primary.
+
+    With `read_your_writes` the session sticks to the primary after its first
+    write, so it reads what it wrote whatever the replication lag;
+    `use_primary` sends all of its statements to the primary, as does a
+    transaction begun explicitly (`async with session.begin():`).
+    """
+
+    def __init__(self, *args: Any, use_primary: bool = False, read_your_writes: bool = True, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.use_primary = use_primary
+        self.read_your_writes = read_your_writes
+        self._replica = None  # type: Optional[AsyncEngine]
+
+    def begin(self, nested: bool = False):
+        if not nested and BaseDAO.__replicas__ is not None:
+            # an explicit transaction reads and writes consistently, on one server
+            self.use_primary = True
+        return super().begin(nested=nested)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replicas = BaseDAO.__replicas__
+        if replicas is None:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+
+        if not self.use_primary and not self._flushing \
+                and isinstance(clause, Select) and clause._for_update_arg is None:
+            if self._replica is None:
+                self._replica = replicas.choose()
+            return self._replica.sync_engine
+
+        if self.read_your_writes and (self._flushing or clause is not None):
+            self.use_primary = True
+        return BaseDAO.__engine__.sync_engine
+
+
+def new_session(use_primary: bool = False, read_your_writes: bool = True) -> AsyncSession:
+    return AsyncSession(BaseDAO.__engine__, sync_session_class=RoutingSession,
+                        use_primary=use_primary, read_your_writes=read_your_writes)
+
+
+class SessionScope:
+    """
+    One session shared by every `session_scope` call made inside the scope,
+    e.g. a request: created on first use, committed once when the scope exits
+    normally and rolled back when it raises.
+
+    Tasks started inside the scope inherit it, they must not use the session
+    concurrently; `session_scope` calls of tasks outliving the scope get a
+    session of their own once it is closed.
+    """
+
+    def __init__(self, use_primary: bool = False, read_your_writes: bool = True) -> None:
+        self.use_primary = use_primary
+        self.read_your_writes = read_your_writes
+        self.closed = False
+        self._session = None  # type: Optional[AsyncSession]
+        self._token = None
+
+    @property
+    def session(self) -> AsyncSession:
+        if self.closed:
+            raise RuntimeError("session scope is closed")
+        if self._session is None:
+            self._session = new_session(self.use_primary, self.read_your_writes)
+        return self._session
+
+    async def __aenter__(self) -> "SessionScope":
+        self._token = _SESSION_SCOPE.set(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        _SESSION_SCOPE.reset(self._token)
+        self.closed = True
+        if self._session is None:
+            return
+        try:
+            if exc_type is None:
+                await self._session.commit()
+        finally:
+            # rolls back whatever was not committed
+            await self._session.close()
+
+
+def current_session_scope() -> Optional[SessionScope]:
+    return _SESSION_SCOPE.get()
+
+
+def session_scope(func=None, *, use_primary: bool = False, read_your_writes: bool = True):
+    """
+    Run the decorated method in a session committed on return, reads go to
+    the replicas unless `use_primary`, see `RoutingSession`.
+
+    Inside a `SessionScope` (nested `session_scope` calls, handlers with
+    `__db_session__`) the session of the scope is reused and committed by it;
+    the work of a failing call is rolled back to a SAVEPOINT when the
+    transaction had already begun.
+    """
+    if func is None:
+        return functools.partial(session_scope, use_primary=use_primary, read_your_writes=read_your_writes)
+
     @functools.wraps(func)
     async def wrapper(self, *args, **kwargs):
-        async with AsyncSession(BaseDAO.__engine__) as session:
-            self.db_session = session
-            ret = await func(self, *args, **kwargs)
-            await session.commit()
-            return ret
+        scope = _SESSION_SCOPE.get()
+        if scope is None or scope.closed:
+            async with SessionScope(use_primary, read_your_writes) as scope:
+                self.db_session = scope.session
+                return await func(self, *args, **kwargs)
+
+        session = scope.session
+        self.db_session = session
+        if use_primary:
+            session.sync_session.use_primary = True
+        if session.in_transaction():
+            async with session.begin_nested():
+                return await func(self, *args, **kwargs)
+        try:
+            return await func(self, *args, **kwargs)
+        except BaseException:
+            # nothing else in the transaction yet, same as a SAVEPOINT
+            await session.rollback()
+            raise
 
     return wrapper
 
@@ -126,6 +454,110 @@ class Page(BaseModel):
     word_column: str = "name"
 
 
+def _chunks(rows: Iterable[Union[Dict[str, Any], BaseModel]],
+            size: int,
+            ) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Group `rows` as dicts, models dumped with their defaults, in chunks of at most
+    `size` rows with the same keys, which one multi-row statement needs: a row
+    with other keys than the previous one starts a new chunk.
+    """
+    chunk = []
+    keys = None
+    for row in rows:
+        if isinstance(row, BaseModel):
+            row = model_to_dict(row)
+        if chunk and (len(chunk) >= size or row.keys() != keys):
+            yield chunk
+            chunk = []
+        if not chunk:
+            keys = row.keys()
+        chunk.append(row)
+    if chunk:
+        yield chunk
+
+
+def _invalidate_result_caches(table: Any) -> None:
+    for cache in _RESULT_CACHES.get(table, ()):
+        cache.clear()
+
+
+def _invalidate_caches(table: Any) -> None:
+    for cache in _TOTAL_CACHES.get(table, ()):
+        cache.clear()
+    _invalidate_result_caches(table)
+
+
+def _invalidate_written_tables(session: Session) -> None:
+    tables = session.info[_WRITTEN_TABLES]
+    for table in tables:
+        # again, a concurrent read may have cached the rows or the total before the commit
+        _invalidate_caches(table)
+    tables.clear()
+
+
+def _forget_written_tables(session: Session) -> None:
+    session.info[_WRITTEN_TABLES].clear()
+
+
+class CursorPage(BaseModel):
+    """
+    Keyset pagination query, `cursor` is the opaque `next_cursor` returned
+    with the previous page and is only valid with the same `sort`.
+    """
+    cursor: Optional[str] = None
+    limit: Optional[int] = 50
+    sort: Optional[str] = "id"
+    word: Optional[str] = None
+    word_column: str = "name"
+
+
+class CursorPageResult(BaseModel):
+    """
+    One page of a keyset pagination, `next_cursor` is None on the last page.
+    """
+    items: List[Any]
+    next_cursor: Optional[str] = None
+
+
+_CURSOR_TYPES = {
+    "dt": (datetime.datetime, datetime.datetime.isoformat, datetime.datetime.fromisoformat),
+    "d": (datetime.date, datetime.date.isoformat, datetime.date.fromisoformat),
+    "dec": (decimal.Decimal, str, decimal.Decimal),
+    "uuid": (uuid.UUID, str, uuid.UUID),
+}
+
+
+def _dump_cursor_value(value: Any) -> Any:
+    for tag, (typ, dump, _) in _CURSOR_TYPES.items():
+        if isinstance(value, typ):
+            return {tag: dump(value)}
+    return value
+
+
+def _load_cursor_value(value: Any) -> Any:
+    if isinstance(value, dict) and len(value) == 1:
+        tag, raw = next(iter(value.items()))
+        return _CURSOR_TYPES[tag][2](raw)
+    return value
+
+
+def encode_cursor(sort: str, keys: Iterable[Any]) -> str:
+    payload = json.dumps({"s": sort, "k": [_dump_cursor_value(k) for k in keys]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload["s"] != sort:
+            raise ValueError(f"cursor was issued for sort({payload['s']})")
+        return [_load_cursor_value(k) for k in payload["k"]]
+    except (binascii.Error, UnicodeDecodeError, LookupError, TypeError, ValueError) as e:
+        raise ValueError(f"invalid cursor({cursor})") from e
+
+
 class DAOMeta(type):
     def __new__(mcs, *args, **kwargs):
         self = type.__new__(mcs, *args, **kwargs)
@@ -135,13 +567,23 @@ class DAOMeta(type):
             typ = args[2]['__orig_bases__'][0].__args__[0]
         if typ and typ is not T_table:
             self.__table__ = typ
+        if self.__dict__.get("__result_cache__") and self.__table__ is not None:
+            # registered up front, so writes through any DAO of the table are tracked
+            self._get_result_cache()
         return self
 
 
 # FIXME: be compatible with python 3.6
 class BaseDAO(Generic[T_table], metaclass=DAOMeta):
     __engine__ = None  # type: AsyncEngine
+    __replicas__ = None  # type: Optional[ReplicaSet]
     __table__ = None  # type: T_table
+    __total_cache_ttl__ = DEFAULT_TOTAL_CACHE_TTL  # type: float
+    # opt-in cache of `select_one`/`select_many`, cleared by the write methods of any DAO
+    # of the same table; objects changed and flushed through the session are not tracked
+    __result_cache__ = False  # type: bool
+    __result_cache_ttl__ = DEFAULT_CACHE_TTL  # type: float
+    __result_cache_maxsize__ = DEFAULT_CACHE_MAXSIZE  # type: int
 
     def __init__(self, session: AsyncSession):
         assert self.__engine__ is not None, 'not initialize db engine'
@@ -150,10 +592,118 @@ class BaseDAO(Generic[T_table], metaclass=DAOMeta):
     async def insert_one(self, **values: Any) -> int:
         stmt = insert(self.__table__).values(**values)
         cursor = await self.session.execute(stmt)
+        self._after_write()
         return cursor.lastrowid
 
     async def insert_many(self, rows: List[T_table]) -> None:
         self.session.add_all(rows)
+        self._after_write()
+
+    async def bulk_insert(self,
+                          rows: Iterable[Union[Dict[str, Any], BaseModel]],
+                          chunk_size: int = DEFAULT_BULK_CHUNK_SIZE,
+                          return_keys: bool = False,
+                          ) -> Optional[List[Any]]:
+        """
+        Insert `rows` (dicts or pydantic models keyed by attribute name) with core
+        statements of `chunk_size` rows, skipping the ORM unit of work. Consecutive
+        rows with the same keys share a statement, keep rows uniform to batch well.
+
+        With `return_keys` the generated primary keys are returned in the order of
+        `rows`: read with `RETURNING` when the dialect supports it, otherwise derived
+        from the auto-increment id of each multi-row `INSERT`, which needs a single
+        auto-increment primary key left unset and consecutive ids
+        (`innodb_autoinc_lock_mode` 0 or 1 on MySQL).
+        """
+        keys = [] if return_keys else None
+        returning = return_keys and getattr(self.__engine__.dialect, "insert_returning", False)
+        mapper = inspect(self.__table__)
+        pk_columns = mapper.primary_key
+        pk_name = mapper.get_property_by_column(pk_columns[0]).key
+
+        for chunk in _chunks(rows, chunk_size):
+            if not return_keys:
+                # executemany, batched into multi-row INSERTs by SQLAlchemy when supported
+                await self.session.execute(insert(self.__table__), chunk)
+            elif returning:
+                stmt = insert(self.__table__).returning(*pk_columns, sort_by_parameter_order=True)
+                cursor = await self.session.execute(stmt, chunk)
+                keys.extend(cursor.scalars().all() if len(pk_columns) == 1 else map(tuple, cursor.all()))
+            else:
+                if len(pk_columns) != 1:
+                    raise ValueError("returned keys need RETURNING or a single auto-increment primary key")
+                if any(row.get(pk_name) is not None for row in chunk):
+                    raise ValueError("returned keys need RETURNING when primary keys are given")
+                cursor = await self.session.execute(insert(self.__table__).values(chunk))
+                # MySQL reports the first id of a multi-row INSERT, SQLite the last one
+                first = cursor.lastrowid
+                if self.__engine__.dialect.name == DBDialect.SQLite:
+                    first -= len(chunk) - 1
+                keys.extend(range(first, first + len(chunk)))
+
+        self._after_write()
+        return keys
+
+    async def upsert_many(self,
+                          rows: Iterable[Union[Dict[str, Any], BaseModel]],
+                          conflict_columns: Iterable[str],
+                          update_columns: Iterable[str] = None,
+                          chunk_size: int = DEFAULT_BULK_CHUNK_SIZE,
+                          ) -> int:
+        """
+        Insert `rows`, updating `update_columns` (default: every other given column)
+        of the existing rows which conflict on `conflict_columns`, with one multi-row
+        statement per `chunk_size` consecutive rows with the same keys.
+
+        MySQL (`ON DUPLICATE KEY UPDATE`) resolves conflicts on any unique key, the
+        `conflict_columns` are only used to pick the default `update_columns`; SQLite
+        (`ON CONFLICT DO UPDATE`) needs them to match a unique index.
+
+        Return the affected rows as reported by the driver: MySQL counts an updated
+        row twice and an unchanged one zero times, SQLite counts each row once.
+        """
+        dialect = self.__engine__.dialect.name
+        if dialect not in (DBDialect.MySQL, DBDialect.SQLite):
+            raise ValueError(f"not supported dialect({dialect})")
+
+        mapper = inspect(self.__table__)
+        conflict_columns = list(conflict_columns)
+        update_columns = None if update_columns is None else list(update_columns)
+        affected = 0
+
+        for chunk in _chunks(rows, chunk_size):
+            # every row of a chunk has the same keys
+            given = chunk[0].keys()
+            names = update_columns
+            if names is None:
+                names = [name for name in given if name not in conflict_columns]
+            elif not given >= set(names):
+                raise ValueError(f"update columns({', '.join(sorted(set(names) - given))}) missing from rows")
+
+            if dialect == DBDialect.MySQL:
+                stmt = mysql_insert(self.__table__).values(chunk)
+                if names:
+                    stmt = stmt.on_duplicate_key_update(
+                        {name: stmt.inserted[mapper.columns[name].name] for name in names})
+                else:
+                    # nothing to update, keep the existing rows
+                    name = conflict_columns[0]
+                    stmt = stmt.on_duplicate_key_update({name: getattr(self.__table__, name)})
+            else:
+                stmt = sqlite_insert(self.__table__).values(chunk)
+                index_elements = [mapper.columns[name] for name in conflict_columns]
+                if names:
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=index_elements,
+                        set_={name: stmt.excluded[mapper.columns[name].name] for name in names})
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+
+            cursor = await self.session.execute(stmt)
+            affected += cursor.rowcount
+
+        self._after_write()
+        return affected
 
     async def update(self,
                      filters: Iterable = None,
@@ -168,12 +718,16 @@ class BaseDAO(Generic[T_table], metaclass=DAOMeta):
             stmt = stmt.values(**values)
 
         cursor = await self.session.execute(stmt)
+        self._after_write()
         return cursor.rowcount
 
     async def select_one(self, *filters: Any) -> Optional[T_table]:
         stmt = select(self.__table__).limit(1)
         if filters:
             stmt = stmt.where(*filters)
+        if self.__result_cache__:
+            records = await self._select_cached(stmt)
+            return records[0] if records else None
         cursor = await self.session.execute(stmt)
         record = cursor.scalar_one_or_none()
 
@@ -183,16 +737,67 @@ class BaseDAO(Generic[T_table], metaclass=DAOMeta):
         stmt = select(self.__table__)
         if filters:
             stmt = stmt.where(*filters)
+        if self.__result_cache__:
+            return await self._select_cached(stmt)
         cursor = await self.session.execute(stmt)
         records = cursor.scalars().all()
 
         return records
 
+    async def select_stream(self,
+                            *filters: Any,
+                            batch_size: int = DEFAULT_STREAM_BATCH_SIZE,
+                            order_by: Iterable = None,
+                            columns: Iterable = None,
+                            model: Type[BaseModel] = None,
+                            ) -> AsyncIterator[Any]:
+        """
+        Walk the matching records through a server-side cursor, fetching
+        `batch_size` rows at a time so memory stays bounded however large the table.
+
+        Yield ORM objects, row tuples of `columns` when given, or instances of the
+        pydantic `model` built from the ORM objects. The session must stay open
+        while iterating.
+        """
+        stmt = select(*columns) if columns else select(self.__table__)
+        if filters:
+            stmt = stmt.where(*filters)
+        if order_by:
+            stmt = stmt.order_by(*order_by)
+        stmt = stmt.execution_options(yield_per=batch_size)
+
+        result = await self.session.stream(stmt)
+        if not columns:
+            result = result.scalars()
+        try:
+            async for partition in result.partitions():
+                if model is not None:
+                    partition = [model_from_orm(model, record) for record in partition]
+                for record in partition:
+                    yield record
+        finally:
+            await result.close()
+
     async def select_total_and_pagination(self,
                                           page_num: int, page_size: int,
                                           order_by: Iterable = None,
                                           filters: Iterable = None,
+                                          total_mode: str = TotalMode.EXACT,
                                           ) -> Tuple[int, List[T_table]]:
+        """
+        Return the total of rows matching `filters` and one page of them,
+        `total_mode` chooses how the total is computed:
+
+        - `exact`: a count query then the page query
+        - `window`: one statement, the total comes with each row as `COUNT(*) OVER ()`
+        - `concurrent`: the count runs on a separate connection while the page is read,
+          so it only sees committed rows; sessions with uncommitted writes to the
+          table through a DAO count on their own connection first
+        - `cached`: the exact total is cached by filters for `__total_cache_ttl__` seconds,
+          or until a write through any DAO of the table is committed
+        - `estimated`: the table statistics when nothing is filtered
+          (MySQL, PostgreSQL), the cached total otherwise
+        """
         stmt = select(self.__table__)
         count_stmt = select(count()).select_from(self.__table__)
 
@@ -201,20 +806,166 @@ class BaseDAO(Generic[T_table], metaclass=DAOMeta):
             count_stmt = count_stmt.where(*filters)
 
         offset = (page_num - 1) * page_size
+        stmt = stmt.limit(page_size)
         if offset:
-            stmt = stmt.offset(offset).limit(page_size)
+            stmt = stmt.offset(offset)
 
         if order_by:
             stmt = stmt.order_by(*order_by)
 
-        count_cursor = await self.session.execute(count_stmt)
-        total = count_cursor.scalar()
+        if total_mode == TotalMode.WINDOW:
+            cursor = await self.session.execute(stmt.add_columns(count().over().label("__total__")))
+            rows = cursor.all()
+            if rows:
+                return rows[0][1], [row[0] for row in rows]
+            # an empty page carries no total, e.g. past the last page
+            return await self._count(count_stmt), []
+
+        if total_mode == TotalMode.CONCURRENT and not self._has_written():
+            total, cursor = await asyncio.gather(self._count_in_new_session(count_stmt),
+                                                 self.session.execute(stmt))
+            return total, cursor.scalars().all()
+
+        if total_mode == TotalMode.CACHED:
+            total = await self._cached_count(count_stmt)
+        elif total_mode == TotalMode.ESTIMATED:
+            total = None if filters else await self._estimate_count()
+            if total is None:
+                total = await self._cached_count(count_stmt)
+        elif total_mode in (TotalMode.EXACT, TotalMode.CONCURRENT):
+            total = await self._count(count_stmt)
+        else:
+            raise ValueError(f"not supported total mode({total_mode})")
 
         cursor = await self.session.execute(stmt)
         records = cursor.scalars().all()
 
         return total, records
 
+    async def _count(self, count_stmt) -> int:
+        count_cursor = await self.session.execute(count_stmt)
+        return count_cursor.scalar()
+
+    async def _count_in_new_session(self, count_stmt) -> int:
+        # a session can't run two statements at once
+        async with new_session() as session:
+            count_cursor = await session.execute(count_stmt)
+            return count_cursor.scalar()
+
+    def _has_written(self) -> bool:
+        # uncommitted writes to the table through a DAO of this session
+        return inspect(self.__table__).local_table in self.session.info.get(_WRITTEN_TABLES, ())
+
+    @classmethod
+    def _get_total_cache(cls) -> TTLCache:
+        # one cache per DAO class, registered under its table
+        if "__total_cache__" not in cls.__dict__:
+            cls.__total_cache__ = TTLCache(maxsize=DEFAULT_CACHE_MAXSIZE, ttl=cls.__total_cache_ttl__)
+            _TOTAL_CACHES.setdefault(inspect(cls.__table__).local_table, []).append(cls.__total_cache__)
+        return cls.__total_cache__
+
+    def _statement_key(self, stmt) -> Tuple[str, str]:
+        compiled = stmt.compile(self.__engine__)
+        return str(compiled), repr(sorted(compiled.params.items()))
+
+    async def _cached_count(self, count_stmt) -> int:
+        if self._has_written():
+            # the total includes uncommitted rows, it must not leak to other sessions
+            return await self._count(count_stmt)
+        key = self._statement_key(count_stmt)
+        cache = self._get_total_cache()
+        total = cache.get(key)
+        if total is None:
+            total = await self._count(count_stmt)
+            cache.set(key, total)
+        return total
+
+    async def _estimate_count(self) -> Optional[int]:
+        table = inspect(self.__table__).local_table
+        dialect = self.__engine__.dialect.name
+        if dialect == DBDialect.MySQL:
+            stmt = text("SELECT TABLE_ROWS FROM information_schema.TABLES "
+                        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name")
+        elif dialect == "postgresql":
+            stmt = text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:name)")
+        else:
+            return None
+        cursor = await self.session.execute(stmt, {"name": table.name})
+        total = cursor.scalar()
+        return None if total is None or total < 0 else int(total)
+
+    @classmethod
+    def invalidate_total_cache(cls) -> None:
+        if "__total_cache__" in cls.__dict__:
+            cls.__total_cache__.clear()
+
+    @classmethod
+    def _get_result_cache(cls) -> TTLCache:
+        # one cache per DAO class, registered under its table
+        if "__result_cache_store__" not in cls.__dict__:
+            cls.__result_cache_store__ = TTLCache(maxsize=cls.__result_cache_maxsize__, ttl=cls.__result_cache_ttl__)
+            _RESULT_CACHES.setdefault(inspect(cls.__table__).local_table, []).append(cls.__result_cache_store__)
+        return cls.__result_cache_store__
+
+    async def _select_cached(self, stmt) -> List[T_table]:
+        """
+        Serve `stmt` from the result cache, which keeps the column values of the
+        records and hands out instances attached to the current session.
+
+        Sessions with uncommitted writes to the table bypass the cache, so rows
+        they can see never leak to other sessions.
+        """
+        mapper = inspect(self.__table__)
+        if self._has_written():
+            cursor = await self.session.execute(stmt)
+            return cursor.scalars().all()
+
+        key = self._statement_key(stmt)
+        cache = self._get_result_cache()
+        snapshots = cache.get(key)
+        if snapshots is None:
+            cursor = await self.session.execute(stmt)
+            records = cursor.scalars().all()
+            cache.set(key, [{attr.key: getattr(record, attr.key) for attr in mapper.column_attrs}
+                            for record in records])
+            return records
+
+        records = []
+        for snapshot in snapshots:
+            record = mapper.class_manager.new_instance()
+            for name, value in snapshot.items():
+                setattr(record, name, value)
+            make_transient_to_detached(record)
+            # the instance already in the session wins, without a query
+            records.append(await self.session.merge(record, load=False))
+        return records
+
+    @classmethod
+    def invalidate_result_cache(cls) -> None:
+        """
+        Clear the result cache of every DAO class mapped to the same table.
+        """
+        if cls.__table__ is not None:
+            _invalidate_result_caches(inspect(cls.__table__).local_table)
+
+    @classmethod
+    def result_cache_stats(cls) -> Optional[Dict[str, Any]]:
+        """
+        Size, hit ratio, evictions and expirations of the result cache, None until used.
+        """
+        cache = cls.__dict__.get("__result_cache_store__")
+        return None if cache is None else cache.stats
+
+    def _after_write(self) -> None:
+        table = inspect(self.__table__).local_table
+        _invalidate_caches(table)
+        tables = self.session.info.get(_WRITTEN_TABLES)
+        if tables is None:
+            tables = self.session.info[_WRITTEN_TABLES] = set()
+            event.listen(self.session.sync_session, "after_commit", _invalidate_written_tables)
+            event.listen(self.session.sync_session, "after_rollback", _forget_written_tables)
+        tables.add(table)
+
     async def select_pagination(self,
                                 page_num: int, page_size: int,
                                 order_by: Iterable = None,
@@ -226,8 +977,9 @@ class BaseDAO(Generic[T_table], metaclass=DAOMeta):
             stmt = stmt.where(*filters)
 
         offset = (page_num - 1) * page_size
+        stmt = stmt.limit(page_size)
         if offset:
-            stmt = stmt.offset(offset).limit(page_size)
+            stmt = stmt.offset(offset)
 
         if order_by:
             stmt = stmt.order_by(*order_by)
@@ -237,33 +989,107 @@ class BaseDAO(Generic[T_table], metaclass=DAOMeta):
 
         return records
 
-    async def select_pagination_by_query(self, query: Page) -> Tuple[int, List[T_table]]:
-        if query.sort:
-            if query.sort[0] == "+":
-                order_by = [asc(getattr(self.__table__, query.sort[1:]))]
-            elif query.sort[0] == "-":
-                order_by = [desc(getattr(self.__table__, query.sort[1:]))]
-            else:
-                order_by = [asc(getattr(self.__table__, query.sort))]
-        else:
-            order_by = None
+    @classmethod
+    def _parse_sort(cls, sort: str) -> Tuple[str, bool]:
+        """
+        Split `+col`, `-col` or `col` into the column name and whether it is descending.
+        """
+        if sort[0] in "+-":
+            return sort[1:], sort[0] == "-"
+        return sort, False
 
+    def _word_filters(self, query: Any) -> Optional[Tuple]:
         if query.word:
             word_col = getattr(self.__table__, query.word_column)
-            filters = (word_col == query.word,)
+            return word_col == query.word,
+        return None
+
+    async def select_pagination_by_query(self,
+                                         query: Page,
+                                         total_mode: str = TotalMode.EXACT,
+                                         ) -> Tuple[int, List[T_table]]:
+        if query.sort:
+            name, descending = self._parse_sort(query.sort)
+            column = getattr(self.__table__, name)
+            order_by = [desc(column) if descending else asc(column)]
         else:
-            filters = None
+            order_by = None
+
+        filters = self._word_filters(query)
 
         return await self.select_total_and_pagination(
             page_num=query.page,
             page_size=query.limit,
             order_by=order_by,
             filters=filters,
+            total_mode=total_mode,
+        )
+
+    async def select_keyset_pagination(self,
+                                       limit: int,
+                                       sort: Iterable[Tuple[str, bool]],
+                                       cursor: Optional[List[Any]] = None,
+                                       filters: Iterable = None,
+                                       ) -> Tuple[List[T_table], Optional[List[Any]]]:
+        """
+        Seek the page following the row whose sort key is `cursor`, `sort` lists
+        `(attribute, descending)` pairs and the primary key is appended as tie breaker.
+        The cost is constant however deep the page is, as long as the sort
+        columns (followed by the primary key) are indexed and not nullable.
+
+        Return the records and the sort key of the last one when there are more.
+        """
+        mapper = inspect(self.__table__)
+        keys = list(sort)
+        names = {name for name, _ in keys}
+        last_descending = keys[-1][1] if keys else False
+        for column in mapper.primary_key:
+            name = mapper.get_property_by_column(column).key
+            if name not in names:
+                keys.append((name, last_descending))
+
+        columns = [(getattr(self.__table__, name), descending) for name, descending in keys]
+        stmt = select(self.__table__)
+        if filters:
+            stmt = stmt.where(*filters)
+        if cursor is not None:
+            if len(cursor) != len(columns):
+                raise ValueError("cursor does not match the sort keys")
+            # (c1 > v1) OR (c1 = v1 AND c2 > v2) OR ..., with < for descending keys
+            clauses = []
+            for i, (column, descending) in enumerate(columns):
+                seek = column < cursor[i] if descending else column > cursor[i]
+                clauses.append(and_(*[c == v for (c, _), v in zip(columns[:i], cursor)], seek))
+            stmt = stmt.where(or_(*clauses))
+        stmt = stmt.order_by(*[desc(c) if d else asc(c) for c, d in columns]).limit(limit + 1)
+
+        result = await self.session.execute(stmt)
+        records = result.scalars().all()
+        if len(records) <= limit:
+            return records, None
+        records = records[:limit]
+        return records, [getattr(records[-1], name) for name, _ in keys]
+
+    async def select_pagination_by_cursor(self, query: CursorPage) -> CursorPageResult:
+        """
+        Keyset pagination driven by a `CursorPage`, return the records
+        with the opaque cursor of the next page.
+        """
+        sort = query.sort or "id"
+        cursor = decode_cursor(query.cursor, sort) if query.cursor else None
+        records, next_keys = await self.select_keyset_pagination(
+            limit=query.limit,
+            sort=[self._parse_sort(sort)],
+            cursor=cursor,
+            filters=self._word_filters(query),
         )
+        return CursorPageResult(items=records,
+                                next_cursor=None if next_keys is None else encode_cursor(sort, next_keys))
 
     async def delete(self, *filters: Any) -> int:
         stmt = delete(self.__table__)
         if filters:
             stmt = stmt.where(*filters)
         cursor = await self.session.execute(stmt)
+        self._after_write()
         return cursor.rowcount
@@ -1,9 +1,9 @@
-import json
 from typing import Any, Optional
 
 from aiohttp.typedefs import LooseHeaders
 from aiohttp.web_exceptions import HTTPError
 
+from aior.codec import get_json_codec
 from aior.constants import DEFAULT_JSON_HEADERS
 
 __all__ = (
@@ -52,7 +52,7 @@ class AiorHTTPError(HTTPError):
                  **kwargs: Any,
                  ) -> None:
         if text is None:
-            text = json.dumps({'errors': details})
+            text = get_json_codec().dumps({'errors': details})
         super().__init__(text=text, headers=headers, **kwargs)
 
 
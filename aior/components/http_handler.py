@@ -1,17 +1,25 @@
-import json
+from functools import partial
+from time import perf_counter
 from json import JSONEncoder
-from typing import Type, Any, Union, overload, List
+from typing import Type, Any, Union, overload, List, Dict, Callable, Awaitable, Iterable, AsyncIterable, Optional, \
+    TYPE_CHECKING
 
 from aiohttp import web, hdrs
 from aiohttp.abc import Request
 from aiohttp.typedefs import LooseHeaders
 from aiohttp.web_exceptions import HTTPBadRequest
-from aiohttp.web_response import Response
+from aiohttp.web_response import Response, StreamResponse
 from pydantic import BaseModel, ValidationError
 
+from aior.codec import JSONCodec, get_json_codec
+from aior.compat import (
+    PYDANTIC_V2, model_dump, dump_models_json, model_validate_json,
+    validate_list_json, validation_errors
+)
 from aior.components.http_exceptions import BadRequestError
 from aior.constants import (
-    DEFAULT_JSON_HEADERS, NoneType)
+    DEFAULT_JSON_HEADERS, DEFAULT_NDJSON_HEADERS, DEFAULT_STREAM_CHUNK_SIZE, REQUEST_DB_SCOPE_KEY)
+from aior.etag import etag_matches, not_modified_response
 from aior.typedefs import (
     T, T_headers,
     T_queries, T_path_args, T_body, T_model
@@ -32,6 +40,7 @@ __all__ = (
     'Query',
     'Queries',
     'JSONResponse',
+    'JSONStreamResponse',
     'NoContentResponse',
     'OriginResponse',
 )
@@ -108,18 +117,36 @@ class _Queries(Generic[T_queries]):
 
 Queries = _Queries()
 
-try:
+if TYPE_CHECKING:  # SQLAlchemy is heavy to import and optional
     from sqlalchemy.ext.asyncio.session import AsyncSession
-except ImportError:
-    AsyncSession = NoneType
+
+    from aior.components.dao import SessionScope
+
+    from aior.metrics import PhaseTimer
 
 
 class BaseHTTPHandler(web.View):
     __cors__ = True
+    __compress__ = True
+    # share one DAO session, opened on first use, across the request and commit it once at the end
+    __db_session__ = False
+    __binders__ = {}  # type: Dict[str, Callable[[Request], Awaitable[Dict[str, Any]]]]
 
     def __init__(self, request: Request):
         super().__init__(request)
-        self.db_session = None  # type: AsyncSession
+        self._db_session = None  # type: Optional[AsyncSession]
+        self._db_scope = None  # type: Optional[SessionScope]
+        self._phase_timer = None  # type: Optional[PhaseTimer]
+
+    @property
+    def db_session(self) -> Optional['AsyncSession']:
+        if self._db_session is None and self._db_scope is not None:
+            self._db_session = self._db_scope.session
+        return self._db_session
+
+    @db_session.setter
+    def db_session(self, session: Optional['AsyncSession']) -> None:
+        self._db_session = session
 
     async def on_start(self):
         """
@@ -127,28 +154,104 @@ class BaseHTTPHandler(web.View):
             on starting of processing request, such as authorization
         """
 
+    async def get_etag(self) -> Optional[str]:
+        """
+        Overwrite this function to return a cheap version token of the requested
+            resource (e.g. the latest `updated_at`), which lets `GET` requests with
+            a matching `If-None-Match` be answered by `304` before the handler runs
+        """
+
     async def _iter(self):
+        if self.__db_session__:
+            from aior.components.dao import SessionScope
+
+            async with SessionScope() as scope:
+                self._db_scope = self.request[REQUEST_DB_SCOPE_KEY] = scope
+                return await self._dispatch()
+        return await self._dispatch()
+
+    async def _dispatch(self):
         if self.request.method not in hdrs.METH_ALL:
             self._raise_allowed_methods()
         method = getattr(self, self.request.method.lower(), None)
         if method is None:
             self._raise_allowed_methods()
 
+        metrics = getattr(self.request.app, 'metrics', None)
+        timer = self._phase_timer = None if metrics is None else metrics.phase_timer(self.request)
+        started = perf_counter()
         await self.on_start()
+        if timer is not None:
+            timer.record('on_start', perf_counter() - started)
+
+        etag = None
+        if self.request.method in (hdrs.METH_GET, hdrs.METH_HEAD):
+            token = await self.get_etag()
+            if token is not None:
+                etag = f'W/"{token}"'
+                if etag_matches(self.request.headers.get(hdrs.IF_NONE_MATCH), etag):
+                    return not_modified_response(etag)
+
+        resp = await self._call_cached(method)
+        if etag is not None and resp.status == 200 and hdrs.ETAG not in resp.headers:
+            resp.headers[hdrs.ETAG] = etag
+        return resp
+
+    async def _call_cached(self, method):
+        cache = getattr(method, '__cache__', None)
+        if cache is not None:
+            key = cache.make_key(self.request)
+            resp = cache.get(key)
+            if resp is not None:
+                return resp
+
+        coalescer = getattr(method, '__coalesce__', None)
+        if coalescer is not None:
+            resp = await coalescer.call(self.request, partial(self._call_shared, method))
+        else:
+            resp = await self._call(method)
+
+        if cache is not None:
+            cache.store(key, resp)
+        return resp
 
-        deserializer = getattr(method, '__deserializer__', None)
-        if deserializer is not None:
+    async def _call_shared(self, method):
+        if not self.__db_session__:
+            return await self._call(method)
+        from aior.components.dao import SessionScope
+
+        # the shared call may outlive the request which started it, e.g. when its client
+        # disconnects, so it must not use the session of that request's scope
+        async with SessionScope() as scope:
+            self._db_scope = self.request[REQUEST_DB_SCOPE_KEY] = scope
+            self._db_session = None
+            return await self._call(method)
+
+    async def _call(self, method):
+        timer = self._phase_timer
+        binder = self.__binders__.get(self.request.method)
+        if binder is not None:
+            started = perf_counter()
             try:
-                kwargs = {name: await callback(self.request)
-                          for name, callback in deserializer.items()}
+                kwargs = await binder(self.request)
             except ValidationError as e:
-                return JSONResponse(e.errors(), status=400)
+                return JSONResponse(validation_errors(e), status=400)
             except Exception as e:
                 raise HTTPBadRequest from e
+            if timer is not None:
+                timer.record('deserialize', perf_counter() - started)
+            started = perf_counter()
             resp = await method(**kwargs)
         else:
+            started = perf_counter()
             resp = await method()
 
+        if timer is not None:
+            # responses encode their body when they are built inside the handler
+            encode_duration = getattr(resp, 'encode_duration', 0.0)
+            timer.record('handler', perf_counter() - started - encode_duration)
+            if encode_duration:
+                timer.record('encode', encode_duration)
         return resp
 
     @overload
@@ -167,13 +270,20 @@ class BaseHTTPHandler(web.View):
         try:
             if req_cls:
                 if isinstance(req_cls, list):
-                    return [req_cls[0](**d) for d in await self.request.json()]
-                return req_cls(**await self.request.json())
-
-            return await self.request.json()
+                    if PYDANTIC_V2:
+                        return validate_list_json(List[req_cls[0]], await self.request.read())
+                    return [req_cls[0](**d) for d in await self._read_json()]
+                if PYDANTIC_V2:
+                    return model_validate_json(req_cls, await self.request.read())
+                return req_cls(**await self._read_json())
+
+            return await self._read_json()
         except ValidationError as e:
             raise BadRequestError(e.json())
 
+    async def _read_json(self) -> Any:
+        return get_json_codec().loads(await self.request.read())
+
     @overload
     async def load_headers(self) -> Union[dict, str, int, bool]:
         ...
@@ -217,25 +327,43 @@ class BaseHTTPHandler(web.View):
 OriginResponse = Response
 
 
+def _dump_json(data: Any,
+               encoder: Type[JSONEncoder] = None,
+               codec: JSONCodec = None,
+               ) -> bytes:
+    if encoder is None and codec is None:
+        body = dump_models_json(data)
+        if body is not None:
+            return body
+        codec = get_json_codec()
+    elif codec is None:
+        codec = get_json_codec(encoder)
+    if isinstance(data, BaseModel):
+        data = model_dump(data)
+    return codec.dumpb(data)
+
+
 class BaseResponse(OriginResponse, Generic[T]):
     status = None
     reason = ''
+    encode_duration = 0.0
 
     def __init__(self,
                  text: T = None, *,
                  headers: LooseHeaders = DEFAULT_JSON_HEADERS,
-                 encoder: Type[JSONEncoder] = JSONEncoder,
+                 encoder: Type[JSONEncoder] = None,
+                 codec: JSONCodec = None,
                  **kwargs: Any,
                  ) -> None:
+        body = None
         if text is not None and not isinstance(text, str):
-            if isinstance(text, list):
-                data = [i.dict() if isinstance(i, BaseModel) else i
-                        for i in text]
-            else:
-                data = text.dict() if isinstance(text, BaseModel) else text
-            text = encoder().encode(data)
+            started = perf_counter()
+            body = _dump_json(text, encoder, codec)
+            self.encode_duration = perf_counter() - started
+            text = None
 
         super().__init__(text=text,
+                         body=body,
                          status=self.status,
                          reason=self.reason,
                          headers=headers,
@@ -258,24 +386,26 @@ class NoContentResponse(BaseResponse, Generic[T]):
 
 
 class JSONResponse(OriginResponse, Generic[T]):
+    encode_duration = 0.0
 
     def __init__(self,
                  text: T = None, *,
                  status: int = 200,
                  reason: str = 'OK',
                  headers: LooseHeaders = DEFAULT_JSON_HEADERS,
-                 encoder: Type[JSONEncoder] = JSONEncoder,
+                 encoder: Type[JSONEncoder] = None,
+                 codec: JSONCodec = None,
                  **kwargs: Any,
                  ) -> None:
+        body = None
         if text is not None and not isinstance(text, str):
-            if isinstance(text, list):
-                data = [i.dict() if isinstance(i, BaseModel) else i
-                        for i in text]
-            else:
-                data = text.dict() if isinstance(text, BaseModel) else text
-            text = encoder().encode(data)
+            started = perf_counter()
+            body = _dump_json(text, encoder, codec)
+            self.encode_duration = perf_counter() - started
+            text = None
 
         super().__init__(text=text,
+                         body=body,
                          status=status,
                          reason=reason,
                          headers=headers,
@@ -293,3 +423,74 @@ class NoContentResponse(JSONResponse, Generic[T]):
                          reason=reason,
                          headers=headers,
                          **kwargs)
+
+
+class JSONStreamResponse(StreamResponse, Generic[T]):
+    """
+    Chunked response encoding the items of an (async) iterable as they arrive,
+    either as one JSON array (`mode='array'`) or as NDJSON lines (`mode='ndjson'`).
+    """
+    ARRAY = 'array'
+    NDJSON = 'ndjson'
+
+    def __init__(self,
+                 items: Union[Iterable[T], AsyncIterable[T]], *,
+                 mode: str = ARRAY,
+                 status: int = 200,
+                 reason: str = 'OK',
+                 headers: LooseHeaders = None,
+                 encoder: Type[JSONEncoder] = None,
+                 codec: JSONCodec = None,
+                 chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE,
+                 **kwargs: Any,
+                 ) -> None:
+        if mode not in (self.ARRAY, self.NDJSON):
+            raise ValueError(f'not supported stream mode({mode})')
+        if headers is None:
+            headers = DEFAULT_JSON_HEADERS if mode == self.ARRAY else DEFAULT_NDJSON_HEADERS
+        super().__init__(status=status,
+                         reason=reason,
+                         headers=headers,
+                         **kwargs)
+        self._items = items
+        self._mode = mode
+        self._encoder = encoder
+        self._codec = codec
+        self._chunk_size = chunk_size
+        self._streamed = False
+        self.enable_chunked_encoding()
+
+    async def prepare(self, request: Request):
+        writer = await super().prepare(request)
+        if self._streamed or request.method == hdrs.METH_HEAD:
+            return writer
+        self._streamed = True
+
+        is_array = self._mode == self.ARRAY
+        separator = b',' if is_array else b''
+        terminator = b'' if is_array else b'\n'
+        buffer = bytearray(b'[' if is_array else b'')
+        first = True
+        async for item in self._iter_items():
+            if not first:
+                buffer += separator
+            buffer += _dump_json(item, self._encoder, self._codec)
+            buffer += terminator
+            # send the first item at once to keep time to first byte low
+            if first or len(buffer) >= self._chunk_size:
+                await self.write(bytes(buffer))
+                buffer.clear()
+            first = False
+        if is_array:
+            buffer += b']'
+        if buffer:
+            await self.write(bytes(buffer))
+        return writer
+
+    async def _iter_items(self):
+        if hasattr(self._items, '__aiter__'):
+            async for item in self._items:
+                yield item
+        else:
+            for item in self._items:
+                yield item
@@ -1,3 +1,14 @@
+__all__ = (
+    'BaseStatus',
+    'OKStatus',
+    'CreatedStatus',
+    'AcceptedStatus',
+    'NonAuthoritativeInformationStatus',
+    'NoContentStatus',
+    'ResetContentStatus',
+)
+
+
 class BaseStatus:
     code: int = None
     reason: str = None
@@ -39,7 +39,7 @@ from aiohttp.http_websocket import (
     WSHandshakeError,
 )
 from aiohttp.log import ws_logger
-from aiohttp.typedefs import LooseHeaders, StrOrURL, JSONEncoder
+from aiohttp.typedefs import LooseHeaders, StrOrURL
 from aiohttp.web_exceptions import HTTPBadRequest
 from aiohttp.web_request import BaseRequest
 from aiohttp.web_response import StreamResponse
@@ -49,6 +49,8 @@ from aiohttp.web_ws import THRESHOLD_CONNLOST_ACCESS
 from multidict import CIMultiDict
 from pydantic import BaseModel
 
+from aior.codec import get_json_codec
+from aior.compat import dump_models_json, model_dump
 from aior.components import InternalServerError, UnauthorizedError
 from aior.typedefs import JSONType, NoneType
 
@@ -60,7 +62,7 @@ __all__ = (
 
 
 class WebsocketStream:
-    default_encoder = None  # type: JSONEncoder
+    default_encoder = None  # type: Optional[Type[json.JSONEncoder]]
 
     def __init__(self,
                  receive_timeout: Optional[float] = None,
@@ -227,19 +229,19 @@ class WebsocketStream:
             return False
 
     async def send(self, data: JSONType,
-                   encoder: JSONEncoder = None,
+                   encoder: Type[json.JSONEncoder] = None,
                    compress: Optional[bool] = None) -> None:
         if self._writer is None:
             raise RuntimeError('writer is not prepared')
-        if isinstance(data, BaseModel):
-            if encoder is None:
-                encoder = self.default_encoder
-            data = data.json(encoder=encoder)
-            binary = False
-        elif isinstance(data, dict):
-            if encoder is None:
-                encoder = self.default_encoder
-            data = json.dumps(data, default=encoder)
+        if isinstance(data, (BaseModel, dict)):
+            encoder = encoder or self.default_encoder
+            body = dump_models_json(data) if encoder is None else None
+            if body is not None:
+                data = body.decode('utf-8')
+            else:
+                if isinstance(data, BaseModel):
+                    data = model_dump(data)
+                data = get_json_codec(encoder).dumps(data)
             binary = False
         elif isinstance(data, str):
             binary = False
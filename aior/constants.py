@@ -20,6 +20,12 @@ class Environment:
     LOCAL = "local"
 
 
+class LoopImpl:
+    AUTO = "auto"
+    ASYNCIO = "asyncio"
+    UVLOOP = "uvloop"
+
+
 PING = "ping"
 PONG = "pong"
 HEARTBEAT_INTERVAL = 30.0
@@ -30,7 +36,25 @@ METHODS_ALL = hdrs.METH_ALL
 REF_PREFIX = "#/components/schemas/"
 DEFAULT_JSON_CONTENT_TYPE = "application/json; charset=utf-8"
 DEFAULT_CONTENT_TYPE = "application/json; charset=utf-8"
+DEFAULT_HTML_CONTENT_TYPE = "text/html; charset=utf-8"
 DEFAULT_JSON_HEADERS = {"Content-Type": "application/json; charset=utf-8"}
+DEFAULT_NDJSON_HEADERS = {"Content-Type": "application/x-ndjson; charset=utf-8"}
+DEFAULT_STREAM_CHUNK_SIZE = 64 * 1024
+REQUEST_DB_SCOPE_KEY = "aior_db_scope"
+DEFAULT_COMPRESSION_LEVEL = 6
+DEFAULT_COMPRESSION_MIN_SIZE = 1024
+DEFAULT_COMPRESSION_EXECUTOR_THRESHOLD = 64 * 1024
+DEFAULT_CACHE_TTL = 60.0
+DEFAULT_CACHE_MAXSIZE = 1024
+DEFAULT_TOTAL_CACHE_TTL = 30.0
+DEFAULT_BULK_CHUNK_SIZE = 1000
+DEFAULT_STREAM_BATCH_SIZE = 1000
+DEFAULT_LISTEN_BACKLOG = 128
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# status label of requests cancelled by a client disconnect, as nginx logs them
+CLIENT_CLOSED_REQUEST_STATUS = 499
+DEFAULT_WORKER_RESTART_DELAY = 1.0
 NONE_RESPONSE = {"204": {"description": "No content"}}
 DEFAULT_JSON_RESPONSE = {"200": {'content': {'application/json': {'schema': {}}},
                                  'description': 'OK'}}
@@ -54,3 +78,16 @@ JSON_TYPES = (BaseModel, str, float, int, bool)
 class DBDialect:
     MySQL = "mysql"
     SQLite = "sqlite"
+
+
+class ReplicaPolicy:
+    ROUND_ROBIN = "round_robin"
+    LEAST_CONNECTIONS = "least_connections"
+
+
+class TotalMode:
+    EXACT = "exact"
+    WINDOW = "window"
+    CONCURRENT = "concurrent"
+    CACHED = "cached"
+    ESTIMATED = "estimated"
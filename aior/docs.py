@@ -3,16 +3,19 @@ import typing
 from inspect import isclass
 from typing import Optional, Any, Union, Set, Dict, Text, Type, Sequence, List, Tuple, cast
 
-from aiohttp import web
+from aiohttp import hdrs, web
 from aiohttp.web_urldispatcher import View
 from pydantic import BaseModel
-from pydantic.schema import model_process_schema, get_flat_models_from_model, get_model_name_map
 
+from aior.compat import model_json_schema, get_model_definitions
 from aior.components import BaseHTTPHandler, NoContentResponse, BaseStatus, JSONResponse, OKStatus, BytesBody, \
     PlainBody, IntBody, FloatBody, BooleanBody
 from aior.components.http_exceptions import AiorHTTPError
-from aior.constants import REF_PREFIX, NoneType, DEFAULT_CONTENT_TYPE, NONE_RESPONSE, DEFAULT_JSON_HEADERS, JSON_TYPES
+from aior.constants import REF_PREFIX, NoneType, DEFAULT_CONTENT_TYPE, NONE_RESPONSE, DEFAULT_JSON_HEADERS, JSON_TYPES, \
+    DEFAULT_JSON_CONTENT_TYPE, DEFAULT_HTML_CONTENT_TYPE
 from aior.helpers import app_log
+from aior.etag import make_etag, etag_matches
+from aior.middlewares import COMPRESSORS, negotiate_encoding
 from aior.utils import add_space_in_front_of_capital_letter, get_generic_type_args, get_generic_origin_type, \
     get_json_type
 
@@ -193,32 +196,65 @@ def get_swagger_ui_oauth2_redirect_html() -> Text:
     return html
 
 
+class EncodedDocument:
+    """
+    Docs payload encoded once with its `ETag` and an optional gzip variant,
+    served as is to every request.
+    """
+    __slots__ = ("body", "content_type", "etag", "gzip_body")
+
+    def __init__(self, body: bytes, content_type: str, precompress: bool = True) -> None:
+        self.body = body
+        self.content_type = content_type
+        self.etag = make_etag(body)
+        self.gzip_body = COMPRESSORS["gzip"](body, 9) if precompress else None
+
+    def to_response(self, request: web.Request) -> web.Response:
+        use_gzip = (self.gzip_body is not None
+                    and negotiate_encoding(request.headers.get(hdrs.ACCEPT_ENCODING), ("gzip",)) == "gzip")
+        # the gzip variant is a different representation, tag it as weak like the compression middleware
+        etag = f"W/{self.etag}" if use_gzip else self.etag
+        headers = {hdrs.ETAG: etag, hdrs.VARY: hdrs.ACCEPT_ENCODING}
+        if etag_matches(request.headers.get(hdrs.IF_NONE_MATCH), etag):
+            return web.Response(status=304, headers=headers)
+        headers[hdrs.CONTENT_TYPE] = self.content_type
+        if use_gzip:
+            headers[hdrs.CONTENT_ENCODING] = "gzip"
+            return web.Response(body=self.gzip_body, headers=headers)
+        return web.Response(body=self.body, headers=headers)
+
+
 class DocsHandler(web.View):
     async def get(self):
         app = self.request.app  # type: AiorApplication
-        body = get_swagger_ui_html(openapi_url=app.openapi_url,
-                                   title=app.docs_title,
-                                   swagger_ui_js_url=app.swagger_ui_js_url,
-                                   swagger_ui_css_url=app.swagger_ui_css_url,
-                                   docs_favicon_url=app.swagger_ui_favicon_url)
-        return web.Response(text=body, content_type="text/html")
+        document = app.get_docs_document("swagger", lambda: get_swagger_ui_html(
+            openapi_url=app.openapi_url,
+            title=app.docs_title,
+            swagger_ui_js_url=app.swagger_ui_js_url,
+            swagger_ui_css_url=app.swagger_ui_css_url,
+            docs_favicon_url=app.swagger_ui_favicon_url,
+        ).encode("utf-8"), DEFAULT_HTML_CONTENT_TYPE)
+        return document.to_response(self.request)
 
 
 class RedocHandler(web.View):
     async def get(self):
         app = self.request.app  # type: AiorApplication
-        body = get_redoc_html(openapi_url=app.openapi_url,
-                              title=app.docs_title,
-                              redoc_js_url=app.redoc_ui_js_url,
-                              redoc_favicon_url=app.redoc_ui_favicon_url)
-        return web.Response(text=body, content_type="text/html")
+        document = app.get_docs_document("redoc", lambda: get_redoc_html(
+            openapi_url=app.openapi_url,
+            title=app.docs_title,
+            redoc_js_url=app.redoc_ui_js_url,
+            redoc_favicon_url=app.redoc_ui_favicon_url,
+        ).encode("utf-8"), DEFAULT_HTML_CONTENT_TYPE)
+        return document.to_response(self.request)
 
 
 class OpenapiSchemaHandler(web.View):
     async def get(self):
         app = self.request.app  # type: AiorApplication
-        body = json.dumps(app.openapi_schema)
-        return web.Response(text=body)
+        document = app.get_docs_document("openapi", lambda: app.json_codec.dumpb(app.openapi_schema),
+                                         DEFAULT_JSON_CONTENT_TYPE)
+        return document.to_response(self.request)
 
 
 def get_openapi(*,
@@ -230,12 +266,8 @@ def get_openapi(*,
     components = {}  # type: Dict[str, Dict]
     paths = {}  # type:Dict[str, Dict]
 
-    flat_models = get_flat_models_from_routes(routes)
-    model_name_map = get_model_name_map(flat_models)
-
-    definitions = get_model_definitions(
-        flat_models=flat_models, model_name_map=model_name_map
-    )
+    models = get_models_from_routes(routes)
+    definitions, model_name_map = get_model_definitions(models, REF_PREFIX)
     if definitions:
         components["schemas"] = {k: definitions[k] for k in sorted(definitions)}
     if components:
@@ -452,7 +484,7 @@ def get_query_param(name, clazz):
 
 
 def get_query_params(name, clazz: Type[BaseModel]):
-    schema = clazz.schema()
+    schema = model_json_schema(clazz)
     required = schema.pop("required", None)
     return {
         'in': 'query',
@@ -472,7 +504,7 @@ def get_path_param(name, clazz):
 
 def get_path_params(name, clazz):
     # TODO: required value depends on path
-    schema = clazz.schema()
+    schema = model_json_schema(clazz)
     required = schema.pop("required", None)
     return {
         'in': 'path',
@@ -494,21 +526,18 @@ def get_request_body(clazz, model_name_map):
     }
 
 
-def get_flat_models_from_routes(routes: Sequence[Tuple[str, web.View]]
-                                ) -> Set[Type[BaseModel]]:
-    flat_models = set()
+def get_models_from_routes(routes: Sequence[Tuple[str, web.View]]
+                           ) -> Set[Type[BaseModel]]:
+    models = set()
     for _, _, handler_hints in routes:
         for method, hints in handler_hints.items():
             for name, typ in hints.items():
                 if isinstance(typ, tuple) and len(typ) == 2:
-                    models = get_models_of_type(typ[1])
+                    models.update(get_models_of_type(typ[1]))
                 else:
-                    models = get_models_of_type(typ)
-                if models:
-                    for model in models:
-                        flat_models |= get_flat_models_from_model(model, flat_models)
+                    models.update(get_models_of_type(typ))
 
-    return flat_models
+    return models
 
 
 def get_models_of_type(typ: Type) -> List[BaseModel]:
@@ -526,20 +555,6 @@ def get_models_of_type(typ: Type) -> List[BaseModel]:
     return ret
 
 
-def get_model_definitions(
-        *, flat_models: Set[Type[BaseModel]], model_name_map: Dict[Type[BaseModel], str]
-) -> Dict[str, Any]:
-    definitions: Dict[str, Dict] = {}
-    for model in flat_models:
-        m_schema, m_definitions, m_nested_models = model_process_schema(
-            model, model_name_map=model_name_map, ref_prefix=REF_PREFIX
-        )
-        definitions.update(m_definitions)
-        model_name = model_name_map[model]
-        definitions[model_name] = m_schema
-    return definitions
-
-
 def get_openapi_operation_metadata(*, uri: str,
                                    handler: Type[BaseHTTPHandler],
                                    method: str,
@@ -0,0 +1,51 @@
+import hashlib
+from typing import Optional, Set
+
+from aiohttp import hdrs, web
+
+__all__ = (
+    'make_etag',
+    'parse_if_none_match',
+    'etag_matches',
+    'not_modified_response',
+)
+
+
+def make_etag(body: bytes, weak: bool = False) -> str:
+    tag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    return f'W/{tag}' if weak else tag
+
+
+def parse_if_none_match(header: str) -> Set[str]:
+    """
+    Parse `If-None-Match` into opaque tags, weakness is dropped
+    since `If-None-Match` uses the weak comparison.
+    """
+    tags = set()
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag:
+            tags.add(tag)
+    return tags
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header or not etag:
+        return False
+    tags = parse_if_none_match(header)
+    return '*' in tags or (etag[2:] if etag.startswith('W/') else etag) in tags
+
+
+_NOT_MODIFIED_HEADERS = (hdrs.CACHE_CONTROL, hdrs.CONTENT_LOCATION, hdrs.DATE,
+                         hdrs.EXPIRES, hdrs.VARY, hdrs.LAST_MODIFIED)
+
+
+def not_modified_response(etag: str, response: web.StreamResponse = None) -> web.Response:
+    headers = {hdrs.ETAG: etag}
+    if response is not None:
+        for name in _NOT_MODIFIED_HEADERS:
+            if name in response.headers:
+                headers[name] = response.headers[name]
+    return web.Response(status=304, headers=headers)
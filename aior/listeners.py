@@ -0,0 +1,143 @@
+import os
+import socket
+import stat
+from typing import List, Tuple
+
+from aior.constants import DEFAULT_LISTEN_BACKLOG
+
+__all__ = (
+    'TCP',
+    'UNIX',
+    'FD',
+    'SYSTEMD',
+    'parse_listener',
+    'create_tcp_socket',
+    'create_unix_socket',
+    'inherit_socket',
+    'get_systemd_fds',
+    'open_listener_sockets',
+)
+
+TCP = 'tcp'
+UNIX = 'unix'
+FD = 'fd'
+SYSTEMD = 'systemd'
+
+SD_LISTEN_FDS_START = 3
+
+
+def parse_listener(spec: str) -> Tuple[str, Tuple]:
+    """
+    Parse a listener spec into its kind and address:
+
+    - `HOST:PORT` or `tcp://HOST:PORT`: TCP socket
+    - `unix:PATH`: unix domain socket
+    - `fd:N`: already listening socket inherited as file descriptor `N`
+    - `systemd`: every socket passed by systemd socket activation
+    """
+    spec = spec.strip()
+    if spec == SYSTEMD:
+        return SYSTEMD, ()
+    kind, sep, address = spec.partition(':')
+    if sep and kind == UNIX:
+        if not address:
+            raise ValueError(f'empty unix socket path in listener({spec})')
+        return UNIX, (address,)
+    if sep and kind == FD:
+        try:
+            return FD, (int(address),)
+        except ValueError:
+            raise ValueError(f'invalid file descriptor in listener({spec})') from None
+    if spec.startswith('tcp://'):
+        spec = spec[len('tcp://'):]
+    host, sep, port = spec.rpartition(':')
+    if not sep or not port.isdigit():
+        raise ValueError(f'not supported listener({spec})')
+    return TCP, (host.strip('[]'), int(port))
+
+
+def create_tcp_socket(host: str, port: int,
+                      backlog: int = DEFAULT_LISTEN_BACKLOG,
+                      reuse_port: bool = False,
+                      ) -> socket.socket:
+    """
+    Create a listening TCP socket which forked workers can accept on.
+    """
+    infos = socket.getaddrinfo(host or None, port, type=socket.SOCK_STREAM,
+                               flags=socket.AI_PASSIVE)
+    family, type_, proto, _, address = infos[0]
+    sock = socket.socket(family, type_, proto)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(address)
+        sock.listen(backlog)
+        sock.setblocking(False)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def create_unix_socket(path: str, backlog: int = DEFAULT_LISTEN_BACKLOG) -> socket.socket:
+    """
+    Create a listening unix domain socket, a stale socket file left at
+    `path` by a previous server is replaced.
+    """
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)
+    except FileNotFoundError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.bind(path)
+        sock.listen(backlog)
+        sock.setblocking(False)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def inherit_socket(fd: int) -> socket.socket:
+    """
+    Wrap a listening socket inherited from the parent process,
+    its family and type are detected from the descriptor.
+    """
+    sock = socket.socket(fileno=fd)
+    sock.setblocking(False)
+    return sock
+
+
+def get_systemd_fds(unset_environment: bool = True) -> List[int]:
+    """
+    Return the file descriptors passed by systemd socket activation
+    (`LISTEN_PID`/`LISTEN_FDS`), see `sd_listen_fds(3)`.
+    """
+    try:
+        pid = int(os.environ.get('LISTEN_PID', ''))
+        count = int(os.environ.get('LISTEN_FDS', ''))
+    except ValueError:
+        return []
+    if unset_environment:
+        for name in ('LISTEN_PID', 'LISTEN_FDS', 'LISTEN_FDNAMES'):
+            os.environ.pop(name, None)
+    if pid != os.getpid():
+        return []
+    return list(range(SD_LISTEN_FDS_START, SD_LISTEN_FDS_START + count))
+
+
+def open_listener_sockets(kind: str, address: Tuple,
+                          backlog: int = DEFAULT_LISTEN_BACKLOG,
+                          ) -> List[socket.socket]:
+    if kind == TCP:
+        return [create_tcp_socket(*address, backlog=backlog)]
+    if kind == UNIX:
+        return [create_unix_socket(*address, backlog=backlog)]
+    if kind == FD:
+        return [inherit_socket(*address)]
+    if kind == SYSTEMD:
+        return [inherit_socket(fd) for fd in get_systemd_fds()]
+    raise ValueError(f'not supported listener kind({kind})')
@@ -0,0 +1,306 @@
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from aiohttp import hdrs, web
+
+from aior.constants import CLIENT_CLOSED_REQUEST_STATUS, DEFAULT_LATENCY_BUCKETS, PROMETHEUS_CONTENT_TYPE
+
+__all__ = (
+    'Counter',
+    'Gauge',
+    'Histogram',
+    'MetricsRegistry',
+    'HTTPMetrics',
+    'PhaseTimer',
+    'PoolMetrics',
+    'metrics_middleware',
+    'MetricsHandler',
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    type = None  # type: str
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values = {}  # type: Dict[LabelValues, float]
+
+    def inc(self, labels: LabelValues = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, labels: LabelValues = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def clear(self) -> None:
+        self._values.clear()
+
+    def _samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, labels: LabelValues = (), value: float = 0) -> None:
+        self._values[labels] = value
+
+    def dec(self, labels: LabelValues = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+
+class Histogram(_Metric):
+    """
+    Fixed-bucket histogram, each label set only keeps one counter per bucket,
+    the sum and the count of its observations.
+    """
+    type = 'histogram'
+
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+                 ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._bucket_labels = tuple(f'le="{_format_value(b)}"' for b in self.buckets) + ('le="+Inf"',)
+        self._values = {}  # type: Dict[LabelValues, List[float]]
+
+    def observe(self, labels: LabelValues, value: float) -> None:
+        counts = self._values.get(labels)
+        if counts is None:
+            # one slot per bucket and +Inf, then sum
+            counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def get(self, labels: LabelValues = ()) -> Optional[Dict[str, float]]:
+        counts = self._values.get(labels)
+        if counts is None:
+            return None
+        return {'count': sum(counts[:-1]), 'sum': counts[-1]}
+
+    def _samples(self) -> Iterable[str]:
+        for labels, counts in self._values.items():
+            cumulative = 0
+            for bucket_label, count in zip(self._bucket_labels, counts):
+                cumulative += count
+                yield (f'{self.name}_bucket{_format_labels(self.labelnames, labels, bucket_label)} '
+                       f'{cumulative}')
+            label_str = _format_labels(self.labelnames, labels)
+            yield f'{self.name}_sum{label_str} {_format_value(counts[-1])}'
+            yield f'{self.name}_count{label_str} {cumulative}'
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics = {}  # type: Dict[str, _Metric]
+        self._collectors = []  # type: List[Callable[[], None]]
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f'duplicated metric({metric.name})')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """
+        Call `collector` before each render, to refresh metrics read from elsewhere.
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> bytes:
+        """
+        Encode every metric in the Prometheus text exposition format.
+        """
+        for collector in self._collectors:
+            collector()
+        lines = []  # type: List[str]
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        lines.append('')
+        return '\n'.join(lines).encode('utf-8')
+
+
+class PhaseTimer:
+    """
+    Records the phases of one request into the phase histogram of `HTTPMetrics`.
+    """
+    __slots__ = ('_histogram', '_route', '_method')
+
+    def __init__(self, histogram: Histogram, route: str, method: str) -> None:
+        self._histogram = histogram
+        self._route = route
+        self._method = method
+
+    def record(self, phase: str, duration: float) -> None:
+        self._histogram.observe((self._route, self._method, phase), duration)
+
+
+class PoolMetrics:
+    """
+    Database connection pool metrics: the size, checked out and overflow
+    connections of each watched pool, read on every scrape, and the time
+    checkouts wait for a connection, observed by the pools.
+    """
+
+    def __init__(self, registry: MetricsRegistry, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> None:
+        self.size = registry.register(Gauge(
+            'aior_db_pool_size', 'Connections the pool keeps open.', ('pool',)))
+        self.checked_out = registry.register(Gauge(
+            'aior_db_pool_checked_out', 'Connections in use.', ('pool',)))
+        self.overflow = registry.register(Gauge(
+            'aior_db_pool_overflow', 'Connections opened beyond the pool size.', ('pool',)))
+        self.wait = registry.register(Histogram(
+            'aior_db_pool_wait_seconds', 'Time spent waiting for a pool connection.', ('pool',), buckets))
+        self._pools = {}  # type: Dict[str, Callable[[], Any]]
+        registry.add_collector(self.collect)
+
+    def watch(self, name: str, get_pool: Callable[[], Any]) -> None:
+        """
+        Watch the pool returned by `get_pool`, called on each scrape since
+        engines replace their pool when disposed.
+        """
+        self._pools[name] = get_pool
+
+    def observe_wait(self, name: str, duration: float) -> None:
+        self.wait.observe((name,), duration)
+
+    def collect(self) -> None:
+        for name, get_pool in self._pools.items():
+            pool = get_pool()
+            # only queue pools count their connections
+            for gauge, attr in ((self.size, 'size'), (self.checked_out, 'checkedout'), (self.overflow, 'overflow')):
+                method = getattr(pool, attr, None)
+                if method is not None:
+                    gauge.set((name,), max(method(), 0))
+
+
+def _route_label(request: web.Request) -> str:
+    route = request.match_info.route
+    resource = route.resource if route is not None else None
+    return resource.canonical if resource is not None else ''
+
+
+class HTTPMetrics(MetricsRegistry):
+    """
+    Request metrics of an application: total and per-phase latency per route
+    and method, in-flight requests, status codes and transferred bytes.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> None:
+        super().__init__()
+        self.info = self.register(Gauge(
+            'aior_info', 'Aior server information.', ('version', 'loop', 'worker')))
+        self.in_flight = self.register(Gauge(
+            'aior_http_requests_in_flight', 'Requests being handled.'))
+        self.in_flight.set((), 0)
+        self.requests = self.register(Counter(
+            'aior_http_requests_total', 'Handled requests.', ('route', 'method', 'status')))
+        self.duration = self.register(Histogram(
+            'aior_http_request_duration_seconds', 'Request handling latency.',
+            ('route', 'method'), buckets))
+        self.phase_duration = self.register(Histogram(
+            'aior_http_request_phase_duration_seconds',
+            'Request handling latency by phase: deserialize, on_start, handler and encode.',
+            ('route', 'method', 'phase'), buckets))
+        self.request_bytes = self.register(Counter(
+            'aior_http_request_bytes_total', 'Request body bytes announced by Content-Length.',
+            ('route', 'method')))
+        self.response_bytes = self.register(Counter(
+            'aior_http_response_bytes_total', 'Response body bytes, as sent on the wire.',
+            ('route', 'method')))
+
+    def set_info(self, version: str, loop: str, worker: Optional[int] = None) -> None:
+        self.info.set((version, loop, '' if worker is None else str(worker)), 1)
+
+    def phase_timer(self, request: web.Request) -> PhaseTimer:
+        return PhaseTimer(self.phase_duration, _route_label(request), request.method)
+
+
+def metrics_middleware(metrics: HTTPMetrics):
+    """
+    Record the latency, status and body sizes of every request, it runs
+    outside the other middlewares so bytes are counted after compression.
+    Requests cancelled by a client disconnect are counted with status 499.
+    """
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        labels = (_route_label(request), request.method)
+        metrics.in_flight.inc()
+        started = time.perf_counter()
+        status = 500
+        response = None
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        except asyncio.CancelledError:
+            status = CLIENT_CLOSED_REQUEST_STATUS
+            raise
+        finally:
+            metrics.in_flight.dec()
+            metrics.duration.observe(labels, time.perf_counter() - started)
+            metrics.requests.inc(labels + (str(status),))
+            if request.content_length:
+                metrics.request_bytes.inc(labels, request.content_length)
+            if response is not None:
+                body = getattr(response, 'body', None)
+                if isinstance(body, (bytes, bytearray)):
+                    metrics.response_bytes.inc(labels, len(body))
+                elif response.content_length:
+                    metrics.response_bytes.inc(labels, response.content_length)
+
+    return middleware
+
+
+class MetricsHandler(web.View):
+    async def get(self):
+        metrics = self.request.app.metrics  # type: HTTPMetrics
+        return web.Response(body=metrics.render(), headers={hdrs.CONTENT_TYPE: PROMETHEUS_CONTENT_TYPE})
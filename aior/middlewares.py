@@ -0,0 +1,226 @@
+import asyncio
+import zlib
+from concurrent.futures import Executor
+from functools import partial
+from typing import Dict, Iterable, Optional
+
+from aiohttp import hdrs, web
+from aiohttp.web_response import ContentCoding
+
+from aior.codec import JSONCodec, use_json_codec, reset_json_codec
+from aior.constants import (
+    DEFAULT_COMPRESSION_LEVEL, DEFAULT_COMPRESSION_MIN_SIZE,
+    DEFAULT_COMPRESSION_EXECUTOR_THRESHOLD
+)
+# re-exported, the helpers live in `aior.etag` so components don't depend on middlewares
+from aior.etag import make_etag, parse_if_none_match, etag_matches, not_modified_response
+
+__all__ = (
+    'COMPRESSORS',
+    'parse_accept_encoding',
+    'negotiate_encoding',
+    'compression_middleware',
+    'make_etag',
+    'parse_if_none_match',
+    'etag_matches',
+    'not_modified_response',
+    'etag_middleware',
+    'json_codec_middleware',
+)
+
+
+def _gzip(data: bytes, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _deflate(data: bytes, level: int) -> bytes:
+    return zlib.compress(data, level)
+
+
+# `compress(data, level)` functions by coding, ordered by server preference,
+# optional codings are only registered when installed
+COMPRESSORS = {}
+
+try:
+    import brotli
+
+    def _brotli(data: bytes, level: int) -> bytes:
+        # brotli quality ranges 0-11, map zlib levels onto it
+        return brotli.compress(data, quality=min(11, max(0, level + 1)))
+
+    COMPRESSORS['br'] = _brotli
+except ImportError:
+    pass
+
+try:
+    import zstandard
+
+    def _zstd(data: bytes, level: int) -> bytes:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+
+    COMPRESSORS['zstd'] = _zstd
+except ImportError:
+    pass
+
+COMPRESSORS['gzip'] = _gzip
+COMPRESSORS['deflate'] = _deflate
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """
+    Parse `Accept-Encoding` into a mapping of coding to its quality value.
+    """
+    codings = {}
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def negotiate_encoding(header: Optional[str],
+                       available: Iterable[str] = None,
+                       ) -> Optional[str]:
+    """
+    Choose the coding with the highest quality value acceptable by the client,
+    ties are broken by the order of `available`.
+    """
+    if not header:
+        return None
+    if available is None:
+        available = COMPRESSORS
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _add_vary(response: web.StreamResponse, value: str) -> None:
+    vary = response.headers.get(hdrs.VARY)
+    if not vary:
+        response.headers[hdrs.VARY] = value
+    elif value.lower() not in (v.strip().lower() for v in vary.split(',')):
+        response.headers[hdrs.VARY] = f'{vary}, {value}'
+
+
+def compression_middleware(*,
+                           min_size: int = DEFAULT_COMPRESSION_MIN_SIZE,
+                           level: int = DEFAULT_COMPRESSION_LEVEL,
+                           executor_threshold: int = DEFAULT_COMPRESSION_EXECUTOR_THRESHOLD,
+                           executor: Executor = None,
+                           encodings: Iterable[str] = None,
+                           ):
+    """
+    Compress response bodies negotiated from `Accept-Encoding`.
+
+    Bodies smaller than `min_size` are sent as is and bodies of at least
+    `executor_threshold` bytes are compressed in `executor` (the loop default
+    executor when it is None) to keep the event loop responsive.
+    Handlers opt out with a `__compress__ = False` class attribute.
+    """
+    available = tuple(COMPRESSORS if encodings is None
+                      else (e for e in COMPRESSORS if e in encodings))
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        response = await handler(request)
+
+        if (not getattr(request.match_info.handler, '__compress__', True)
+                or response.status < 200 or response.status in (204, 304)
+                or hdrs.CONTENT_ENCODING in response.headers
+                or response.compression):
+            return response
+
+        coding = negotiate_encoding(request.headers.get(hdrs.ACCEPT_ENCODING), available)
+
+        if not isinstance(response, web.Response):
+            # streamed bodies are compressed chunk by chunk by aiohttp itself
+            if coding in ('gzip', 'deflate') and not response.prepared:
+                response.enable_compression(ContentCoding(coding))
+            return response
+
+        body = response.body
+        if not isinstance(body, (bytes, bytearray)) or len(body) < min_size:
+            return response
+
+        _add_vary(response, hdrs.ACCEPT_ENCODING)
+        if coding is None:
+            return response
+
+        compress = COMPRESSORS[coding]
+        if len(body) >= executor_threshold:
+            loop = asyncio.get_event_loop()
+            body = await loop.run_in_executor(executor, partial(compress, body, level))
+        else:
+            body = compress(body, level)
+
+        response.body = body
+        response.headers.pop(hdrs.CONTENT_LENGTH, None)
+        response.headers[hdrs.CONTENT_ENCODING] = coding
+        etag = response.headers.get(hdrs.ETAG)
+        if etag and not etag.startswith('W/'):
+            # a strong validator is bound to the identity representation
+            response.headers[hdrs.ETAG] = f'W/{etag}'
+        return response
+
+    return middleware
+
+
+def etag_middleware(*, weak: bool = False):
+    """
+    Add an `ETag` computed from the encoded body to `200` responses of
+    `GET`/`HEAD` requests and answer a matching `If-None-Match` with
+    `304 Not Modified` instead of the body.
+    """
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        response = await handler(request)
+
+        if request.method not in (hdrs.METH_GET, hdrs.METH_HEAD) or response.status != 200:
+            return response
+
+        etag = response.headers.get(hdrs.ETAG)
+        if etag is None:
+            if (not isinstance(response, web.Response)
+                    or not isinstance(response.body, (bytes, bytearray))
+                    or response.compression):
+                return response
+            etag = response.headers[hdrs.ETAG] = make_etag(response.body, weak)
+
+        if etag_matches(request.headers.get(hdrs.IF_NONE_MATCH), etag):
+            return not_modified_response(etag, response)
+        return response
+
+    return middleware
+
+
+def json_codec_middleware(codec: JSONCodec):
+    """
+    Make `codec` the JSON codec of every request of the application, so
+    several applications of one process each keep their own.
+    """
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        token = use_json_codec(codec)
+        try:
+            return await handler(request)
+        finally:
+            reset_json_codec(token)
+
+    return middleware
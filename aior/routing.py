@@ -0,0 +1,88 @@
+from typing import Any, Dict, Iterator, Type, get_type_hints
+
+from aiohttp import web
+
+from aior.components.http_handler import BaseHTTPHandler
+from aior.constants import METHODS_ALL
+from aior.utils import RequestBinder, gen_binder
+
+__all__ = ('MethodSpec', 'RouteSpec', 'RouteRegistry')
+
+
+class MethodSpec:
+    """
+    Reflection of one handler method: its parameter hints, the binder
+    built from them and its declared response type.
+    """
+    __slots__ = ('name', 'hints', 'binder', 'has_response_type', 'response_type')
+
+    def __init__(self, name: str, hints: Dict[str, Any]) -> None:
+        self.name = name
+        self.has_response_type = 'return' in hints
+        self.response_type = hints.pop('return', None)
+        self.hints = hints
+        self.binder = gen_binder(hints) if hints else None
+
+    def type_hints(self) -> Dict[str, Any]:
+        """
+        A fresh copy of the hints as returned by `get_type_hints`.
+        """
+        hints = dict(self.hints)
+        if self.has_response_type:
+            hints['return'] = self.response_type
+        return hints
+
+
+class RouteSpec:
+    __slots__ = ('path', 'handler', 'kwargs', 'methods', 'cors')
+
+    def __init__(self,
+                 path: str,
+                 handler: Type[web.View],
+                 kwargs: Dict[str, Any],
+                 methods: Dict[str, MethodSpec],
+                 ) -> None:
+        self.path = path
+        self.handler = handler
+        self.kwargs = kwargs
+        self.methods = methods
+        self.cors = bool(getattr(handler, '__cors__', False))
+
+    @property
+    def binders(self) -> Dict[str, RequestBinder]:
+        return {m: spec.binder for m, spec in self.methods.items() if spec.binder is not None}
+
+
+class RouteRegistry:
+    """
+    Route metadata of one application, reflected once at startup and shared by
+    request binding, the OpenAPI schema and CORS; handlers mounted on several
+    paths are reflected once.
+    """
+
+    def __init__(self) -> None:
+        self._routes = []
+        self._methods = {}  # type: Dict[Type[web.View], Dict[str, MethodSpec]]
+
+    def add(self, path: str, handler: Type[web.View], kwargs: Dict[str, Any] = None) -> RouteSpec:
+        spec = RouteSpec(path, handler, kwargs or {}, self.get_methods(handler))
+        self._routes.append(spec)
+        return spec
+
+    def get_methods(self, handler: Type[web.View]) -> Dict[str, MethodSpec]:
+        methods = self._methods.get(handler)
+        if methods is None:
+            methods = {}
+            if issubclass(handler, BaseHTTPHandler):
+                for m in METHODS_ALL:
+                    func = getattr(handler, m.lower(), None)
+                    if func is not None:
+                        methods[m] = MethodSpec(m.lower(), get_type_hints(func))
+            self._methods[handler] = methods
+        return methods
+
+    def __iter__(self) -> Iterator[RouteSpec]:
+        return iter(self._routes)
+
+    def __len__(self) -> int:
+        return len(self._routes)
@@ -1,3 +1,4 @@
+import asyncio
 import re
 import sys
 import typing
@@ -8,8 +9,14 @@ from typing import Text, Any, Type, Optional, Tuple
 
 from pydantic import BaseModel
 
+from aior.codec import JSONCodec, get_json_codec
+from aior.compat import (
+    PYDANTIC_V2, model_validate_json, validate_list, validate_list_json,
+    model_dump, dump_models_json
+)
 from aior.components import BadRequestError
 from aior.components.http_handler import PlainBody, BytesBody
+from aior.constants import LoopImpl
 from aior.typedefs import JSONType
 
 
@@ -33,124 +40,161 @@ def get_generic_type_args(typ: Any) -> Tuple:
 
 
 def serialize_json_data(data: JSONType,
-                        encoder: Type[JSONEncoder]
+                        encoder: Type[JSONEncoder] = None,
+                        codec: JSONCodec = None,
                         ) -> str:
     if isinstance(data, str):
         return data
 
-    if isinstance(data, list):
-        data = [d.dict() if isinstance(d, BaseModel)
-                else d for d in data]
-    elif isinstance(data, BaseModel):
-        data = data.dict()
+    if encoder is None and codec is None:
+        body = dump_models_json(data)
+        if body is not None:
+            return body.decode('utf-8')
 
-    return encoder().encode(data)
+    if codec is None:
+        codec = get_json_codec(encoder)
+
+    if isinstance(data, BaseModel):
+        data = model_dump(data)
+
+    return codec.dumps(data)
+
+
+def get_loop_policy(loop_impl: str = LoopImpl.ASYNCIO) -> Optional[asyncio.AbstractEventLoopPolicy]:
+    """
+    Return the event loop policy creating the loops of `loop_impl`, None for the
+    default asyncio one; `auto` falls back to it when uvloop is not installed,
+    `uvloop` raises `RuntimeError`. The global policy is left untouched.
+    """
+    if loop_impl not in (LoopImpl.AUTO, LoopImpl.ASYNCIO, LoopImpl.UVLOOP):
+        raise ValueError(f"not supported event loop implementation({loop_impl})")
+    if loop_impl == LoopImpl.ASYNCIO:
+        return None
+    try:
+        import uvloop
+    except ImportError:
+        if loop_impl == LoopImpl.UVLOOP:
+            raise RuntimeError("uvloop event loop requested but uvloop is not installed") from None
+        return None
+    return uvloop.EventLoopPolicy()
+
+
+def get_loop_impl(loop: asyncio.AbstractEventLoop) -> str:
+    return LoopImpl.UVLOOP if type(loop).__module__.startswith("uvloop") else LoopImpl.ASYNCIO
 
 
 def gen_id() -> str:
     return str(uuid.uuid4())
 
 
-def gen_deserializers(type_hints) -> typing.Dict:
-    return {name: gen_deserializer(name, hint)
-            for name, hint in type_hints.items()}
+(BYTES_SOURCE, TEXT_SOURCE, JSON_SOURCE,
+ QUERY_SOURCE, HEADERS_SOURCE, PATH_SOURCE) = range(6)
+_BODY_SOURCES = (BYTES_SOURCE, TEXT_SOURCE, JSON_SOURCE)
 
 
-def gen_deserializer(name, hint):
-    if hint is PlainBody:
-        async def deserialize(request):
-            return await request.text()
+class RequestBinder:
+    """
+    Compiled deserializer of a handler method.
 
-        return deserialize
+    All annotated arguments are resolved at route initialization, so a
+    request is bound by reading the body at most once and walking a flat
+    list of ``(name, source, converter)`` fields.
+    """
+    __slots__ = ('fields', 'sources')
 
-    if hint in (BytesBody, int, float, bool):
-        async def deserialize(typ, request):
-            return typ(await request.text())
+    def __init__(self, fields: typing.List[Tuple[str, int, typing.Callable]]) -> None:
+        self.fields = tuple(fields)
+        self.sources = frozenset(source for _, source, _ in fields)
 
-        return partial(deserialize, hint)
+    async def __call__(self, request) -> typing.Dict[str, Any]:
+        sources = [None] * 6
+        needed = self.sources
+        if not needed.isdisjoint(_BODY_SOURCES):
+            raw = await request.read()
+            sources[BYTES_SOURCE] = raw
+            if TEXT_SOURCE in needed:
+                sources[TEXT_SOURCE] = raw.decode(request.charset or 'utf-8')
+            if JSON_SOURCE in needed:
+                sources[JSON_SOURCE] = get_json_codec().loads(raw)
+        if QUERY_SOURCE in needed:
+            sources[QUERY_SOURCE] = request.query
+        if HEADERS_SOURCE in needed:
+            sources[HEADERS_SOURCE] = request.headers
+        if PATH_SOURCE in needed:
+            sources[PATH_SOURCE] = request.match_info
+
+        return {name: convert(sources[source])
+                for name, source, convert in self.fields}
 
-    if hint is dict:
-        async def deserialize(request):
-            return await request.json()
 
-        return deserialize
+def gen_binder(type_hints: typing.Dict[str, Any]) -> RequestBinder:
+    return RequestBinder([gen_field(name, hint)
+                          for name, hint in type_hints.items()])
+
+
+def _identity(value):
+    return value
+
+
+def _get_item(n, t, kind, mapping):
+    ret = mapping.get(n, None)
+    if ret is None:
+        raise BadRequestError(f"{kind} argument({n}) were not found")
+    return t(ret)
+
+
+def _load_model(model, mapping):
+    return model(**mapping)
+
+
+def gen_field(name, hint) -> Tuple[str, int, typing.Callable]:
+    if hint is PlainBody:
+        return name, TEXT_SOURCE, _identity
+
+    if hint is BytesBody:
+        return name, BYTES_SOURCE, bytes
+
+    if hint in (int, float, bool):
+        return name, TEXT_SOURCE, hint
+
+    if hint is dict:
+        return name, JSON_SOURCE, _identity
 
     if isinstance(hint, tuple):
         type_name, type_value = hint
         if type_name == "json_body":
             if type_value is str:
-                async def deserialize(req):
-                    return await req.text()
-
-                return deserialize
+                return name, TEXT_SOURCE, _identity
             if type_value in (int, float, bool):
-                async def deserialize(t, req):
-                    return t(await req.text())
-
-                return deserialize
+                return name, TEXT_SOURCE, type_value
+            if type_value is dict:
+                return name, JSON_SOURCE, _identity
+            if get_generic_origin_type(type_value) is list:
+                if PYDANTIC_V2:
+                    return name, BYTES_SOURCE, partial(validate_list_json, type_value)
+                return name, JSON_SOURCE, partial(validate_list, type_value)
             if issubclass(type_value, BaseModel):
-                async def deserialize(model, request):
-                    return model(**await request.json())
-
-                return partial(deserialize, type_value)
+                if PYDANTIC_V2:
+                    return name, BYTES_SOURCE, partial(model_validate_json, type_value)
+                return name, JSON_SOURCE, partial(_load_model, type_value)
         elif type_name == "query":
-            async def deserialize(n, t, req):
-                ret = req.query.get(n, None)
-                if ret is None:
-                    raise BadRequestError(f"query argument({n}) were not found")
-                return t(ret)
-
-            return partial(deserialize, name, type_value)
+            return name, QUERY_SOURCE, partial(_get_item, name, type_value, "query")
         elif type_name == "queries":
             if issubclass(type_value, BaseModel):
-                async def deserialize(model, req):
-                    return model(**req.query)
-
-                return partial(deserialize, type_value)
-            else:
-                async def deserialize(req):
-                    return req.query
-
-                return deserialize
+                return name, QUERY_SOURCE, partial(_load_model, type_value)
+            return name, QUERY_SOURCE, _identity
         elif type_name == "header":
-            async def deserialize(n, t, req):
-                ret = req.headers.get(n, None)
-                if ret is None:
-                    raise BadRequestError(f"header argument({n}) were not found")
-
-                return t(ret)
-
-            return partial(deserialize, name, type_value)
+            return name, HEADERS_SOURCE, partial(_get_item, name, type_value, "header")
         elif type_name == "headers":
             if issubclass(type_value, BaseModel):
-                async def deserialize(model, req):
-                    return model(**req.headers)
-
-                return partial(deserialize, type_value)
-            else:
-                async def deserialize(req):
-                    return req.headers
-
-                return deserialize
+                return name, HEADERS_SOURCE, partial(_load_model, type_value)
+            return name, HEADERS_SOURCE, _identity
         elif type_name == "path_arg":
-            async def deserialize(n, t, req):
-                ret = req.match_info.get(n, None)
-                if ret is None:
-                    raise BadRequestError(f"path argument({n}) were not found")
-                return t(ret)
-
-            return partial(deserialize, name, type_value)
+            return name, PATH_SOURCE, partial(_get_item, name, type_value, "path")
         elif type_name == "path_args":
             if issubclass(type_value, BaseModel):
-                async def deserialize(model, req):
-                    return model(**dict(req.match_info))
-
-                return partial(deserialize, type_value)
-            else:
-                async def deserialize(req):
-                    return dict(req.match_info)
-
-                return deserialize
+                return name, PATH_SOURCE, partial(_load_model, type_value)
+            return name, PATH_SOURCE, dict
 
     raise ValueError(f"not supported type: {hint}")
 
@@ -0,0 +1,87 @@
+import os
+import signal
+import time
+from logging import Logger
+from typing import Callable, Optional
+
+from aior.constants import DEFAULT_WORKER_RESTART_DELAY
+
+__all__ = ('WorkerSupervisor',)
+
+
+class WorkerSupervisor:
+    """
+    Pre-fork `workers` processes running `target(worker_id)`, restart the ones
+    that exit unexpectedly and forward SIGTERM/SIGINT to all of them for a
+    graceful drain.
+    """
+
+    def __init__(self,
+                 target: Callable[[int], Optional[int]],
+                 workers: int,
+                 logger: Logger,
+                 restart_delay: float = DEFAULT_WORKER_RESTART_DELAY,
+                 ) -> None:
+        if not hasattr(os, 'fork'):
+            raise RuntimeError('multiple workers require os.fork()')
+        self._target = target
+        self._workers = workers
+        self._logger = logger
+        self._restart_delay = restart_delay
+        self._children = {}  # pid -> (worker id, monotonic start time)
+        self._stopping = False
+
+    def run(self) -> None:
+        prev_handlers = {sig: signal.signal(sig, self._on_signal)
+                         for sig in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            for worker_id in range(self._workers):
+                self._spawn(worker_id)
+
+            while self._children:
+                try:
+                    pid, status = os.waitpid(-1, 0)
+                except ChildProcessError:
+                    break
+                if pid not in self._children:
+                    continue
+                worker_id, started_at = self._children.pop(pid)
+                self._logger.info(f'Worker {worker_id} (pid {pid}) exited with {self._describe(status)}.')
+                if not self._stopping:
+                    if time.monotonic() - started_at < self._restart_delay:
+                        # avoid a tight fork loop when workers crash on boot
+                        time.sleep(self._restart_delay)
+                    if not self._stopping:
+                        self._spawn(worker_id)
+        finally:
+            for sig, handler in prev_handlers.items():
+                signal.signal(sig, handler)
+
+    def _spawn(self, worker_id: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 1
+            try:
+                code = self._target(worker_id) or 0
+            except BaseException:
+                self._logger.exception(f'Worker {worker_id} failed.')
+            finally:
+                os._exit(code)
+        self._children[pid] = (worker_id, time.monotonic())
+        self._logger.info(f'Worker {worker_id} (pid {pid}) started.')
+
+    def _on_signal(self, signum: int, frame) -> None:
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    @staticmethod
+    def _describe(status: int) -> str:
+        if os.WIFSIGNALED(status):
+            return f'signal {os.WTERMSIG(status)}'
+        return f'code {os.WEXITSTATUS(status)}'
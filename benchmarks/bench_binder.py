@@ -0,0 +1,124 @@
+"""
+Microbenchmark of per-request argument binding of handler methods.
+
+Compares the compiled `RequestBinder` with the former strategy of awaiting
+one deserializer coroutine per annotated argument.
+
+    python benchmarks/bench_binder.py [-n 100000]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import BaseModel  # noqa: E402
+
+from aior.components import JSONBody, Queries, Headers, PathArgs  # noqa: E402
+from aior.utils import gen_binder  # noqa: E402
+
+
+class Item(BaseModel):
+    name: str
+    price: float
+    tags: list = []
+
+
+class ItemQuery(BaseModel):
+    q: str
+
+
+class ItemHeaders(BaseModel):
+    host: str
+
+
+class ItemPath(BaseModel):
+    item_id: int
+
+
+HINTS = {
+    'item': JSONBody[Item],
+    'raw': dict,
+    'queries': Queries[ItemQuery],
+    'headers': Headers[ItemHeaders],
+    'path_args': PathArgs[ItemPath],
+}
+
+
+class FakeRequest:
+    charset = 'utf-8'
+
+    def __init__(self, body: bytes) -> None:
+        self._body = body
+        self.query = {'q': 'phone'}
+        self.headers = {'host': 'localhost'}
+        self.match_info = {'item_id': '1'}
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self) -> str:
+        return (await self.read()).decode(self.charset)
+
+    async def json(self):
+        return json.loads(await self.text())
+
+
+def gen_per_argument_deserializers(hints):
+    async def load_json_model(model, req):
+        return model(**await req.json())
+
+    async def load_json(req):
+        return await req.json()
+
+    async def load_model(model, attr, req):
+        return model(**getattr(req, attr))
+
+    return {
+        'item': partial(load_json_model, Item),
+        'raw': load_json,
+        'queries': partial(load_model, ItemQuery, 'query'),
+        'headers': partial(load_model, ItemHeaders, 'headers'),
+        'path_args': partial(load_model, ItemPath, 'match_info'),
+    }
+
+
+async def bench_per_argument(request, n):
+    deserializer = gen_per_argument_deserializers(HINTS)
+    start = time.perf_counter()
+    for _ in range(n):
+        {name: await callback(request) for name, callback in deserializer.items()}
+    return time.perf_counter() - start
+
+
+async def bench_binder(request, n):
+    binder = gen_binder(HINTS)
+    start = time.perf_counter()
+    for _ in range(n):
+        await binder(request)
+    return time.perf_counter() - start
+
+
+def main():
+    arg_parser = ArgumentParser(description='Request binding microbenchmark')
+    arg_parser.add_argument('-n', '--number', type=int, default=100000)
+    args = arg_parser.parse_args()
+
+    body = json.dumps({'name': 'phone', 'price': 9.5, 'tags': ['a', 'b', 'c']}).encode()
+    request = FakeRequest(body)
+    loop = asyncio.new_event_loop()
+    try:
+        for name, bench in (('per-argument', bench_per_argument),
+                            ('binder', bench_binder)):
+            elapsed = loop.run_until_complete(bench(request, args.number))
+            print(f'{name:>12}: {elapsed / args.number * 1e6:.2f} us/request')
+    finally:
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
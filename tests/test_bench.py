@@ -0,0 +1,76 @@
+import sys
+import unittest
+from unittest import mock
+
+from aiohttp.test_utils import AioHTTPTestCase, unittest_run_loop
+
+from aior.bench import BenchResult, drive, format_report, make_aior_app
+
+
+def _result(server, scenario, requests, latencies, duration=1.0, errors=0):
+    result = BenchResult(server, scenario)
+    result.requests = requests
+    result.latencies = latencies
+    result.duration = duration
+    result.errors = errors
+    return result
+
+
+class TestBenchResult(unittest.TestCase):
+    def test_01_percentile(self):
+        result = _result("aior", "json", 100, [(100 - i) / 1000 for i in range(100)])
+        self.assertEqual(0.051, result.percentile(0.5))
+        self.assertEqual(0.1, result.percentile(0.99))
+        # clamped to the slowest request
+        self.assertEqual(0.1, result.percentile(0.999))
+        self.assertEqual(0.001, result.percentile(0))
+        self.assertEqual(0.0, BenchResult("aior", "json").percentile(0.5))
+
+    def test_02_to_dict(self):
+        result = _result("aior", "model", 30, [0.001, 0.002, 0.003], duration=4.0, errors=2)
+        self.assertDictEqual({
+            "server": "aior",
+            "scenario": "model",
+            "requests": 30,
+            "errors": 2,
+            "rps": 7.5,
+            "p50_ms": 2.0,
+            "p99_ms": 3.0,
+            "p999_ms": 3.0,
+        }, result.to_dict())
+        self.assertEqual(0.0, BenchResult("aior", "model").to_dict()["rps"])
+
+    def test_03_format_report(self):
+        report = format_report([
+            _result("aior", "path", 900, [0.001]),
+            _result("aior", "json", 800, [0.001]),
+            _result("aiohttp", "json", 1000, [0.001]),
+            _result("aiohttp", "path", 0, [], duration=0.0),
+        ])
+        lines = report.splitlines()
+        self.assertTrue(lines[1].endswith("vs aiohttp"))
+        rows = [line.split() for line in lines[2:]]
+        self.assertEqual([["json", "aiohttp"], ["json", "aior"], ["path", "aiohttp"], ["path", "aior"]],
+                         [row[:2] for row in rows])
+        # the baseline itself and a baseline without requests get no relative column
+        self.assertEqual("0", rows[0][-1])
+        self.assertEqual("-20.0%", rows[1][-1])
+        self.assertEqual("0", rows[2][-1])
+        self.assertEqual("0", rows[3][-1])
+
+
+class TestDrive(AioHTTPTestCase):
+    def get_app(self):
+        with mock.patch.object(sys, "argv", ["aior"]):
+            return make_aior_app()
+
+    @unittest_run_loop
+    async def test_01_drive(self):
+        base_url = str(self.server.make_url("")).rstrip("/")
+        for scenario in ("json", "model", "queries", "ws"):
+            result = await drive("aior", scenario, base_url, concurrency=2, duration=0.1, warmup=0.05)
+            self.assertEqual(("aior", scenario), (result.server, result.scenario))
+            self.assertGreater(result.requests, 0)
+            self.assertEqual(0, result.errors)
+            self.assertEqual(result.requests, len(result.latencies))
+            self.assertEqual(0.1, result.duration)
@@ -0,0 +1,736 @@
+import asyncio
+import datetime
+import decimal
+import functools
+import itertools
+import shutil
+import sys
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+from unittest import mock
+
+from aiohttp.test_utils import TestClient, TestServer
+from pydantic import BaseModel
+
+try:
+    import aiosqlite
+    from sqlalchemy import Column, DateTime, Integer, String, select, text, update
+    from sqlalchemy.ext.asyncio import AsyncEngine
+    from sqlalchemy.orm import declarative_base
+except ImportError:
+    aiosqlite = None
+    declarative_base = None
+
+from aior.application import AiorApplication, _parse_database_config
+from aior.cache import coalesce_requests
+from aior.components import BaseHTTPHandler, JSONResponse
+from aior.constants import DBDialect, ReplicaPolicy, TotalMode
+from aior.components.dao import (
+    BaseDAO, CursorPage, CursorPageResult, RoutingSession, TimedQueuePool, decode_cursor, encode_cursor,
+    SessionScope, current_session_scope, generate_tables, init_engine, init_sqlite_engine, new_session,
+    session_scope, warm_up_pools, watch_pools)
+from aior.metrics import MetricsRegistry, PoolMetrics
+
+if declarative_base is not None:
+    Base = declarative_base()
+
+    class User(Base):
+        __tablename__ = "users"
+        id = Column(Integer, primary_key=True)
+        name = Column(String(32), nullable=False)
+        score = Column(Integer, nullable=False, default=0)
+        created_at = Column(DateTime, nullable=False, default=datetime.datetime(2021, 1, 1))
+
+    class UserDAO(BaseDAO[User]):
+        pass
+
+    class OtherUserDAO(BaseDAO[User]):
+        pass
+
+    class CachedUserDAO(BaseDAO[User]):
+        __result_cache__ = True
+
+
+class UserRow(BaseModel):
+    id: int = None
+    name: str
+    score: int = 7
+    created_at: datetime.datetime = datetime.datetime(2021, 1, 1)
+
+
+class UserName(BaseModel):
+    id: int
+    name: str
+
+
+class UserScore(BaseModel):
+    id: int
+    score: int
+
+    class Config:
+        orm_mode = True
+
+
+def async_test(func):
+    @functools.wraps(func)
+    def wrapper(self):
+        return self.loop.run_until_complete(func(self))
+
+    return wrapper
+
+
+@unittest.skipIf(aiosqlite is None, "needs sqlalchemy and aiosqlite")
+class DAOTestCase(unittest.TestCase):
+    """
+    Run each test against a fresh SQLite database file seeded with `USERS` users.
+    """
+    USERS = 23
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.set_up_database())
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.tear_down_database())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        self.tmp.cleanup()
+
+    def init_engine(self):
+        init_sqlite_engine(file=self.dir / "primary.db")
+
+    async def set_up_database(self):
+        self.init_engine()
+        await generate_tables(Base.metadata)
+        base = datetime.datetime(2020, 1, 1)
+        async with new_session() as session:
+            session.add_all([User(id=i, name=f"u{i % 5}", score=i % 4,
+                                  created_at=base + datetime.timedelta(hours=i % 7))
+                             for i in range(1, self.USERS + 1)])
+            await session.commit()
+
+    async def tear_down_database(self):
+        for dao_cls in (UserDAO, OtherUserDAO, CachedUserDAO):
+            dao_cls.invalidate_total_cache()
+            dao_cls.invalidate_result_cache()
+        await BaseDAO.__engine__.dispose()
+        if BaseDAO.__replicas__ is not None:
+            await BaseDAO.__replicas__.dispose()
+        BaseDAO.__engine__ = BaseDAO.__replicas__ = None
+
+
+class TestCursor(unittest.TestCase):
+    def test_01_round_trip(self):
+        keys = [1, "a", None, 0.5, True,
+                datetime.datetime(2020, 1, 2, 3, 4, 5, 6), datetime.date(2020, 1, 2),
+                decimal.Decimal("1.10"), uuid.UUID(int=7)]
+        cursor = encode_cursor("-created_at", keys)
+        self.assertNotIn("=", cursor)
+        self.assertEqual(keys, decode_cursor(cursor, "-created_at"))
+
+    def test_02_tampered_cursor(self):
+        cursor = encode_cursor("id", [3])
+        for tampered in ("", "!!!", cursor[:-2], cursor + "x", encode_cursor("-id", [3]),
+                         "eyJzIjoiaWQifQ", "eyJzIjoiaWQiLCJrIjpbeyJ4IjoxfV19"):
+            with self.assertRaises(ValueError, msg=tampered):
+                decode_cursor(tampered, "id")
+
+
+class TestPagination(DAOTestCase):
+    async def _walk(self, sort, limit):
+        ids = []
+        query = CursorPage(limit=limit, sort=sort)
+        async with new_session() as session:
+            dao = UserDAO(session)
+            while True:
+                page = await dao.select_pagination_by_cursor(query)
+                self.assertIsInstance(page, CursorPageResult)
+                self.assertLessEqual(len(page.items), limit)
+                ids.extend(user.id for user in page.items)
+                if page.next_cursor is None:
+                    return ids
+                query = CursorPage(limit=limit, sort=sort, cursor=page.next_cursor)
+
+    @async_test
+    async def test_01_cursor_pages(self):
+        self.assertEqual(list(range(1, 24)), await self._walk("id", 5))
+        self.assertEqual(list(range(23, 0, -1)), await self._walk("-id", 10))
+
+    @async_test
+    async def test_02_ties(self):
+        # the primary key breaks the ties of the sort column, in the same direction
+        self.assertEqual(sorted(range(1, 24), key=lambda i: (i % 4, i)), await self._walk("+score", 3))
+        self.assertEqual(sorted(range(1, 24), key=lambda i: (i % 4, i), reverse=True),
+                         await self._walk("-score", 4))
+        self.assertEqual(sorted(range(1, 24), key=lambda i: (i % 7, i)), await self._walk("created_at", 6))
+
+    @async_test
+    async def test_03_cursor_of_another_sort(self):
+        async with new_session() as session:
+            dao = UserDAO(session)
+            page = await dao.select_pagination_by_cursor(CursorPage(limit=2, sort="score"))
+            with self.assertRaises(ValueError):
+                await dao.select_pagination_by_cursor(CursorPage(limit=2, sort="id", cursor=page.next_cursor))
+
+    @async_test
+    async def test_04_first_page_is_limited(self):
+        async with new_session() as session:
+            dao = UserDAO(session)
+            users = await dao.select_pagination(1, 5)
+            self.assertEqual(5, len(users))
+            total, users = await dao.select_total_and_pagination(1, 5)
+            self.assertEqual((23, 5), (total, len(users)))
+            users = await dao.select_pagination(5, 5, order_by=[User.id])
+            self.assertEqual([21, 22, 23], [user.id for user in users])
+
+
+def _new_user(user_id, score=0):
+    return dict(id=user_id, name=f"n{user_id}", score=score, created_at=datetime.datetime(2021, 1, 1))
+
+
+class TestTotalModes(DAOTestCase):
+    MODES = (TotalMode.EXACT, TotalMode.WINDOW, TotalMode.CONCURRENT, TotalMode.CACHED, TotalMode.ESTIMATED)
+
+    async def _total(self, mode, dao_cls=UserDAO, session=None, page=1, filters=None):
+        if session is None:
+            async with new_session() as session:
+                return await self._total(mode, dao_cls, session, page, filters)
+        total, users = await dao_cls(session).select_total_and_pagination(
+            page, 5, order_by=[User.id], filters=filters, total_mode=mode)
+        return total, [user.id for user in users]
+
+    @async_test
+    async def test_01_modes(self):
+        for mode in self.MODES:
+            self.assertEqual((23, [6, 7, 8, 9, 10]), await self._total(mode, page=2), mode)
+            self.assertEqual((6, [21]), await self._total(mode, page=2, filters=[User.score == 1]), mode)
+            self.assertEqual((23, []), await self._total(mode, page=6), mode)
+        with self.assertRaises(ValueError):
+            await self._total("guess")
+
+    @async_test
+    async def test_02_concurrent_sees_own_writes(self):
+        async with new_session() as session:
+            await UserDAO(session).insert_one(**_new_user(100))
+            self.assertEqual(24, (await self._total(TotalMode.CONCURRENT, session=session))[0])
+            await session.rollback()
+        self.assertEqual(23, (await self._total(TotalMode.CONCURRENT))[0])
+
+    @async_test
+    async def test_03_cached_total_invalidated_after_commit(self):
+        for mode in (TotalMode.CACHED, TotalMode.ESTIMATED):
+            self.assertEqual(23, (await self._total(mode))[0])
+        async with new_session() as session:
+            await OtherUserDAO(session).insert_one(**_new_user(100))
+            # uncommitted, neither cached nor served from the cache
+            self.assertEqual(24, (await self._total(TotalMode.CACHED, OtherUserDAO, session))[0])
+            self.assertEqual(24, (await self._total(TotalMode.CACHED, UserDAO, session))[0])
+            # another session caches the committed total again meanwhile
+            self.assertEqual(23, (await self._total(TotalMode.CACHED))[0])
+            await session.commit()
+        for mode in (TotalMode.CACHED, TotalMode.ESTIMATED):
+            self.assertEqual(24, (await self._total(mode))[0])
+
+    @async_test
+    async def test_04_cached_total_after_rollback(self):
+        self.assertEqual(23, (await self._total(TotalMode.CACHED))[0])
+        async with new_session() as session:
+            await UserDAO(session).delete(User.id > 20)
+            self.assertEqual(20, (await self._total(TotalMode.CACHED, session=session))[0])
+            await session.rollback()
+            self.assertEqual(23, (await self._total(TotalMode.CACHED, session=session))[0])
+        self.assertEqual(23, (await self._total(TotalMode.CACHED))[0])
+
+
+class TestBulkInsert(DAOTestCase):
+    async def _users(self, *filters):
+        async with new_session() as session:
+            users = await UserDAO(session).select_many(*filters)
+            return {user.id: (user.name, user.score) for user in users}
+
+    @async_test
+    async def test_01_model_defaults(self):
+        async with new_session() as session:
+            await UserDAO(session).bulk_insert([UserRow(id=100, name="a"), UserRow(id=101, name="b", score=1)])
+            await session.commit()
+        self.assertEqual({100: ("a", 7), 101: ("b", 1)}, await self._users(User.id >= 100))
+
+    async def _insert_mixed(self, chunk_size):
+        rows = [dict(_new_user(100), name="a"), UserRow(name="b"), UserRow(name="c"),
+                dict(_new_user(200), name="d"), dict(name="e", score=2, created_at=datetime.datetime(2021, 1, 1))]
+        async with new_session() as session:
+            keys = await UserDAO(session).bulk_insert(rows, chunk_size=chunk_size, return_keys=True)
+            await session.commit()
+        self.assertEqual([100, 101, 102, 200, 201], keys)
+        self.assertEqual({100: ("a", 0), 101: ("b", 7), 102: ("c", 7), 200: ("d", 0), 201: ("e", 2)},
+                         await self._users(User.id >= 100))
+
+    @async_test
+    async def test_02_mixed_keys_returning(self):
+        self.assertTrue(BaseDAO.__engine__.dialect.insert_returning)
+        await self._insert_mixed(chunk_size=2)
+
+    @async_test
+    async def test_03_mixed_keys_without_returning(self):
+        # the multi-row INSERT fallback reads the ids from lastrowid
+        rows = [UserRow(name="a"), dict(name="b", score=2, created_at=datetime.datetime(2021, 1, 1)),
+                UserRow(name="c"), UserRow(name="d", score=3)]
+        with mock.patch.object(BaseDAO.__engine__.dialect, "insert_returning", False):
+            async with new_session() as session:
+                dao = UserDAO(session)
+                keys = await dao.bulk_insert(rows, chunk_size=10, return_keys=True)
+                with self.assertRaises(ValueError):
+                    await dao.bulk_insert([UserRow(name="e"), UserRow(id=300, name="f")], return_keys=True)
+                await session.commit()
+        self.assertEqual([24, 25, 26, 27], keys)
+        self.assertEqual({24: ("a", 7), 25: ("b", 2), 26: ("c", 7), 27: ("d", 3)}, await self._users(User.id > 23))
+
+    @async_test
+    async def test_04_without_keys(self):
+        async with new_session() as session:
+            result = await UserDAO(session).bulk_insert(
+                (UserRow(name=f"x{i}") if i % 3 else dict(_new_user(100 + i), name=f"x{i}") for i in range(10)),
+                chunk_size=4)
+            await session.commit()
+        self.assertIsNone(result)
+        self.assertEqual(10, len(await self._users(User.name.like("x%"))))
+
+
+class TestUpsert(DAOTestCase):
+    async def _upsert(self, rows, **kwargs):
+        async with new_session() as session:
+            affected = await UserDAO(session).upsert_many(rows, ["id"], **kwargs)
+            await session.commit()
+        async with new_session() as session:
+            users = await UserDAO(session).select_many(User.id.in_([1, 2, 3, 100]))
+            return affected, {user.id: (user.name, user.score) for user in users}
+
+    @async_test
+    async def test_01_mixed_keys(self):
+        rows = [dict(_new_user(1), name="x", score=9), UserRow(id=2, name="y"),
+                dict(id=3, name="z"), dict(_new_user(100), name="w")]
+        affected, users = await self._upsert(rows, chunk_size=10)
+        self.assertEqual(4, affected)
+        # the row giving only a name keeps its score
+        self.assertEqual({1: ("x", 9), 2: ("y", 7), 3: ("z", 3), 100: ("w", 0)}, users)
+
+    @async_test
+    async def test_02_update_columns(self):
+        rows = [dict(_new_user(1), name="x", score=9), dict(_new_user(100), name="w", score=5)]
+        affected, users = await self._upsert(rows, update_columns=["score"])
+        self.assertEqual(2, affected)
+        self.assertEqual({1: ("u1", 9), 2: ("u2", 2), 3: ("u3", 3), 100: ("w", 5)}, users)
+
+        with self.assertRaises(ValueError):
+            await self._upsert([dict(id=1, name="x")], update_columns=["score"])
+
+    @async_test
+    async def test_03_nothing_to_update(self):
+        affected, users = await self._upsert([dict(_new_user(1), name="x"), dict(_new_user(100), name="w")],
+                                             update_columns=[])
+        self.assertEqual(1, affected)
+        self.assertEqual({1: ("u1", 1), 2: ("u2", 2), 3: ("u3", 3), 100: ("w", 0)}, users)
+
+
+class TestStream(DAOTestCase):
+    @async_test
+    async def test_01_records(self):
+        async with new_session() as session:
+            dao = UserDAO(session)
+            users = [user async for user in dao.select_stream(batch_size=4, order_by=[User.id.desc()])]
+            self.assertEqual(list(range(23, 0, -1)), [user.id for user in users])
+            self.assertIsInstance(users[0], User)
+
+            users = [user async for user in dao.select_stream(User.score == 1, batch_size=2)]
+            self.assertEqual([1, 5, 9, 13, 17, 21], sorted(user.id for user in users))
+
+    @async_test
+    async def test_02_columns_and_models(self):
+        async with new_session() as session:
+            dao = UserDAO(session)
+            rows = [tuple(row) async for row in dao.select_stream(
+                User.id < 4, columns=[User.id, User.name], order_by=[User.id], batch_size=2)]
+            self.assertEqual([(1, "u1"), (2, "u2"), (3, "u3")], rows)
+
+            names = [name async for name in dao.select_stream(User.id < 3, model=UserName, order_by=[User.id])]
+            self.assertEqual([UserName(id=1, name="u1"), UserName(id=2, name="u2")], names)
+            scores = [score async for score in dao.select_stream(User.id < 3, model=UserScore, order_by=[User.id])]
+            self.assertEqual([UserScore(id=1, score=1), UserScore(id=2, score=2)], scores)
+
+    @async_test
+    async def test_03_break_closes_result(self):
+        async with new_session() as session:
+            dao = UserDAO(session)
+            stream = dao.select_stream(batch_size=3, order_by=[User.id])
+            async for user in stream:
+                if user.id == 5:
+                    break
+            await stream.aclose()
+            # the connection is free for the next statement
+            self.assertEqual(23, len(await dao.select_many()))
+
+
+class TestRouting(DAOTestCase):
+    """
+    The replicas are copies of the primary database where user 1 is renamed
+    after the replica, telling which engine served a read.
+    """
+
+    def init_engine(self):
+        init_sqlite_engine(file=self.dir / "primary.db",
+                           replicas=[self.dir / "replica0.db", self.dir / "replica1.db"],
+                           replica_policy=ReplicaPolicy.ROUND_ROBIN)
+
+    async def set_up_database(self):
+        await super().set_up_database()
+        for i, engine in enumerate(BaseDAO.__replicas__.engines):
+            shutil.copy(self.dir / "primary.db", self.dir / f"replica{i}.db")
+            async with engine.begin() as conn:
+                await conn.execute(update(User).where(User.id == 1).values(name=f"replica{i}"))
+
+    async def _served_by(self, session, stmt=None):
+        if stmt is None:
+            stmt = select(User.name).where(User.id == 1)
+        cursor = await session.execute(stmt)
+        return cursor.scalar()
+
+    @async_test
+    async def test_01_replica_reads(self):
+        async with new_session() as session:
+            self.assertEqual("replica0", await self._served_by(session))
+            # the replica is chosen once per session
+            self.assertEqual("replica0", await self._served_by(session))
+            self.assertEqual("replica0", (await UserDAO(session).select_one(User.id == 1)).name)
+        async with new_session() as session:
+            self.assertEqual("replica1", await self._served_by(session))
+
+    @async_test
+    async def test_02_read_your_writes(self):
+        async with new_session() as session:
+            self.assertEqual("replica0", await self._served_by(session))
+            await UserDAO(session).update([User.id == 2], {"score": 10})
+            self.assertEqual("u1", await self._served_by(session))
+            await session.commit()
+            self.assertEqual("u1", await self._served_by(session))
+
+        async with new_session(read_your_writes=False) as session:
+            await UserDAO(session).update([User.id == 2], {"score": 11})
+            self.assertEqual("replica1", await self._served_by(session))
+
+    @async_test
+    async def test_03_primary_statements(self):
+        async with new_session(use_primary=True) as session:
+            self.assertEqual("u1", await self._served_by(session))
+        async with new_session() as session:
+            stmt = select(User.name).where(User.id == 1).with_for_update()
+            self.assertEqual("u1", await self._served_by(session, stmt))
+        async with new_session(read_your_writes=False) as session:
+            stmt = text("SELECT name FROM users WHERE id = 1")
+            self.assertEqual("u1", await self._served_by(session, stmt))
+            self.assertEqual("replica0", await self._served_by(session))
+
+    @async_test
+    async def test_04_explicit_transaction(self):
+        async with new_session() as session:
+            async with session.begin():
+                self.assertEqual("u1", await self._served_by(session))
+            self.assertTrue(session.sync_session.use_primary)
+
+        # a SAVEPOINT keeps the server of its transaction
+        async with new_session() as session:
+            self.assertEqual("replica0", await self._served_by(session))
+            async with session.begin_nested():
+                self.assertEqual("replica0", await self._served_by(session))
+
+
+class TestRoutingWithoutReplicas(DAOTestCase):
+    @async_test
+    async def test_01_primary(self):
+        self.assertIsNone(BaseDAO.__replicas__)
+        async with new_session() as session:
+            self.assertIsInstance(session.sync_session, RoutingSession)
+            self.assertIs(BaseDAO.__engine__.sync_engine, session.sync_session.get_bind(clause=select(User)))
+            async with session.begin():
+                self.assertEqual(23, len(await UserDAO(session).select_many()))
+
+
+class TestResultCache(DAOTestCase):
+    async def _name(self, session=None, user_id=1):
+        if session is None:
+            async with new_session() as session:
+                return await self._name(session, user_id)
+        user = await CachedUserDAO(session).select_one(User.id == user_id)
+        return user.name
+
+    async def _rename_behind(self, name):
+        # straight through the engine, unseen by the DAO caches
+        async with BaseDAO.__engine__.begin() as conn:
+            await conn.execute(update(User).where(User.id == 1).values(name=name))
+
+    @async_test
+    async def test_01_hit(self):
+        stats = CachedUserDAO.result_cache_stats()
+        self.assertEqual("u1", await self._name())
+        await self._rename_behind("behind")
+        self.assertEqual("u1", await self._name())
+        async with new_session() as session:
+            users = await CachedUserDAO(session).select_many(User.score == 1)
+            self.assertEqual([1, 5, 9, 13, 17, 21], sorted(user.id for user in users))
+            # hits are attached to the session, like queried records
+            self.assertIn(users[0], session)
+
+        new_stats = CachedUserDAO.result_cache_stats()
+        self.assertEqual(stats["hits"] + 1, new_stats["hits"])
+        self.assertEqual(stats["misses"] + 2, new_stats["misses"])
+        self.assertEqual(2, new_stats["size"])
+        self.assertIsNone(UserDAO.result_cache_stats())
+
+    @async_test
+    async def test_02_invalidated_after_commit(self):
+        self.assertEqual("u1", await self._name())
+        async with new_session() as session:
+            await OtherUserDAO(session).update([User.id == 1], {"name": "new"})
+            # the writing session reads its own rows, without caching them
+            self.assertEqual("new", await self._name(session))
+            # others read the committed rows, cached again meanwhile
+            self.assertEqual("u1", await self._name())
+            self.assertEqual(1, CachedUserDAO.result_cache_stats()["size"])
+            await session.commit()
+        self.assertEqual(0, CachedUserDAO.result_cache_stats()["size"])
+        self.assertEqual("new", await self._name())
+
+    @async_test
+    async def test_03_rollback_keeps_cache(self):
+        async with new_session() as session:
+            await UserDAO(session).update([User.id == 1], {"name": "new"})
+            self.assertEqual("new", await self._name(session))
+            self.assertEqual("u1", await self._name())
+            await session.rollback()
+            self.assertEqual(1, CachedUserDAO.result_cache_stats()["size"])
+            # the session reads through the cache again
+            await self._rename_behind("behind")
+            self.assertEqual("u1", await self._name(session))
+        self.assertEqual("u1", await self._name())
+
+    @async_test
+    async def test_04_invalidate_result_cache(self):
+        self.assertEqual("u1", await self._name())
+        await self._rename_behind("behind")
+        OtherUserDAO.invalidate_result_cache()
+        self.assertEqual("behind", await self._name())
+
+
+class TestPools(DAOTestCase):
+    def init_engine(self):
+        init_engine(dialect=DBDialect.SQLite, file=self.dir / "primary.db", replicas=[self.dir / "replica.db"],
+                    pool_size=3, max_overflow=0, pool_timeout=0.5, pool_pre_ping=True)
+
+    def test_01_parse_database_config(self):
+        options = _parse_database_config({
+            "dialect": "mysql", "port": "3307", "pool-size": "10", "max_overflow": "5", "pool_timeout": "2.5",
+            "pool_pre_ping": "Yes", "warm_up": "4", "replicas": "db-1, db-2:3308,",
+        })
+        self.assertEqual(dict(dialect="mysql", port=3307, pool_size=10, max_overflow=5, pool_timeout=2.5,
+                              pool_pre_ping=True, warm_up=4, replicas=["db-1", "db-2:3308"]), options)
+        # yaml values are typed already
+        typed = dict(port=3307, pool_pre_ping=False, replicas=["db-1"])
+        self.assertEqual(typed, _parse_database_config(typed))
+
+    def test_02_pool_kwargs(self):
+        for engine in (BaseDAO.__engine__, *BaseDAO.__replicas__.engines):
+            pool = engine.sync_engine.pool
+            self.assertIsInstance(pool, TimedQueuePool)
+            self.assertEqual(3, pool.size())
+            self.assertEqual(0, pool._max_overflow)
+            self.assertEqual(0.5, pool._timeout)
+            self.assertTrue(pool._pre_ping)
+
+    @async_test
+    async def test_03_on_wait(self):
+        registry = MetricsRegistry()
+        metrics = PoolMetrics(registry)
+        watch_pools(metrics)
+        async with BaseDAO.__engine__.connect():
+            pass
+        self.assertEqual(1, metrics.wait.get(("primary",))["count"])
+        self.assertIsNone(metrics.wait.get(("replica0",)))
+
+        # kept by the pool the engine recreates on dispose
+        await BaseDAO.__engine__.dispose()
+        pool = BaseDAO.__engine__.sync_engine.pool
+        self.assertIsInstance(pool, TimedQueuePool)
+        self.assertEqual(3, pool.size())
+        async with BaseDAO.__engine__.connect():
+            pass
+        self.assertEqual(2, metrics.wait.get(("primary",))["count"])
+        registry.render()
+        self.assertEqual(3, metrics.size.get(("replica0",)))
+
+    @async_test
+    async def test_04_warm_up(self):
+        await BaseDAO.__engine__.dispose()
+        await warm_up_pools(2)
+        self.assertEqual(2, BaseDAO.__engine__.sync_engine.pool.checkedin())
+        self.assertEqual(2, BaseDAO.__replicas__.engines[0].sync_engine.pool.checkedin())
+
+        # clamped to the pool size, more would wait for a free connection until the pool timeout
+        await warm_up_pools(10)
+        await warm_up_pools()
+        for engine in (BaseDAO.__engine__, *BaseDAO.__replicas__.engines):
+            self.assertEqual(3, engine.sync_engine.pool.checkedin())
+            self.assertEqual(0, engine.sync_engine.pool.checkedout())
+
+    @async_test
+    async def test_05_warm_up_failure(self):
+        await BaseDAO.__engine__.dispose()
+        connect, calls = AsyncEngine.connect, itertools.count()
+
+        def failing_connect(engine):
+            if next(calls) == 1:
+                return mock.Mock(start=mock.AsyncMock(side_effect=OSError("refused")))
+            return connect(engine)
+
+        with mock.patch.object(AsyncEngine, "connect", failing_connect):
+            with self.assertRaises(OSError):
+                await warm_up_pools()
+        pool = BaseDAO.__engine__.sync_engine.pool
+        self.assertEqual(0, pool.checkedout())
+        self.assertEqual(2, pool.checkedin())
+
+
+class UserService:
+    @session_scope
+    async def rename(self, user_id, name, fail=False):
+        await UserDAO(self.db_session).update([User.id == user_id], {"name": name})
+        if fail:
+            raise ValueError(name)
+        return self.db_session
+
+    @session_scope
+    async def name(self, user_id):
+        user = await UserDAO(self.db_session).select_one(User.id == user_id)
+        return user.name
+
+
+class UsersHandler(BaseHTTPHandler):
+    __db_session__ = True
+
+    async def get(self):
+        return JSONResponse(self._db_scope._session is None)
+
+    async def post(self):
+        service = UserService()
+        await service.rename(1, "a")
+        await service.rename(2, "b")
+        return JSONResponse(service.db_session is self.db_session)
+
+
+class CoalescedUsersHandler(BaseHTTPHandler):
+    __db_session__ = True
+
+    @coalesce_requests()
+    async def get(self):
+        await UserDAO(self.db_session).update([User.id == 1], {"name": "shared"})
+        await asyncio.sleep(0.2)
+        return JSONResponse(await UserService().name(1))
+
+
+class TestSessionScope(DAOTestCase):
+    async def _names(self):
+        service = UserService()
+        return [await service.name(user_id) for user_id in (1, 2, 3)]
+
+    @async_test
+    async def test_01_reuse(self):
+        service = UserService()
+        async with SessionScope() as scope:
+            self.assertIs(scope, current_session_scope())
+            self.assertIs(scope.session, await service.rename(1, "a"))
+            self.assertIs(scope.session, await service.rename(2, "b"))
+            self.assertEqual("a", await service.name(1))
+        self.assertIsNone(current_session_scope())
+        self.assertTrue(scope.closed)
+        with self.assertRaises(RuntimeError):
+            scope.session
+        self.assertEqual(["a", "b", "u3"], await self._names())
+
+        # the scope commits nothing when it raises
+        with self.assertRaises(ValueError):
+            async with SessionScope():
+                await service.rename(3, "c")
+                raise ValueError()
+        self.assertEqual(["a", "b", "u3"], await self._names())
+
+    @async_test
+    async def test_02_savepoint(self):
+        service = UserService()
+        async with SessionScope():
+            await service.rename(1, "a")
+            with self.assertRaises(ValueError):
+                await service.rename(2, "b", fail=True)
+            # the failing call only rolled back its own work
+            self.assertEqual("a", await service.name(1))
+            self.assertEqual("u2", await service.name(2))
+            await service.rename(3, "c")
+        self.assertEqual(["a", "u2", "c"], await self._names())
+
+    @async_test
+    async def test_03_rollback_without_savepoint(self):
+        service = UserService()
+        async with SessionScope() as scope:
+            with self.assertRaises(ValueError):
+                await service.rename(1, "a", fail=True)
+            self.assertFalse(scope.session.in_transaction())
+            await service.rename(2, "b")
+        self.assertEqual(["u1", "b", "u3"], await self._names())
+
+    @async_test
+    async def test_04_task_outliving_scope(self):
+        service = UserService()
+        started = asyncio.Event()
+
+        async def late_rename():
+            await started.wait()
+            return await service.rename(1, "late")
+
+        async with SessionScope() as scope:
+            task = asyncio.ensure_future(late_rename())
+            await service.rename(2, "b")
+        started.set()
+        # the closed scope of the task is replaced by a session of its own
+        self.assertIsNot(scope._session, await task)
+        self.assertEqual(["late", "b", "u3"], await self._names())
+
+    @async_test
+    async def test_05_handler_session(self):
+        with mock.patch.object(sys, "argv", ["aior"]):
+            app = AiorApplication(routes=[("/users", UsersHandler)], loop=self.loop)
+        async with TestClient(TestServer(app)) as client:
+            # opened on first use only
+            response = await client.get("/users")
+            self.assertEqual("true", await response.text())
+            response = await client.post("/users")
+            self.assertEqual("true", await response.text())
+        self.assertEqual(["a", "b", "u3"], await self._names())
+
+    @async_test
+    async def test_06_coalesced_call_outlives_leader(self):
+        with mock.patch.object(sys, "argv", ["aior"]):
+            app = AiorApplication(routes=[("/users", CoalescedUsersHandler)], loop=self.loop)
+        async with TestClient(TestServer(app)) as client:
+            leader = asyncio.ensure_future(client.get("/users"))
+            await asyncio.sleep(0.05)
+            follower = asyncio.ensure_future(client.get("/users"))
+            await asyncio.sleep(0.05)
+            # the client of the first request disconnects
+            leader.cancel()
+            response = await follower
+            self.assertEqual(200, response.status)
+            self.assertEqual("shared", await response.text())
+        self.assertEqual(1, CoalescedUsersHandler.get.__coalesce__.stats["coalesced"])
+        self.assertEqual(["shared", "u2", "u3"], await self._names())
@@ -1,13 +1,25 @@
+import asyncio
+import importlib
+import importlib.util
+import json
+import unittest
+from typing import List, get_type_hints
+from unittest import mock
+
 from aiohttp.test_utils import AioHTTPTestCase, unittest_run_loop
 from aiohttp.web_response import Response as OriginResponse
-from pydantic import Field, BaseModel
+from pydantic import Field, BaseModel, ValidationError
 
 from aior.application import AiorApplication
+from aior.cache import cache_response, coalesce_requests
+from aior.codec import StdJSONCodec, OrjsonCodec
+from aior.compat import PYDANTIC_V2, model_validate, model_validate_json, validation_errors
+from aior.metrics import MetricsRegistry, PoolMetrics, metrics_middleware
 from aior.components import (
     BaseHTTPHandler,
     NoContentResponse,
     JSONResponse,
-    JSONBody, Queries, Headers, PathArgs)
+    JSONBody, Queries, Headers, PathArgs, PlainBody, BytesBody, JSONStreamResponse, NotFoundError)
 
 
 class Item(BaseModel):
@@ -323,6 +335,7 @@ class TestHTTPError(AioHTTPTestCase):
     def get_app(self) -> AiorApplication:
         return AiorApplication(routes=[
             ("/items", ItemsTestHandler),
+            ("/item_list", ItemListHandler),
         ])
 
     @unittest_run_loop
@@ -335,3 +348,553 @@ class TestHTTPError(AioHTTPTestCase):
                           'msg': 'field required',
                           'type': 'value_error.missing'}]
         self.assertListEqual(expected_body, res)
+
+    @unittest_run_loop
+    async def test_02_malformed_json(self):
+        for path in ("/items", "/item_list"):
+            response = await self.client.post(path, data=b'{"name": "secret')
+            self.assertEqual(400, response.status)
+            # the raw body is not echoed back
+            self.assertNotIn("secret", await response.text())
+
+    @unittest.skipUnless(PYDANTIC_V2, "pydantic v2 errors")
+    def test_03_v2_errors_in_v1_shape(self):
+        class Model(BaseModel):
+            name: str
+            count: int = 0
+
+        with self.assertRaises(ValidationError) as cm:
+            model_validate(Model, {"count": "x", "secret": 1})
+        self.assertEqual([{"loc": ("name",), "msg": "field required", "type": "value_error.missing"},
+                          {"loc": ("count",), "msg": "value is not a valid integer", "type": "type_error.integer"}],
+                         validation_errors(cm.exception))
+
+        with self.assertRaises(ValidationError) as cm:
+            model_validate_json(Model, b'{"name": "secret')
+        error, = validation_errors(cm.exception)
+        self.assertEqual((("__root__",), "value_error.jsondecode"), (error["loc"], error["type"]))
+        self.assertNotIn("secret", json.dumps(error))
+
+
+class MultiBodyHandler(BaseHTTPHandler):
+    @staticmethod
+    async def post(item: JSONBody[Item], raw: dict, text: PlainBody, data: BytesBody):
+        return JSONResponse({"name": item.name, "raw": raw, "text": text, "size": len(data)})
+
+
+class ItemListHandler(BaseHTTPHandler):
+    @staticmethod
+    async def post(items: JSONBody[List[Item]]):
+        return JSONResponse(items)
+
+
+class TestRequestBinder(AioHTTPTestCase):
+    def get_app(self) -> AiorApplication:
+        return AiorApplication(routes=[
+            ("/multi", MultiBodyHandler),
+            ("/item_list", ItemListHandler),
+        ], json_codec=StdJSONCodec())
+
+    @unittest_run_loop
+    async def test_01_body_bound_to_many_arguments(self):
+        payload = '{"name": "Phone"}'
+        codec = self.app.json_codec
+        with mock.patch.object(codec, "loads", wraps=codec.loads) as loads:
+            response = await self.client.post("/multi", data=payload,
+                                              headers={"Content-Type": "application/json"})
+        self.assertEqual(200, response.status)
+        res = await response.json()
+        self.assertDictEqual({"name": "Phone", "raw": {"name": "Phone"},
+                              "text": payload, "size": len(payload)}, res)
+        self.assertEqual(1, loads.call_count)
+
+    @unittest_run_loop
+    async def test_02_invalid_json_body(self):
+        response = await self.client.post("/multi", data="not json")
+        self.assertEqual(400, response.status)
+
+    @unittest_run_loop
+    async def test_03_model_list_body(self):
+        response = await self.client.post("/item_list", json=[{"name": "Phone"}, {"name": "TV"}])
+        self.assertEqual(200, response.status)
+        self.assertListEqual([{"name": "Phone"}, {"name": "TV"}], await response.json())
+
+        response = await self.client.post("/item_list", json=[{"nam": "Phone"}])
+        self.assertEqual(400, response.status)
+
+
+class TestJSONCodec(AioHTTPTestCase):
+    def get_app(self) -> AiorApplication:
+        return AiorApplication(routes=[
+            ("/items", ItemsHandler),
+            ("/json_model", JSONModelHandler),
+        ], json_codec="orjson")
+
+    @unittest_run_loop
+    async def test_01_orjson_codec(self):
+        self.assertIsInstance(self.app.json_codec, OrjsonCodec)
+        response = await self.client.post("/items",
+                                          json={"name": "Phone"},
+                                          params={"q": "one"})
+        self.assertEqual(200, response.status)
+        self.assertEqual(b'{"name":"Phone","q":"one"}', await response.read())
+
+    @unittest_run_loop
+    async def test_02_encode_model_list(self):
+        response = await self.client.post("/json_model")
+        self.assertEqual(200, response.status)
+        self.assertListEqual([{"name": "Phone"}, {"name": "TV"}], await response.json())
+
+    @unittest_run_loop
+    async def test_03_codec_per_application(self):
+        # a second application of the process keeps its own codec
+        other = AiorApplication(routes=[("/items", ItemsHandler)], json_codec="json")
+        self.assertIsInstance(other.json_codec, StdJSONCodec)
+        response = await self.client.post("/items", json={"name": "Phone"}, params={"q": "one"})
+        self.assertEqual(b'{"name":"Phone","q":"one"}', await response.read())
+
+    def test_04_custom_encoder_needs_std_codec(self):
+        class Encoder(json.JSONEncoder):
+            pass
+
+        with self.assertRaises(ValueError):
+            AiorApplication(routes=[], json_codec="orjson", default_json_encoder=Encoder)
+
+
+async def iter_items(n):
+    for i in range(n):
+        yield Item(name=f"item_{i}")
+
+
+class JSONStreamHandler(BaseHTTPHandler):
+    @staticmethod
+    async def get():
+        return JSONStreamResponse(iter_items(3))
+
+    @staticmethod
+    async def post():
+        return JSONStreamResponse(iter_items(3), mode=JSONStreamResponse.NDJSON)
+
+    @staticmethod
+    async def put():
+        return JSONStreamResponse([])
+
+
+class TestJSONStreamResponse(AioHTTPTestCase):
+    def get_app(self) -> AiorApplication:
+        return AiorApplication(routes=[
+            ("/stream", JSONStreamHandler),
+        ])
+
+    @unittest_run_loop
+    async def test_01_json_array(self):
+        response = await self.client.get("/stream")
+        self.assertEqual(200, response.status)
+        self.assertEqual("chunked", response.headers["Transfer-Encoding"])
+        res = await response.json()
+        self.assertListEqual([{"name": "item_0"}, {"name": "item_1"}, {"name": "item_2"}], res)
+
+    @unittest_run_loop
+    async def test_02_ndjson(self):
+        response = await self.client.post("/stream")
+        self.assertEqual(200, response.status)
+        self.assertEqual("application/x-ndjson; charset=utf-8", response.headers["Content-Type"])
+        lines = (await response.text()).splitlines()
+        self.assertListEqual([{"name": "item_0"}, {"name": "item_1"}, {"name": "item_2"}],
+                             [json.loads(line) for line in lines])
+
+    @unittest_run_loop
+    async def test_03_empty_json_array(self):
+        response = await self.client.put("/stream")
+        self.assertEqual(200, response.status)
+        self.assertListEqual([], await response.json())
+
+
+class LargeJSONHandler(BaseHTTPHandler):
+    @staticmethod
+    async def get():
+        return JSONResponse([{"name": f"item_{i}"} for i in range(1000)])
+
+    @staticmethod
+    async def post():
+        return JSONResponse({"name": "small"})
+
+
+class UncompressedHandler(LargeJSONHandler):
+    __compress__ = False
+
+
+class TestCompression(AioHTTPTestCase):
+    def get_app(self) -> AiorApplication:
+        return AiorApplication(routes=[
+            ("/large", LargeJSONHandler),
+            ("/uncompressed", UncompressedHandler),
+            ("/stream", JSONStreamHandler),
+        ], enable_compression=True, compression_executor_threshold=16 * 1024)
+
+    @unittest_run_loop
+    async def test_01_gzip(self):
+        response = await self.client.get("/large", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(200, response.status)
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+        self.assertEqual("Accept-Encoding", response.headers["Vary"])
+        res = await response.json()
+        self.assertEqual(1000, len(res))
+
+    @unittest_run_loop
+    async def test_02_deflate_preferred_by_quality(self):
+        response = await self.client.get("/large", headers={"Accept-Encoding": "gzip;q=0.5, deflate"})
+        self.assertEqual("deflate", response.headers["Content-Encoding"])
+
+    @unittest_run_loop
+    async def test_03_not_compressed(self):
+        response = await self.client.get("/large", headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        response = await self.client.post("/large", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        response = await self.client.get("/uncompressed", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    @unittest_run_loop
+    async def test_04_stream(self):
+        response = await self.client.get("/stream", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+        self.assertEqual(3, len(await response.json()))
+
+
+class CachedItemHandler(BaseHTTPHandler):
+    calls = 0
+
+    @cache_response(ttl=60, maxsize=2)
+    async def get(self, path_args: PathArgs[ItemPath], queries: Queries[ItemQuery]):
+        CachedItemHandler.calls += 1
+        return JSONResponse({"item_id": path_args.item_id, "q": queries.q,
+                             "calls": CachedItemHandler.calls})
+
+
+class PrivateItemHandler(BaseHTTPHandler):
+    calls = 0
+
+    @cache_response(ttl=60)
+    async def get(self, path_args: PathArgs[ItemPath]):
+        PrivateItemHandler.calls += 1
+        response = JSONResponse({"calls": PrivateItemHandler.calls})
+        if path_args.item_id == 1:
+            response.set_cookie("session", str(PrivateItemHandler.calls))
+        elif path_args.item_id == 2:
+            response.headers["Cache-Control"] = "max-age=60, Private"
+        else:
+            response.headers["Cache-Control"] = "no-store"
+        return response
+
+
+class TestResponseCache(AioHTTPTestCase):
+    def get_app(self) -> AiorApplication:
+        CachedItemHandler.get.__cache__.clear()
+        return AiorApplication(routes=[
+            ("/cached/{item_id}", CachedItemHandler),
+            ("/private/{item_id}", PrivateItemHandler),
+        ])
+
+    @unittest_run_loop
+    async def test_01_hit_and_miss(self):
+        cache = CachedItemHandler.get.__cache__
+        hits, misses = cache.stats["hits"], cache.stats["misses"]
+        res1 = await (await self.client.get("/cached/1", params={"q": "a"})).json()
+        res2 = await (await self.client.get("/cached/1", params={"q": "a"})).json()
+        res3 = await (await self.client.get("/cached/1", params={"q": "b"})).json()
+        self.assertEqual(res1, res2)
+        self.assertNotEqual(res1["calls"], res3["calls"])
+        self.assertEqual(hits + 1, cache.stats["hits"])
+        self.assertEqual(misses + 2, cache.stats["misses"])
+
+    @unittest_run_loop
+    async def test_02_eviction_and_invalidation(self):
+        cache = CachedItemHandler.get.__cache__
+        evictions = cache.stats["evictions"]
+        for item_id in (1, 2, 3):
+            await self.client.get(f"/cached/{item_id}", params={"q": "a"})
+        self.assertEqual(2, cache.stats["size"])
+        self.assertEqual(evictions + 1, cache.stats["evictions"])
+
+        calls = CachedItemHandler.calls
+        self.assertEqual(1, cache.invalidate(item_id=3))
+        res = await (await self.client.get("/cached/3", params={"q": "a"})).json()
+        self.assertEqual(calls + 1, res["calls"])
+
+    @unittest_run_loop
+    async def test_03_bad_request_not_cached(self):
+        response = await self.client.get("/cached/x", params={"q": "a"})
+        self.assertEqual(400, response.status)
+        self.assertEqual(0, CachedItemHandler.get.__cache__.stats["size"])
+
+    @unittest_run_loop
+    async def test_04_private_response_not_cached(self):
+        for item_id in (1, 2, 3):
+            first = await self.client.get(f"/private/{item_id}")
+            second = await self.client.get(f"/private/{item_id}")
+            self.assertNotEqual((await first.json())["calls"], (await second.json())["calls"])
+        self.assertEqual(0, PrivateItemHandler.get.__cache__.stats["size"])
+
+        # a client never receives the cookie of another one
+        first = await self.client.get("/private/1")
+        second = await self.client.get("/private/1")
+        self.assertNotEqual(first.cookies["session"].value, second.cookies["session"].value)
+
+
+class CoalescedItemHandler(BaseHTTPHandler):
+    calls = 0
+
+    @coalesce_requests()
+    async def get(self, path_args: PathArgs[ItemPath]):
+        CoalescedItemHandler.calls += 1
+        await asyncio.sleep(0.1)
+        if path_args.item_id == 0:
+            raise NotFoundError("Item is not found")
+        return JSONResponse({"item_id": path_args.item_id})
+
+
+class TestRequestCoalescing(AioHTTPTestCase):
+    def get_app(self) -> AiorApplication:
+        return AiorApplication(routes=[
+            ("/coalesced/{item_id}", CoalescedItemHandler),
+        ])
+
+    @unittest_run_loop
+    async def test_01_share_inflight_call(self):
+        calls = CoalescedItemHandler.calls
+        responses = await asyncio.gather(*[self.client.get("/coalesced/1") for _ in range(10)],
+                                         self.client.get("/coalesced/2"))
+        self.assertEqual(calls + 2, CoalescedItemHandler.calls)
+        for response in responses[:10]:
+            self.assertEqual(200, response.status)
+            self.assertDictEqual({"item_id": 1}, await response.json())
+        self.assertDictEqual({"item_id": 2}, await responses[10].json())
+
+    @unittest_run_loop
+    async def test_02_share_http_error(self):
+        responses = await asyncio.gather(*[self.client.get("/coalesced/0") for _ in range(3)])
+        self.assertListEqual([404, 404, 404], [r.status for r in responses])
+
+
+class VersionedItemHandler(BaseHTTPHandler):
+    calls = 0
+
+    async def get_etag(self):
+        return self.request.query.get("version")
+
+    @staticmethod
+    async def get():
+        VersionedItemHandler.calls += 1
+        return JSONResponse([{"name": f"item_{i}"} for i in range(1000)])
+
+
+class TestETag(AioHTTPTestCase):
+    def get_app(self) -> AiorApplication:
+        return AiorApplication(routes=[
+            ("/large", LargeJSONHandler),
+            ("/versioned", VersionedItemHandler),
+        ], enable_etag=True, enable_compression=True)
+
+    @unittest_run_loop
+    async def test_01_body_etag(self):
+        response = await self.client.get("/large", headers={"Accept-Encoding": "identity"})
+        etag = response.headers["ETag"]
+        self.assertTrue(etag.startswith('"'))
+
+        response = await self.client.get("/large", headers={"If-None-Match": etag})
+        self.assertEqual(304, response.status)
+        self.assertEqual(etag, response.headers["ETag"])
+        self.assertEqual(b"", await response.read())
+
+    @unittest_run_loop
+    async def test_02_compressed_etag_is_weak(self):
+        response = await self.client.get("/large", headers={"Accept-Encoding": "gzip"})
+        etag = response.headers["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+
+        response = await self.client.get("/large", headers={"Accept-Encoding": "gzip",
+                                                            "If-None-Match": etag})
+        self.assertEqual(304, response.status)
+
+    @unittest_run_loop
+    async def test_03_version_token(self):
+        calls = VersionedItemHandler.calls
+        response = await self.client.get("/versioned", params={"version": "7"})
+        self.assertEqual(200, response.status)
+        self.assertEqual('W/"7"', response.headers["ETag"])
+
+        response = await self.client.get("/versioned", params={"version": "7"},
+                                         headers={"If-None-Match": 'W/"7"'})
+        self.assertEqual(304, response.status)
+        self.assertEqual(calls + 1, VersionedItemHandler.calls)
+
+        response = await self.client.get("/versioned", params={"version": "8"},
+                                         headers={"If-None-Match": 'W/"7"'})
+        self.assertEqual(200, response.status)
+
+
+class TestMetrics(AioHTTPTestCase):
+    def get_app(self) -> AiorApplication:
+        return AiorApplication(routes=[
+            ("/items", ItemsHandler),
+            ("/large", LargeJSONHandler),
+        ], enable_metrics=True, enable_compression=True)
+
+    @unittest_run_loop
+    async def test_01_request_metrics(self):
+        await self.client.post("/items", json={"name": "a"}, params={"q": "x"})
+        await self.client.post("/items", data=b"{", params={"q": "x"})
+        response = await self.client.get("/large", headers={"Accept-Encoding": "gzip"})
+        compressed_size = int(response.headers["Content-Length"])
+
+        metrics = self.app.metrics
+        self.assertEqual(1, metrics.requests.get(("/items", "POST", "200")))
+        self.assertEqual(1, metrics.requests.get(("/items", "POST", "400")))
+        self.assertEqual(2, metrics.duration.get(("/items", "POST"))["count"])
+        self.assertEqual(1, metrics.phase_duration.get(("/items", "POST", "deserialize"))["count"])
+        self.assertEqual(1, metrics.phase_duration.get(("/items", "POST", "encode"))["count"])
+        self.assertEqual(2, metrics.phase_duration.get(("/items", "POST", "on_start"))["count"])
+        self.assertEqual(compressed_size, metrics.response_bytes.get(("/large", "GET")))
+        self.assertEqual(0, metrics.in_flight.get())
+
+        response = await self.client.get("/metrics")
+        self.assertEqual(200, response.status)
+        text = await response.text()
+        self.assertIn('aior_http_requests_total{route="/items",method="POST",status="200"} 1', text)
+        self.assertIn('aior_http_request_duration_seconds_bucket{route="/items",method="POST",le="+Inf"} 2',
+                      text)
+        self.assertIn('aior_info{version=', text)
+
+    @unittest_run_loop
+    async def test_02_cancelled_request(self):
+        metrics = self.app.metrics
+        handler = mock.AsyncMock(side_effect=asyncio.CancelledError)
+        request = mock.Mock(method="GET", content_length=None)
+        request.match_info.route.resource.canonical = "/items"
+        with self.assertRaises(asyncio.CancelledError):
+            await metrics_middleware(metrics)(request, handler)
+        self.assertEqual(1, metrics.requests.get(("/items", "GET", "499")))
+        self.assertEqual(0, metrics.requests.get(("/items", "GET", "500")))
+        self.assertEqual(1, metrics.duration.get(("/items", "GET"))["count"])
+        self.assertEqual(0, metrics.in_flight.get())
+
+    def test_03_pool_metrics(self):
+        pool = mock.Mock()
+        pool.size.return_value = 5
+        pool.checkedout.return_value = 7
+        pool.overflow.return_value = 2
+        registry = MetricsRegistry()
+        pool_metrics = PoolMetrics(registry)
+        pool_metrics.watch("primary", lambda: pool)
+        pool_metrics.observe_wait("primary", 0.003)
+
+        pool_metrics.collect()
+        self.assertEqual(5, pool_metrics.size.get(("primary",)))
+        self.assertEqual(7, pool_metrics.checked_out.get(("primary",)))
+        self.assertEqual(2, pool_metrics.overflow.get(("primary",)))
+        self.assertEqual(1, pool_metrics.wait.get(("primary",))["count"])
+
+        pool.checkedout.return_value = 1
+        # refreshed on every render
+        self.assertIn(b'aior_db_pool_checked_out{pool="primary"} 1', registry.render())
+
+
+class TestLazyComponents(unittest.TestCase):
+    def test_01_lazy_names(self):
+        import aior.components
+        for module_name, names in aior.components._LAZY_MODULES.items():
+            module = importlib.import_module(module_name)
+            self.assertEqual(set(module.__all__), set(names))
+            for name in names:
+                self.assertIs(getattr(module, name), getattr(aior.components, name))
+        with self.assertRaises(AttributeError):
+            getattr(aior.components, "NotAComponent")
+
+    def test_02_all(self):
+        import aior.components
+        names = set(aior.components.__all__)
+        self.assertEqual(len(aior.components.__all__), len(names))
+        self.assertNotIn("ModuleType", names)
+        self.assertNotIn("importlib", names)
+        self.assertLessEqual(set(aior.components._LAZY_ATTRS), names)
+        for module_name in aior.components._EAGER_MODULES:
+            module = importlib.import_module(module_name)
+            for name in module.__all__:
+                self.assertIs(getattr(module, name), getattr(aior.components, name))
+        namespace = {}
+        exec("from aior.components import *", namespace)
+        self.assertLessEqual(names, set(namespace))
+
+
+class RoutedItemHandler(BaseHTTPHandler):
+    @staticmethod
+    async def get(path_args: PathArgs[ItemPath]) -> CustomerResponseBody:
+        return JSONResponse({"name": str(path_args.item_id)})
+
+    @staticmethod
+    async def delete():
+        return NoContentResponse()
+
+
+class TestRouteRegistry(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def get_app(self, **kwargs) -> AiorApplication:
+        return AiorApplication(routes=[
+            ("/items/{item_id}", RoutedItemHandler),
+            ("/v1/items/{item_id}", RoutedItemHandler),
+            ("/items", ItemsHandler),
+        ], loop=self.loop, **kwargs)
+
+    def test_01_handler_reflected_once(self):
+        with mock.patch("aior.routing.get_type_hints", wraps=get_type_hints) as hints:
+            registry = self.get_app().route_registry
+        self.assertEqual(3, len(registry))
+        specs = list(registry)
+        self.assertEqual(["/items/{item_id}", "/v1/items/{item_id}", "/items"], [s.path for s in specs])
+        self.assertIs(specs[0].methods, specs[1].methods)
+        self.assertCountEqual(["GET", "DELETE"], specs[0].methods)
+        self.assertCountEqual(["GET", "POST", "PUT"], specs[2].methods)
+        self.assertEqual(5, hints.call_count)
+
+    def test_02_type_hints(self):
+        registry = self.get_app().route_registry
+        for spec in registry:
+            for method in spec.methods.values():
+                expected = get_type_hints(getattr(spec.handler, method.name))
+                self.assertEqual(expected, method.type_hints())
+                self.assertEqual("return" in expected, method.has_response_type)
+                # a copy, the spec itself is not changed
+                method.type_hints().clear()
+                self.assertEqual(expected, method.type_hints())
+        get = next(iter(registry)).methods["GET"]
+        self.assertIs(CustomerResponseBody, get.type_hints()["return"])
+        self.assertNotIn("return", get.hints)
+
+    def test_03_binders(self):
+        registry = self.get_app().route_registry
+        routed, _, items = registry
+        self.assertEqual(["GET"], list(routed.binders))
+        self.assertIs(routed.methods["GET"].binder, routed.binders["GET"])
+        self.assertIsNone(routed.methods["DELETE"].binder)
+        self.assertEqual(routed.binders, RoutedItemHandler.__binders__)
+        self.assertCountEqual(["GET", "POST", "PUT"], ItemsHandler.__binders__)
+        self.assertEqual(items.binders, ItemsHandler.__binders__)
+
+    @unittest.skipUnless(importlib.util.find_spec("aiohttp_cors"), "aiohttp_cors is not installed")
+    def test_04_one_cors_wrapper_per_handler(self):
+        app = self.get_app(enable_cors=True)
+        handlers = {}
+        for resource in app.router.resources():
+            for route in resource:
+                if route.method == "*":
+                    handlers[resource.canonical] = route.handler
+        routed = handlers["/items/{item_id}"]
+        self.assertIs(routed, handlers["/v1/items/{item_id}"])
+        self.assertIsNot(routed, RoutedItemHandler)
+        self.assertTrue(issubclass(routed, RoutedItemHandler))
+        self.assertIsNot(handlers["/items"], routed)
+        self.assertTrue(issubclass(handlers["/items"], ItemsHandler))
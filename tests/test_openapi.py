@@ -242,7 +242,6 @@ class UserInfoHandler(BaseHTTPHandler):
         ...
 
 
-# TODO: test swagger ui html
 class TestWithoutTypeHintHTTPTestCase(AioHTTPTestCase):
 
     def get_app(self) -> AiorApplication:
@@ -260,5 +259,39 @@ class TestWithoutTypeHintHTTPTestCase(AioHTTPTestCase):
         self.assertDictEqual(expected_openapi_schema, schema)
 
 
+class TestDocsHTTPTestCase(AioHTTPTestCase):
+
+    def get_app(self) -> AiorApplication:
+        return AiorApplication(routes=[
+            ("/users/{user_id}", UserInfoHandler),
+        ], enable_docs=True)
+
+    @unittest_run_loop
+    async def test_01_openapi_document(self):
+        self.assertIsNone(self.app._openapi_schema)
+
+        response = await self.client.get("/openapi.json", headers={"Accept-Encoding": "identity"})
+        self.assertEqual(200, response.status)
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertDictEqual(self.app.openapi_schema, await response.json())
+        etag = response.headers["ETag"]
+
+        response = await self.client.get("/openapi.json", headers={"If-None-Match": etag})
+        self.assertEqual(304, response.status)
+
+        response = await self.client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+        self.assertEqual(f"W/{etag}", response.headers["ETag"])
+        self.assertDictEqual(self.app.openapi_schema, await response.json())
+
+    @unittest_run_loop
+    async def test_02_html_documents(self):
+        for url in ("/docs", "/redoc"):
+            response = await self.client.get(url)
+            self.assertEqual(200, response.status)
+            self.assertEqual("text/html", response.content_type)
+            self.assertIn("/openapi.json", await response.text())
+
+
 if __name__ == '__main__':
     unittest.main()
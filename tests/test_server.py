@@ -0,0 +1,269 @@
+import asyncio
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import aiohttp
+
+from aior.application import AiorApplication
+from aior.components import BaseHTTPHandler, JSONResponse
+from aior.constants import LoopImpl
+from aior.listeners import (
+    TCP, UNIX, FD, SYSTEMD, parse_listener, create_tcp_socket, create_unix_socket, get_systemd_fds,
+    open_listener_sockets)
+from aior.utils import get_loop_impl, get_loop_policy
+from aior.workers import WorkerSupervisor
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "needs os.fork()")
+class TestWorkerSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _starts(self, worker_id):
+        path = self.dir / str(worker_id)
+        return len(path.read_text().splitlines()) if path.exists() else 0
+
+    def _target(self, worker_id):
+        with (self.dir / str(worker_id)).open("a") as f:
+            f.write("start\n")
+        if worker_id == 0 and self._starts(0) == 1:
+            # the first run of worker 0 crashes
+            return 3
+        time.sleep(30)
+
+    def test_01_restart_and_forward_signals(self):
+        logger = mock.Mock()
+        prev_handler = signal.getsignal(signal.SIGTERM)
+
+        def stop_when_ready():
+            _wait_for(lambda: self._starts(0) == 2 and self._starts(1) == 1)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        stopper = threading.Thread(target=stop_when_ready)
+        stopper.start()
+        started = time.monotonic()
+        WorkerSupervisor(self._target, 2, logger, restart_delay=0.05).run()
+        stopper.join()
+
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual(2, self._starts(0))
+        self.assertEqual(1, self._starts(1))
+        messages = [call.args[0] for call in logger.info.call_args_list]
+        self.assertEqual(1, sum("exited with code 3" in m for m in messages))
+        self.assertEqual(2, sum(f"exited with signal {signal.SIGTERM.value}" in m for m in messages))
+        # the handlers of the master are restored
+        self.assertEqual(prev_handler, signal.getsignal(signal.SIGTERM))
+
+    def test_02_child_exception_exits_with_error(self):
+        logger = mock.Mock()
+
+        def target(worker_id):
+            if self._starts(worker_id) == 0:
+                (self.dir / str(worker_id)).write_text("start\n")
+                raise RuntimeError("boom")
+            os.kill(os.getppid(), signal.SIGTERM)
+            time.sleep(30)
+
+        WorkerSupervisor(target, 1, logger, restart_delay=0.01).run()
+        messages = [call.args[0] for call in logger.info.call_args_list]
+        self.assertTrue(any("exited with code 1" in m for m in messages))
+
+
+class TestLoopPolicy(unittest.TestCase):
+    def test_01_asyncio(self):
+        self.assertIsNone(get_loop_policy(LoopImpl.ASYNCIO))
+        with self.assertRaises(ValueError):
+            get_loop_policy("trio")
+
+    def test_02_uvloop_missing(self):
+        # a None entry makes the import fail
+        with mock.patch.dict(sys.modules, {"uvloop": None}):
+            self.assertIsNone(get_loop_policy(LoopImpl.AUTO))
+            with self.assertRaises(RuntimeError):
+                get_loop_policy(LoopImpl.UVLOOP)
+
+    @unittest.skipIf(uvloop is None, "uvloop is not installed")
+    def test_03_uvloop_installed(self):
+        global_policy = asyncio.get_event_loop_policy()
+        for loop_impl in (LoopImpl.AUTO, LoopImpl.UVLOOP):
+            policy = get_loop_policy(loop_impl)
+            self.assertIsInstance(policy, uvloop.EventLoopPolicy)
+            loop = policy.new_event_loop()
+            try:
+                self.assertEqual(LoopImpl.UVLOOP, get_loop_impl(loop))
+            finally:
+                loop.close()
+        self.assertIs(global_policy, asyncio.get_event_loop_policy())
+
+    def test_04_application_requires_uvloop(self):
+        with mock.patch.dict(sys.modules, {"uvloop": None}):
+            with self.assertRaises(RuntimeError):
+                AiorApplication(routes=[], loop_impl=LoopImpl.UVLOOP)
+
+
+class TestListeners(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "aior.sock")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_01_parse_listener(self):
+        self.assertEqual((TCP, ("127.0.0.1", 8400)), parse_listener("127.0.0.1:8400"))
+        self.assertEqual((TCP, ("::1", 8400)), parse_listener("tcp://[::1]:8400"))
+        self.assertEqual((TCP, ("", 8400)), parse_listener(":8400"))
+        self.assertEqual((UNIX, ("/run/aior.sock",)), parse_listener("unix:/run/aior.sock"))
+        self.assertEqual((FD, (3,)), parse_listener("fd:3"))
+        self.assertEqual((SYSTEMD, ()), parse_listener(" systemd "))
+        for spec in ("unix:", "fd:x", "localhost", "localhost:http"):
+            with self.assertRaises(ValueError):
+                parse_listener(spec)
+
+    def test_02_unix_socket_replaces_stale_file(self):
+        create_unix_socket(self.path).close()
+        self.assertTrue(os.path.exists(self.path))
+        sock = create_unix_socket(self.path)
+        try:
+            self.assertEqual(socket.AF_UNIX, sock.family)
+            self.assertEqual(self.path, sock.getsockname())
+        finally:
+            sock.close()
+
+    def test_03_unix_socket_keeps_other_files(self):
+        Path(self.path).write_text("data")
+        with self.assertRaises(OSError):
+            create_unix_socket(self.path)
+        self.assertEqual("data", Path(self.path).read_text())
+
+    def test_04_inherit_fd(self):
+        sock = create_tcp_socket("127.0.0.1", 0)
+        try:
+            inherited, = open_listener_sockets(FD, (os.dup(sock.fileno()),))
+            try:
+                self.assertEqual(socket.AF_INET, inherited.family)
+                self.assertEqual(sock.getsockname(), inherited.getsockname())
+            finally:
+                inherited.close()
+        finally:
+            sock.close()
+
+    def test_05_systemd_fds(self):
+        environ = {"LISTEN_PID": str(os.getpid()), "LISTEN_FDS": "2", "LISTEN_FDNAMES": "a:b"}
+        with mock.patch.dict(os.environ, environ):
+            self.assertEqual([3, 4], get_systemd_fds())
+            self.assertNotIn("LISTEN_FDS", os.environ)
+            self.assertEqual([], get_systemd_fds())
+
+        # passed to another process
+        environ["LISTEN_PID"] = str(os.getpid() + 1)
+        with mock.patch.dict(os.environ, environ):
+            self.assertEqual([], get_systemd_fds(unset_environment=False))
+            self.assertEqual("2", os.environ["LISTEN_FDS"])
+
+
+class HelloHandler(BaseHTTPHandler):
+    @staticmethod
+    async def get():
+        return JSONResponse("Hello")
+
+
+class TestServerConfig(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self.tmp.cleanup()
+
+    def _make_app(self, argv=(), **kwargs):
+        with mock.patch.object(sys, "argv", ["aior", *argv]):
+            return AiorApplication(routes=[("/hello", HelloHandler)], loop=self.loop, **kwargs)
+
+    def test_01_server_section(self):
+        config_file = self.dir / "config.{env}.ini"
+        (self.dir / "config.prod.ini").write_text(
+            "[server]\n"
+            "port = 9000\n"
+            "reuse-port = yes\n"
+            "workers = 4\n"
+            "listen = unix:/run/aior.sock, 127.0.0.1:9001\n"
+        )
+        app = self._make_app(["-e", "prod", "-w", "2"], port=8000, config_file=config_file)
+        self.assertEqual(9000, app._port)
+        self.assertTrue(app._reuse_port)
+        # explicit arguments win over the config file
+        self.assertEqual(2, app._workers)
+        self.assertEqual([(UNIX, ("/run/aior.sock",)), (TCP, ("127.0.0.1", 9001))], app._listeners)
+
+        app = self._make_app(["-e", "prod", "-l", "fd:3"], config_file=config_file)
+        self.assertEqual([(FD, (3,))], app._listeners)
+
+    def test_02_yaml_server_section(self):
+        config_file = self.dir / "config.yml"
+        config_file.write_text("server:\n  port: 9000\n  listen: [systemd]\n")
+        app = self._make_app(["-p", "9100"], config_file=config_file)
+        self.assertEqual(9100, app._port)
+        self.assertEqual([(SYSTEMD, ())], app._listeners)
+
+    def test_03_default_tcp_listener(self):
+        app = self._make_app(host="127.0.0.1", port=8000)
+        self.assertEqual([(TCP, ("127.0.0.1", 8000))], app._listeners)
+
+    def _get_hello(self, app, make_connector, url):
+        async def main():
+            await app.start_runner()
+            try:
+                async with aiohttp.ClientSession(connector=make_connector()) as session:
+                    async with session.get(url) as resp:
+                        return resp.status, await resp.text()
+            finally:
+                await app._runner.cleanup()
+
+        return self.loop.run_until_complete(main())
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "needs unix sockets")
+    def test_04_unix_site(self):
+        path = str(self.dir / "aior.sock")
+        app = self._make_app(["-l", f"unix:{path}"])
+        status, body = self._get_hello(app, lambda: aiohttp.UnixConnector(path), "http://localhost/hello")
+        self.assertEqual(200, status)
+        self.assertEqual("Hello", body)
+
+    def test_05_fd_site(self):
+        sock = create_tcp_socket("127.0.0.1", 0)
+        try:
+            port = sock.getsockname()[1]
+            app = self._make_app(["-l", f"fd:{os.dup(sock.fileno())}"])
+            status, body = self._get_hello(app, aiohttp.TCPConnector, f"http://127.0.0.1:{port}/hello")
+        finally:
+            sock.close()
+        self.assertEqual(200, status)
+        self.assertEqual("Hello", body)